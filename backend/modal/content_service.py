@@ -10,10 +10,14 @@ Architecture aligned with Open Notebook's two-stage podcast generation:
 """
 import modal
 import json
+from pathlib import Path
 from typing import Optional
 
 app = modal.App("daydif-content")
 
+# Prompt templates live next to this file locally and under /root in the container
+PROMPTS_DIR = Path(__file__).parent / "prompts" / "content"
+
 # Image with content generation dependencies
 image = (
     modal.Image.debian_slim(python_version="3.11")
@@ -23,12 +27,15 @@ image = (
         "anthropic",
         "httpx",
         "beautifulsoup4",
+        "selectolax>=0.3.21",  # Fast HTML parser for source extraction (lexbor backend; 1.0 dropped modest)
         "youtube-transcript-api",
         "pypdf2",
         "supabase",
         "jinja2",
+        "tiktoken",
         "fastapi",  # Required for Modal web endpoints
     )
+    .add_local_dir(PROMPTS_DIR, remote_path="/root/prompts/content")
 )
 
 # ============================================================================
@@ -51,127 +58,184 @@ DEFAULT_SPEAKERS = [
 ]
 
 # ============================================================================
-# Prompt Templates (Inspired by Open Notebook's Jinja templates)
+# Prompt Templates - versioned .jinja files in prompts/content/
 # ============================================================================
 
-OUTLINE_PROMPT = """You are an AI assistant specialized in creating educational podcast outlines.
-Your task is to create a detailed outline for an educational audio lesson based on the provided topic and context.
-
-**Topic:** {{ topic }}
-**Lesson Number:** {{ lesson_number }} of {{ total_lessons }}
-**Target Duration:** {{ duration_minutes }} minutes
-**Audience Level:** {{ user_level }}
-
-{% if source_context %}
-**Reference Material:**
-{{ source_context }}
-{% endif %}
-
-**Speakers:**
-{% for speaker in speakers %}
-- **{{ speaker.name }}**: {{ speaker.backstory }}
-  Personality: {{ speaker.personality }}
-{% endfor %}
-
-Create an outline with {{ num_segments }} segments for this lesson. Follow these guidelines:
-
-1. Include an engaging **introduction** that hooks the listener
-2. Create **{{ num_segments - 2 }} content segments** covering key concepts
-3. End with a **summary/conclusion** that reinforces key takeaways
-4. Each segment should indicate its relative size (short/medium/long)
-5. Consider this is lesson {{ lesson_number }} of {{ total_lessons }}:
-{% if lesson_number == 1 %}
-   - This is the FIRST lesson: introduce the topic broadly, set expectations
-{% elif lesson_number == total_lessons %}
-   - This is the FINAL lesson: wrap up the series comprehensively
-{% else %}
-   - Build on previous concepts, introduce new material progressively
-{% endif %}
-
-Return your outline as JSON:
-{
-  "title": "Catchy lesson title",
-  "summary": "2-3 sentence description",
-  "segments": [
-    {
-      "name": "Segment Name",
-      "description": "What will be covered, key points to discuss",
-      "size": "short|medium|long",
-      "key_points": ["point 1", "point 2"]
-    }
-  ],
-  "key_takeaways": ["takeaway 1", "takeaway 2", "takeaway 3"]
+class PromptRegistry:
+    """
+    Loads prompt templates from PROMPTS_DIR through one shared jinja2 Environment.
+    Each template is compiled once per container (with a bytecode cache for
+    restarts) and renders are timed. version() hashes the template sources so
+    generated content can be traced back to the prompts that produced it.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self._env = None
+        self._templates = {}
+        self._stats = {}
+
+    @property
+    def env(self):
+        if self._env is None:
+            import tempfile
+            from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+            cache_dir = Path(tempfile.gettempdir()) / "jinja-bytecode"
+            cache_dir.mkdir(exist_ok=True)
+            self._env = Environment(
+                loader=FileSystemLoader(str(self.directory)),
+                bytecode_cache=FileSystemBytecodeCache(str(cache_dir)),
+                auto_reload=False,  # Templates ship with the image and never change at runtime
+            )
+        return self._env
+
+    def get(self, name: str):
+        """Compiled template for name (file {name}.jinja), compiled on first use"""
+        import time
+
+        if name not in self._templates:
+            started_at = time.perf_counter()
+            self._templates[name] = self.env.get_template(f"{name}.jinja")
+            self._stats[name] = {
+                "compile_ms": round((time.perf_counter() - started_at) * 1000, 2),
+                "renders": 0,
+                "total_render_ms": 0.0,
+                "last_render_ms": 0.0,
+            }
+        return self._templates[name]
+
+    def render(self, name: str, **kwargs) -> str:
+        import time
+
+        template = self.get(name)
+        started_at = time.perf_counter()
+        text = template.render(**kwargs)
+        elapsed_ms = round((time.perf_counter() - started_at) * 1000, 3)
+
+        stats = self._stats[name]
+        stats["renders"] += 1
+        stats["total_render_ms"] = round(stats["total_render_ms"] + elapsed_ms, 3)
+        stats["last_render_ms"] = elapsed_ms
+        return text
+
+    def versions(self) -> dict:
+        """Short content hash per template"""
+        import hashlib
+
+        return {
+            path.stem: hashlib.sha256(path.read_bytes()).hexdigest()[:12]
+            for path in sorted(self.directory.glob("*.jinja"))
+        }
+
+    def version(self) -> str:
+        """Single hash over every template, stamped into outline metadata"""
+        import hashlib
+
+        return hashlib.sha256(json.dumps(self.versions(), sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+    def stats(self) -> dict:
+        return {"version": self.version(), "templates": self._stats}
+
+
+prompts = PromptRegistry(PROMPTS_DIR)
+
+
+
+# ============================================================================
+# Source Fetching
+# ============================================================================
+
+SOURCE_FETCH_CONFIG = {
+    "max_sources": 3,
+    "max_chars": 3000,  # Characters kept per source
+    "deadline_seconds": 12,  # Overall budget; slower sources are dropped
+    "request_timeout_seconds": 10,
+    "max_connections": 10,
+    "max_per_host": 2,
 }
 
-Return ONLY the JSON object, no additional text or code blocks."""
-
-TRANSCRIPT_PROMPT = """You are creating a podcast-style educational transcript.
-This will be converted to audio, so make it conversational and engaging.
-
-**Lesson Context:**
-- Title: {{ title }}
-- Topic: {{ topic }}
-- Audience: {{ user_level }} level learners
-- This is lesson {{ lesson_number }} of {{ total_lessons }}
-
-**Speakers:**
-{% for speaker in speakers %}
-- **{{ speaker.name }}**: {{ speaker.personality }}
-{% endfor %}
-
-**Full Outline:**
-{{ outline_json }}
-
-{% if previous_transcript %}
-**Previous segments transcript (for context/continuity):**
-{{ previous_transcript }}
-{% endif %}
-
-**Current Segment to Write:**
-Name: {{ segment.name }}
-Description: {{ segment.description }}
-Size: {{ segment.size }}
-Key Points: {{ segment.key_points | join(", ") }}
-
-**CRITICAL LENGTH REQUIREMENT - THIS IS MANDATORY:**
-You MUST generate A LOT of dialogue to fill {{ target_seconds }} seconds of audio (approximately {{ target_minutes }} minutes).
-- Average speaking rate: 130 words per minute.
-- **ABSOLUTE MINIMUM WORD COUNT: {{ target_words }} words. Aim for {{ target_words_high }} words.**
-- Each speaker turn should be a FULL PARAGRAPH (3-5 sentences minimum). NO short one-liners.
-- If you write less than {{ target_words }} words, the lesson will be too short and UNACCEPTABLE.
-- DIG DEEP into the topic:
-  * Explain concepts thoroughly with multiple examples
-  * Use analogies and real-world scenarios  
-  * Have back-and-forth discussion where speakers build on each other's points
-  * Include "what if" scenarios and edge cases
-  * Summarize key points periodically
-- Do NOT use short responses. Every dialogue turn should be substantive and detailed.
-
-{% if is_final %}
-This is the FINAL segment. Wrap up naturally, thank listeners, and if there are more lessons in the series, tease what's coming next.
-{% endif %}
-
-Guidelines:
-- Create natural, conversational dialogue between {{ speakers | map(attribute='name') | join(' and ') }}
-- Minimum {{ min_turns }} turns of dialogue for this segment
-- Match each speaker's personality and expertise
-- Use clear explanations, analogies, and examples
-- Avoid jargon unless explained
-- Make it engaging for commuters listening during their drive
-- No need to re-introduce speakers each segment
-
-Return as JSON:
-{
-  "segment_name": "{{ segment.name }}",
-  "transcript": [
-    {"speaker": "Speaker Name", "dialogue": "What they say..."},
-    {"speaker": "Other Speaker", "dialogue": "Their response..."}
-  ],
-  "duration_estimate_seconds": {{ target_seconds }}
+# Main-content extraction: block tags kept, subtrees skipped, link-heavy blocks dropped
+HTML_EXTRACT_CONFIG = {
+    "content_tags": ("p", "h1", "h2", "h3", "h4", "li", "blockquote", "pre", "td"),
+    "skip_tags": ("script", "style", "noscript", "nav", "footer", "header", "aside", "form", "svg", "iframe"),
+    # Blocks whose end tag HTML lets authors omit, and the start/end tags that close them implicitly
+    "closed_by_start": {
+        "p": ("p", "li", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre", "td", "th", "div",
+              "ul", "ol", "dl", "table", "section", "article", "hr"),
+        "li": ("li",),
+        "td": ("td", "th", "tr"),
+    },
+    "closed_by_end": {
+        "p": ("div", "section", "article", "main", "body", "li", "td", "blockquote"),
+        "li": ("ul", "ol", "body"),
+        "td": ("tr", "table", "body"),
+    },
+    "min_block_chars": 25,  # Shorter non-heading blocks are usually chrome
+    "max_link_density": 0.5,  # Share of a block's text inside <a> above which it's dropped
+    "feed_chars": 16 * 1024,  # Streaming parser chunk size
 }
 
-Return ONLY the JSON object, no additional text or code blocks."""
+# Pages used by benchmark_html_extraction, saved to the corpus volume on first run
+BENCHMARK_SOURCE_URLS = [
+    "https://en.wikipedia.org/wiki/Spaced_repetition",
+    "https://en.wikipedia.org/wiki/Compound_interest",
+    "https://docs.python.org/3/tutorial/classes.html",
+    "https://developer.mozilla.org/en-US/docs/Web/HTTP/Caching",
+    "https://www.nasa.gov/solar-system/",
+]
+html_corpus_volume = modal.Volume.from_name("daydif-html-corpus", create_if_missing=True)
 
+SOURCE_CACHE_CONFIG = {
+    "enabled": True,
+    "fresh_seconds": 6 * 3600,  # Serve articles without revalidating for 6 hours
+    "max_age_seconds": 30 * 24 * 3600,  # Drop entries (incl. YouTube transcripts) after 30 days
+}
+
+# Extracted source text shared across all containers of this app
+source_cache_store = modal.Dict.from_name("daydif-source-cache", create_if_missing=True)
+
+# ============================================================================
+# Context Budgets - token-aware packing of prompt context
+# ============================================================================
+
+CONTEXT_BUDGET_CONFIG = {
+    "encoding": "cl100k_base",  # Tokenizer for the gpt-4 family
+    "outline_tokens": 800,  # Compact outline JSON in each segment prompt
+    "transcript_tokens": 500,  # Tail of the transcript so far (sequential mode)
+    "source_tokens": 1200,  # Source excerpts, ranked by relevance to the prompt
+    "source_chunk_tokens": 120,  # Granularity of source ranking
+}
+
+# Rolling "story so far" memory that replaces the raw transcript tail in sequential mode
+SUMMARY_MEMORY_CONFIG = {
+    "mode": "llm",  # "llm" (cheap model call) or "extractive"
+    "model": "gpt-4o-mini",
+    "max_words": 180,  # Length of the rolling summary
+    "summary_tokens": 320,  # Hard cap used by the extractive mode
+    "last_turn_tokens": 120,  # The final line is still passed verbatim for the hand-off
+}
+
+# Closed-loop segment length: measure words against the target, continue only when short
+LENGTH_CONTROL_CONFIG = {
+    "enabled": True,
+    "words_per_minute": 150,  # Fallback until the TTS calibration has enough samples
+    "tolerance": 0.1,  # Segments within 10% of target words are accepted as-is
+    "min_continuation_words": 60,  # Smaller shortfalls aren't worth another call
+    "max_continuations": 2,
+    "overshoot_ratio": 1.2,  # Completion ceiling relative to target; generation stops there
+    "tokens_per_word": 1.6,  # Dialogue plus JSON framing, for sizing max_tokens
+    "words_per_turn": 50,  # Typical turn length; min_turns is derived from target words with it
+}
+
+# Speaking rate measured by the TTS service from every synthesized turn
+SPEECH_RATE_CONFIG = {
+    "enabled": True,
+    "min_words": 2000,  # Samples a voice profile needs before its fitted rate replaces the default
+    "round_to_wpm": 5,  # Keeps prompts (and completion-cache keys) stable as the fit drifts
+}
+# Written by TTSGenerator in the TTS app (named Dicts are workspace-wide)
+speech_rate_store = modal.Dict.from_name("daydif-speech-rate", create_if_missing=True)
 
 # ============================================================================
 # Helper Functions
@@ -192,47 +256,555 @@ def extract_youtube_id(url: str) -> Optional[str]:
     return None
 
 
-def fetch_source_content(urls: list) -> str:
-    """Fetch and extract content from source URLs"""
-    import httpx
+def _keep_block(text: str, link_chars: int, is_heading: bool) -> bool:
+    """Readability-style filter: drop tiny and link-dominated blocks"""
+    if not text:
+        return False
+    if link_chars / len(text) > HTML_EXTRACT_CONFIG["max_link_density"]:
+        return False
+    return is_heading or len(text) >= HTML_EXTRACT_CONFIG["min_block_chars"]
+
+
+def _extract_with_selectolax(html: str, max_chars: int) -> str:
+    """
+    Main-content text via lexbor. The whole page is parsed, then blocks are
+    walked in document order until max_chars is collected.
+    """
+    from selectolax.lexbor import LexborHTMLParser
+
+    content_tags = HTML_EXTRACT_CONFIG["content_tags"]
+    tree = LexborHTMLParser(html)
+    tree.strip_tags(list(HTML_EXTRACT_CONFIG["skip_tags"]))
+    root = tree.css_first("article") or tree.css_first("main") or tree.body
+    if root is None:
+        return ""
+
+    blocks, collected = [], 0
+    for node in root.traverse():
+        if node.tag not in content_tags:
+            continue
+        # Nested matches (li > p) are picked up by their outermost block
+        parent, nested = node.parent, False
+        while parent is not None and not nested:
+            nested = parent.tag in content_tags
+            parent = parent.parent
+        if nested:
+            continue
+        text = " ".join(node.text(separator=" ").split())
+        link_chars = sum(len(" ".join(a.text(separator=" ").split())) for a in node.css("a"))
+        if _keep_block(text, link_chars, node.tag.startswith("h")):
+            blocks.append(text)
+            collected += len(text) + 1
+            if collected >= max_chars:
+                break
+    return " ".join(blocks)
+
+
+def _extract_with_html_parser(html: str, max_chars: int) -> str:
+    """Main-content text via the stdlib streaming parser; stops feeding once max_chars is collected"""
+    from html.parser import HTMLParser
+
+    content_tags = HTML_EXTRACT_CONFIG["content_tags"]
+    skip_tags = HTML_EXTRACT_CONFIG["skip_tags"]
+    closed_by_start = HTML_EXTRACT_CONFIG["closed_by_start"]
+    closed_by_end = HTML_EXTRACT_CONFIG["closed_by_end"]
+
+    class BlockCollector(HTMLParser):
+        def __init__(self):
+            super().__init__(convert_charrefs=True)
+            self.blocks, self.collected = [], 0
+            self.skip_depth = 0
+            self.block_tag, self.block_depth = None, 0
+            self.parts, self.link_chars, self.in_link = [], 0, 0
+
+        def end_block(self):
+            text = " ".join(" ".join(self.parts).split())
+            if _keep_block(text, self.link_chars, self.block_tag.startswith("h")):
+                self.blocks.append(text)
+                self.collected += len(text) + 1
+            self.block_tag, self.block_depth = None, 0
+
+        def handle_starttag(self, tag, attrs):
+            if tag in closed_by_start.get(self.block_tag, ()):
+                self.end_block()  # e.g. <li> or <p> left open before the next block
+            if tag in skip_tags:
+                self.skip_depth += 1
+            elif tag == "a":
+                self.in_link += 1
+            elif tag == self.block_tag:
+                self.block_depth += 1
+            elif tag in content_tags and self.block_tag is None and not self.skip_depth:
+                self.block_tag, self.block_depth = tag, 1
+                self.parts, self.link_chars = [], 0
+
+        def handle_endtag(self, tag):
+            if tag in skip_tags:
+                self.skip_depth = max(0, self.skip_depth - 1)
+            elif tag == "a":
+                self.in_link = max(0, self.in_link - 1)
+            elif tag == self.block_tag:
+                self.block_depth -= 1
+                if self.block_depth == 0:
+                    self.end_block()
+            elif tag in closed_by_end.get(self.block_tag, ()):
+                self.end_block()  # The enclosing list, row or container ended first
+
+        def handle_data(self, data):
+            if self.skip_depth or self.block_tag is None:
+                return
+            self.parts.append(data)
+            if self.in_link:
+                self.link_chars += len(" ".join(data.split()))
+
+    parser = BlockCollector()
+    step = HTML_EXTRACT_CONFIG["feed_chars"]
+    for start in range(0, len(html), step):
+        parser.feed(html[start:start + step])
+        if parser.collected >= max_chars:
+            break
+    parser.close()
+    if parser.block_tag is not None:
+        parser.end_block()  # Document ended with a block still open
+    return " ".join(parser.blocks)
+
+
+def extract_article_text(html: str, max_chars: int = None) -> str:
+    """
+    Return roughly the first max_chars of a page's main content.
+    Uses selectolax's lexbor parser when it imports and the stdlib streaming
+    parser otherwise.
+    """
+    max_chars = max_chars or SOURCE_FETCH_CONFIG["max_chars"]
+    try:
+        from selectolax.lexbor import LexborHTMLParser  # noqa: F401
+    except ImportError:
+        return _extract_with_html_parser(html, max_chars)[:max_chars]
+    return _extract_with_selectolax(html, max_chars)[:max_chars]
+
+
+def extract_article_text_bs4(html: str) -> str:
+    """Previous full-tree BeautifulSoup extraction, kept as the benchmark baseline"""
     from bs4 import BeautifulSoup
 
-    contents = []
-    for url in urls[:3]:  # Limit to 3 sources
+    soup = BeautifulSoup(html, "html.parser")
+    for element in soup(["script", "style", "nav", "footer", "header"]):
+        element.decompose()
+    return soup.get_text(separator=" ", strip=True)[:SOURCE_FETCH_CONFIG["max_chars"]]
+
+
+class SourceCache:
+    """
+    Extracted-text cache for lesson sources, keyed by normalized URL or YouTube
+    video ID. Articles keep their ETag/Last-Modified so stale entries can be
+    revalidated with a conditional GET instead of re-downloaded and re-parsed.
+    Counters live in the same Modal Dict and are best-effort under concurrency.
+    """
+
+    STATS_KEY = "__stats__"
+
+    def __init__(self, store, fresh_seconds: int, max_age_seconds: int):
+        self.store = store
+        self.fresh_seconds = fresh_seconds
+        self.max_age_seconds = max_age_seconds
+
+    @staticmethod
+    def make_key(url: str) -> str:
+        """YouTube videos by ID; other URLs lowercased, without fragment, tracking params or trailing slash"""
+        from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+        video_id = extract_youtube_id(url) if "youtube.com" in url or "youtu.be" in url else None
+        if video_id:
+            return f"yt:{video_id}"
+
+        parts = urlsplit(url.strip())
+        query = sorted(
+            (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+            if not k.lower().startswith("utm_")
+        )
+        path = parts.path.rstrip("/") or "/"
+        return "web:" + urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ""))
+
+    def get(self, key: str) -> Optional[dict]:
+        import time
+
+        entry = self.store.get(key)
+        if entry is not None and time.time() - entry["fetched_at"] > self.max_age_seconds:
+            self.store.pop(key, None)
+            return None
+        return entry
+
+    def is_fresh(self, entry: dict) -> bool:
+        """YouTube transcripts don't change; articles are fresh for fresh_seconds after the last check"""
+        import time
+
+        return entry["kind"] == "youtube" or time.time() - entry["checked_at"] < self.fresh_seconds
+
+    def put(self, key: str, entry: dict) -> None:
+        self.store[key] = entry
+
+    def record(self, outcome: str, bytes_saved: int = 0) -> None:
+        """Count a lookup outcome: hit (served fresh), revalidated (304) or miss"""
+        stats = self.store.get(self.STATS_KEY) or {}
+        stats[outcome] = stats.get(outcome, 0) + 1
+        stats["bytes_saved"] = stats.get("bytes_saved", 0) + bytes_saved
+        self.store[self.STATS_KEY] = stats
+
+    def stats(self) -> dict:
+        stats = dict(self.store.get(self.STATS_KEY) or {})
+        served = stats.get("hit", 0) + stats.get("revalidated", 0)
+        lookups = served + stats.get("miss", 0)
+        stats["hit_rate"] = round(served / lookups, 3) if lookups else 0.0
+        return stats
+
+
+source_cache = SourceCache(
+    source_cache_store,
+    fresh_seconds=SOURCE_CACHE_CONFIG["fresh_seconds"],
+    max_age_seconds=SOURCE_CACHE_CONFIG["max_age_seconds"],
+)
+
+
+async def _fetch_web_source(client, url: str, host_slots: dict, cached: Optional[dict]) -> dict:
+    """
+    Download one article through the shared client, respecting the per-host limit.
+    With a cached entry the request is conditional; a 304 reuses the cached text.
+    """
+    import asyncio
+    import time
+    from urllib.parse import urlparse
+
+    headers = {}
+    if cached and cached.get("etag"):
+        headers["If-None-Match"] = cached["etag"]
+    if cached and cached.get("last_modified"):
+        headers["If-Modified-Since"] = cached["last_modified"]
+
+    host = urlparse(url).netloc
+    slot = host_slots.setdefault(host, asyncio.Semaphore(SOURCE_FETCH_CONFIG["max_per_host"]))
+    async with slot:
+        response = await client.get(url, headers=headers)
+
+    now = time.time()
+    if cached and response.status_code == 304:
+        return {"outcome": "revalidated", "entry": {**cached, "checked_at": now}}
+
+    response.raise_for_status()
+    text = extract_article_text(response.text)
+    return {"outcome": "miss", "entry": {
+        "kind": "web",
+        "text": text,
+        "etag": response.headers.get("etag"),
+        "last_modified": response.headers.get("last-modified"),
+        "bytes": len(response.content),
+        "fetched_at": now,
+        "checked_at": now,
+    }}
+
+
+async def _fetch_youtube_source(url: str, executor) -> dict:
+    """
+    Fetch a YouTube transcript. The client library is blocking, so it runs on the
+    caller's executor, which is abandoned at the deadline instead of awaited.
+    """
+    import asyncio
+    import time
+    from youtube_transcript_api import YouTubeTranscriptApi
+
+    video_id = extract_youtube_id(url)
+    if not video_id:
+        raise ValueError("no YouTube video ID in URL")
+    loop = asyncio.get_running_loop()
+    transcript = await loop.run_in_executor(executor, YouTubeTranscriptApi.get_transcript, video_id)
+    text = " ".join([t["text"] for t in transcript])
+    now = time.time()
+    return {"outcome": "miss", "entry": {
+        "kind": "youtube",
+        "text": text[:SOURCE_FETCH_CONFIG["max_chars"]],
+        "bytes": len(text.encode("utf-8")),
+        "fetched_at": now,
+        "checked_at": now,
+    }}
+
+
+async def fetch_sources_async(urls: list, deadline_seconds: float, cached: dict = None) -> list:
+    """
+    Fetch sources concurrently over one pooled AsyncClient.
+    Returns {"outcome", "entry"} results in input order; sources that failed or
+    were still running at the deadline (and got cancelled) come back as None.
+
+    Blocking fetches run on a dedicated thread pool that is shut down without
+    waiting at the deadline. A hung thread can't be stopped, but it no longer
+    holds up asyncio.run, which joins the default executor on exit.
+    """
+    import asyncio
+    import httpx
+    from concurrent.futures import ThreadPoolExecutor
+
+    cached = cached or {}
+    limits = httpx.Limits(max_connections=SOURCE_FETCH_CONFIG["max_connections"])
+    timeout = httpx.Timeout(SOURCE_FETCH_CONFIG["request_timeout_seconds"])
+    host_slots = {}
+    executor = ThreadPoolExecutor(max_workers=SOURCE_FETCH_CONFIG["max_sources"])
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout, follow_redirects=True) as client:
+        tasks = [
+            asyncio.create_task(
+                _fetch_youtube_source(url, executor) if "youtube.com" in url or "youtu.be" in url
+                else _fetch_web_source(client, url, host_slots, cached.get(url))
+            )
+            for url in urls
+        ]
+        if not tasks:
+            executor.shutdown(wait=False)
+            return []
         try:
-            if "youtube.com" in url or "youtu.be" in url:
-                from youtube_transcript_api import YouTubeTranscriptApi
-
-                video_id = extract_youtube_id(url)
-                if video_id:
-                    transcript = YouTubeTranscriptApi.get_transcript(video_id)
-                    text = " ".join([t["text"] for t in transcript])
-                    contents.append(f"[YouTube Video]: {text[:3000]}")
+            _, pending = await asyncio.wait(tasks, timeout=deadline_seconds)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        for task in pending:
+            task.cancel()
+
+        results = []
+        for url, task in zip(urls, tasks):
+            if task in pending:
+                print(f"⏱️ Source deadline hit, skipping {url}")
+                results.append(None)
+            elif task.exception():
+                print(f"Error fetching {url}: {task.exception()}")
+                results.append(None)
             else:
-                response = httpx.get(url, timeout=15, follow_redirects=True)
-                soup = BeautifulSoup(response.text, "html.parser")
-                for element in soup(["script", "style", "nav", "footer", "header"]):
-                    element.decompose()
-                text = soup.get_text(separator=" ", strip=True)
-                contents.append(f"[Web Article]: {text[:3000]}")
-        except Exception as e:
-            print(f"Error fetching {url}: {e}")
+                results.append(task.result())
+        return results
+
+
+def fetch_source_content(urls: list, deadline_seconds: float = None, use_cache: bool = True) -> str:
+    """
+    Fetch and extract content from source URLs concurrently, within an overall deadline.
+    Fresh cache entries skip the network; stale ones are revalidated conditionally.
+    """
+    import asyncio
+    import time
+
+    urls = urls[:SOURCE_FETCH_CONFIG["max_sources"]]
+    deadline_seconds = deadline_seconds or SOURCE_FETCH_CONFIG["deadline_seconds"]
+    use_cache = use_cache and SOURCE_CACHE_CONFIG["enabled"]
+    started_at = time.perf_counter()
+
+    keys = {url: SourceCache.make_key(url) for url in urls}
+    entries, stale = {}, {}
+    if use_cache:
+        for url in urls:
+            entry = source_cache.get(keys[url])
+            if entry and source_cache.is_fresh(entry):
+                entries[url] = entry
+                source_cache.record("hit", entry["bytes"])
+            elif entry:
+                stale[url] = entry
+
+    to_fetch = [url for url in urls if url not in entries]
+    for url, result in zip(to_fetch, asyncio.run(fetch_sources_async(to_fetch, deadline_seconds, stale))):
+        if result is None:
+            if url in stale:
+                entries[url] = stale[url]  # Serve the stale copy rather than nothing
+            continue
+        entries[url] = result["entry"]
+        if use_cache:
+            source_cache.put(keys[url], result["entry"])
+            saved = result["entry"]["bytes"] if result["outcome"] == "revalidated" else 0
+            source_cache.record(result["outcome"], saved)
+
+    labels = {"web": "[Web Article]", "youtube": "[YouTube Video]"}
+    contents = [f"{labels[entries[url]['kind']]}: {entries[url]['text']}" for url in urls if url in entries]
+    print(f"📚 Fetched {len(contents)}/{len(urls)} sources in {time.perf_counter() - started_at:.1f}s "
+          f"({len(urls) - len(to_fetch)} from cache)")
 
     return "\n\n".join(contents)
 
 
-def render_template(template_str: str, **kwargs) -> str:
-    """Render a Jinja2-style template"""
-    from jinja2 import Template
-    template = Template(template_str)
-    return template.render(**kwargs)
+_openai_client = None
+_openai_metrics = {"connection_setup_seconds": 0.0, "requests_served": 0}
+
+
+def get_openai_client():
+    """
+    OpenAI client, created once per container so calls reuse its connection pool.
+    The first call pays client setup plus one cheap request to open the TLS
+    connection, and logs how long that took.
+    """
+    global _openai_client
+    import os
+    import time
+    from openai import OpenAI
+
+    if _openai_client is None:
+        started_at = time.perf_counter()
+        _openai_client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+        _openai_client.models.list()
+        _openai_metrics["connection_setup_seconds"] = round(time.perf_counter() - started_at, 3)
+        print(f"🔌 OpenAI client connected in {_openai_metrics['connection_setup_seconds']}s")
+    return _openai_client
+
 
+def openai_container_metrics() -> dict:
+    """Connection setup cost and reuse count of this container's client, counting this call"""
+    _openai_metrics["requests_served"] += 1
+    return dict(_openai_metrics)
 
-def calculate_segment_turns(size: str, base_turns: int = 8) -> int:
-    """Calculate minimum dialogue turns based on segment size"""
-    # Increased base_turns from 6 to 8 to ensure more content
-    multipliers = {"short": 1.5, "medium": 2, "long": 3}
-    return int(base_turns * multipliers.get(size, 2))
+
+def summarize_client_reuse(results: list) -> dict:
+    """
+    Per-lesson view of client pooling: how many LLM calls hit a fresh container
+    (and paid setup) versus reused a warm client, and the setup time that reuse saved.
+    """
+    metrics = [r["container"] for r in results if r and r.get("container")]
+    if not metrics:
+        return {}
+    fresh = [m for m in metrics if m["requests_served"] == 1]
+    mean_setup = sum(m["connection_setup_seconds"] for m in metrics) / len(metrics)
+    return {
+        "llm_calls": len(metrics),
+        "client_setups": len(fresh),
+        "connection_setup_seconds_paid": round(sum(m["connection_setup_seconds"] for m in fresh), 3),
+        "connection_setup_seconds_saved": round(mean_setup * (len(metrics) - len(fresh)), 3),
+    }
+
+
+_token_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken, falling back to ~4 characters per token"""
+    global _token_encoding
+    if not text:
+        return 0
+    if _token_encoding is None:
+        try:
+            import tiktoken
+            _token_encoding = tiktoken.get_encoding(CONTEXT_BUDGET_CONFIG["encoding"])
+        except Exception as e:
+            # Not installed, or the encoding file can't be downloaded
+            print(f"⚠️ tiktoken unavailable ({e}), estimating tokens from characters")
+            _token_encoding = False
+    if _token_encoding:
+        return len(_token_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def tail_tokens(text: str, max_tokens: int) -> str:
+    """Keep the last max_tokens of text, starting at a line boundary so no turn is cut mid-way"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    lines = text.splitlines()
+    kept, used = [], 0
+    for line in reversed(lines):
+        cost = count_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(reversed(kept))
+
+
+def baseline_outline_tokens(outline: dict) -> int:
+    """
+    Tokens of the outline JSON the untrimmed segment prompt used to send: the
+    outline without the fields the pipeline has since stamped on it.
+    """
+    stamped = {"source_urls", "speech_rate", "prompt_version", "prompt_versions", "context_usage", "container"}
+    return count_tokens(json.dumps({k: v for k, v in outline.items() if k not in stamped}, indent=2))
+
+
+def pack_outline(outline: dict, segment_index: int, max_tokens: int) -> str:
+    """
+    Compact outline JSON for a segment prompt. Speakers, topic and other fields
+    already rendered elsewhere in the prompt are left out; when still over budget,
+    descriptions of the segments farthest from segment_index are dropped first.
+    """
+    segments = [
+        {key: segment[key] for key in ("name", "description", "size") if key in segment}
+        for segment in outline.get("segments", [])
+    ]
+    view = {
+        "title": outline.get("title", ""),
+        "summary": outline.get("summary", ""),
+        "segments": segments,
+    }
+
+    def render() -> str:
+        return json.dumps(view, separators=(",", ":"), ensure_ascii=False)
+
+    text = render()
+    for j in sorted(range(len(segments)), key=lambda j: -abs(j - segment_index)):
+        if count_tokens(text) <= max_tokens or abs(j - segment_index) <= 1:
+            break
+        segments[j].pop("description", None)
+        text = render()
+    return text
+
+
+def rank_source_chunks(source_context: str, query: str, max_tokens: int) -> str:
+    """
+    Split source text into ~source_chunk_tokens chunks, score them by overlap with
+    the query terms and keep the best chunks that fit max_tokens, in source order.
+    """
+    import re
+
+    if not source_context or count_tokens(source_context) <= max_tokens:
+        return source_context
+
+    chunk_chars = CONTEXT_BUDGET_CONFIG["source_chunk_tokens"] * 4
+    chunks = []
+    for source in source_context.split("\n\n"):
+        current = ""
+        for sentence in re.split(r"(?<=[.!?])\s+", source):
+            if current and len(current) + len(sentence) > chunk_chars:
+                chunks.append(current)
+                current = ""
+            current = f"{current} {sentence}".strip()
+        if current:
+            chunks.append(current)
+
+    terms = {term for term in re.findall(r"[a-z0-9]+", query.lower()) if len(term) > 3}
+
+    def score(chunk: str) -> float:
+        words = re.findall(r"[a-z0-9]+", chunk.lower())
+        hits = sum(1 for word in words if word in terms)
+        return len(terms & set(words)) + hits / max(1, len(words))
+
+    ranked = sorted(range(len(chunks)), key=lambda i: score(chunks[i]), reverse=True)
+    kept, used = set(), 0
+    for i in ranked:
+        cost = count_tokens(chunks[i])
+        if used + cost > max_tokens:
+            continue
+        kept.add(i)
+        used += cost
+    return "\n...\n".join(chunks[i] for i in sorted(kept))
+
+
+def calculate_segment_turns(target_words: int, floor: int = 4) -> int:
+    """Minimum dialogue turns that still fit target_words at the typical turn length"""
+    return max(floor, target_words // LENGTH_CONTROL_CONFIG["words_per_turn"])
+
+
+def build_segment_handoff(outline: dict, segment_index: int) -> str:
+    """Build a continuity note from the outline (used instead of previous_transcript in parallel mode)"""
+    segments = outline.get("segments", []) or []
+    lines = []
+
+    if segment_index > 0:
+        lines.append("Already covered in earlier segments (do not repeat or re-introduce):")
+        for i, seg in enumerate(segments[:segment_index]):
+            lines.append(f"- Part {i + 1} \"{seg.get('name', '')}\": {seg.get('description', '')}")
+        lines.append("Continue naturally from the previous segment; speakers are already introduced.")
+    else:
+        lines.append("This is the opening segment: welcome listeners and introduce the speakers.")
+
+    if segment_index < len(segments) - 1:
+        upcoming = segments[segment_index + 1]
+        lines.append(f"Coming up next: \"{upcoming.get('name', '')}\". Close with a short lead-in to it, without covering it.")
+
+    return "\n".join(lines)
 
 
 def _calculate_target_duration_seconds(outline: dict, segment_index: int) -> int:
@@ -254,6 +826,201 @@ def _calculate_target_duration_seconds(outline: dict, segment_index: int) -> int
     return result
 
 
+def speech_rate_key(exaggeration: float, cfg_weight: float) -> str:
+    """Profile key shared with the TTS service's record_speech_rate"""
+    return f"{float(exaggeration):.2f}|{float(cfg_weight):.2f}"
+
+
+def calibrated_speech_rate(speakers: list) -> dict:
+    """
+    Words per minute of produced lesson audio for these speakers, averaged over
+    their voice profiles as fitted by the TTS service. Profiles without enough
+    samples use LENGTH_CONTROL_CONFIG["words_per_minute"]; speakers without
+    voice_params use the rate pooled over every calibrated profile.
+    """
+    default_wpm = LENGTH_CONTROL_CONFIG["words_per_minute"]
+    profiles = {}
+    if SPEECH_RATE_CONFIG["enabled"]:
+        try:
+            profiles = speech_rate_store.get("profiles") or {}
+        except Exception as e:
+            print(f"⚠️ Speech rate calibration unavailable: {e}")
+
+    def fitted_wpm(entries: list) -> Optional[float]:
+        words = sum(entry["words"] for entry in entries)
+        if words < SPEECH_RATE_CONFIG["min_words"]:
+            return None
+        seconds = sum(entry["seconds"] + entry["turns"] * entry["gap_seconds"] for entry in entries)
+        return 60 * words / seconds
+
+    rates = []
+    for speaker in speakers:
+        params = speaker.get("voice_params")
+        if params:
+            entry = profiles.get(speech_rate_key(params.get("exaggeration", 0.5), params.get("cfg_weight", 0.5)))
+            rates.append(fitted_wpm([entry] if entry else []))
+        else:
+            rates.append(fitted_wpm(list(profiles.values())))
+
+    calibrated = [rate for rate in rates if rate is not None]
+    mean_wpm = sum(rate if rate is not None else default_wpm for rate in rates) / max(1, len(rates))
+    step = SPEECH_RATE_CONFIG["round_to_wpm"]
+    words_per_minute = int(round(mean_wpm / step) * step) if calibrated else default_wpm
+    print(f"🗣️ Speaking rate: {words_per_minute} wpm ({len(calibrated)}/{len(rates)} speakers calibrated)")
+    return {
+        "words_per_minute": words_per_minute,
+        "source": "calibrated" if calibrated else "default",
+        "calibrated_speakers": len(calibrated),
+    }
+
+
+def count_transcript_words(transcript: list) -> int:
+    return sum(len(turn.get("dialogue", "").split()) for turn in transcript)
+
+
+def completion_budget(words: int) -> int:
+    """max_tokens that lets a transcript completion reach words * overshoot_ratio and no further"""
+    config = LENGTH_CONTROL_CONFIG
+    return int(words * config["overshoot_ratio"] * config["tokens_per_word"]) + 100
+
+
+def parse_transcript_result(content: str) -> dict:
+    """
+    Parse a transcript completion. One cut off at its token ceiling is not valid
+    JSON; the dialogue turns that closed before the cut are kept.
+    """
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        decoder = json.JSONDecoder()
+        turns = []
+        pos = content.find("[", content.find('"transcript"'))
+        while pos >= 0:
+            pos = content.find("{", pos)
+            if pos < 0:
+                break
+            try:
+                turn, pos = decoder.raw_decode(content, pos)
+            except json.JSONDecodeError:
+                break
+            turns.append(turn)
+        print(f"✂️ Completion stopped at its length ceiling, kept {len(turns)} complete turns")
+        return {"transcript": turns}
+
+
+def continue_to_target(
+    client,
+    messages: list,
+    params: dict,
+    transcript: list,
+    target_words: int,
+    is_final: bool,
+    speaker_names: str,
+) -> dict:
+    """
+    While a segment is short of target_words by more than the tolerance, ask for
+    only the missing words as a continuation of the same conversation; on the
+    final segment the new turns go before the sign-off. Extends transcript in
+    place and returns the segment's length report.
+    """
+    config = LENGTH_CONTROL_CONFIG
+    initial_words = words = count_transcript_words(transcript)
+    continuations = 0
+
+    while config["enabled"] and transcript and continuations < config["max_continuations"]:
+        missing_words = target_words - words
+        if missing_words < max(config["min_continuation_words"], target_words * config["tolerance"]):
+            break
+
+        print(f"  ➕ Segment is {words}/{target_words} words, continuing for ~{missing_words} more")
+        prompt = prompts.render(
+            "continuation",
+            words=words,
+            missing_words=missing_words,
+            target_words=target_words,
+            speaker_names=speaker_names,
+            is_final_segment=is_final,
+        )
+        response = client.chat.completions.create(
+            messages=messages + [
+                {"role": "assistant", "content": json.dumps({"transcript": transcript})},
+                {"role": "user", "content": prompt},
+            ],
+            **{**params, "max_tokens": completion_budget(missing_words)},
+        )
+        new_turns = parse_transcript_result(response.choices[0].message.content).get("transcript", [])
+        continuations += 1
+        if not new_turns:
+            break
+
+        insert_at = len(transcript) - 1 if is_final else len(transcript)
+        transcript[insert_at:insert_at] = new_turns
+        words = count_transcript_words(transcript)
+
+    return {
+        "target_words": target_words,
+        "initial_words": initial_words,
+        "words": words,
+        "continuations": continuations,
+        "ratio": round(words / max(1, target_words), 2),
+    }
+
+
+def summarize_length_control(results: list, words_per_minute: float = None) -> dict:
+    """Lesson-level view of how close segments landed to their word targets"""
+    reports = [r["length_control"] for r in results if r and r.get("length_control")]
+    if not reports:
+        return {}
+    target_words = sum(r["target_words"] for r in reports)
+    words = sum(r["words"] for r in reports)
+    return {
+        "target_words": target_words,
+        "words": words,
+        "ratio": round(words / max(1, target_words), 2),
+        "segments_continued": sum(1 for r in reports if r["continuations"]),
+        "continuation_calls": sum(r["continuations"] for r in reports),
+        "estimated_audio_minutes": round(words / (words_per_minute or LENGTH_CONTROL_CONFIG["words_per_minute"]), 1),
+    }
+
+
+def extractive_story_so_far(story_so_far: str, segment_name: str, transcript: list) -> str:
+    """Cheap fallback summary: first sentence of each turn, oldest segments dropped past the cap"""
+    import re
+
+    firsts = [re.split(r"(?<=[.!?])\s+", turn.get("dialogue", "").strip())[0] for turn in transcript]
+    line = f"{segment_name}: " + " ".join(sentence for sentence in firsts if sentence)
+    combined = f"{story_so_far}\n{line}".strip()
+    return tail_tokens(combined, SUMMARY_MEMORY_CONFIG["summary_tokens"])
+
+
+def update_story_so_far(story_so_far: str, segment_name: str, transcript: list) -> str:
+    """
+    Fold a finished segment into the rolling summary. Each call sees the previous
+    summary plus one segment, so its cost stays flat as the lesson grows.
+    """
+    if SUMMARY_MEMORY_CONFIG["mode"] != "llm":
+        return extractive_story_so_far(story_so_far, segment_name, transcript)
+
+    prompt = prompts.render(
+        "story_so_far",
+        story_so_far=story_so_far,
+        segment_name=segment_name,
+        segment_transcript="\n".join(f"{turn['speaker']}: {turn['dialogue']}" for turn in transcript),
+        max_words=SUMMARY_MEMORY_CONFIG["max_words"],
+    )
+    try:
+        response = get_openai_client().chat.completions.create(
+            model=SUMMARY_MEMORY_CONFIG["model"],
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=SUMMARY_MEMORY_CONFIG["max_words"] * 2,
+            temperature=0.2,
+        )
+        return response.choices[0].message.content.strip()
+    except Exception as e:
+        print(f"⚠️ Story-so-far summary failed ({e}), using extractive fallback")
+        return extractive_story_so_far(story_so_far, segment_name, transcript)
+
+
 # ============================================================================
 # Stage 1: Generate Outline (Open Notebook style)
 # ============================================================================
@@ -271,24 +1038,24 @@ def generate_outline(
     duration_minutes: int = 10,
     source_urls: list = None,
     speakers: list = None,
+    source_context: str = None,
 ) -> dict:
     """
     Stage 1: Generate lesson outline with segments
     Inspired by Open Notebook's outline.jinja
-    """
-    import os
-    from openai import OpenAI
 
-    client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    Pass source_context when the caller already fetched source_urls.
+    """
+    client = get_openai_client()
 
     # Use default speakers if none provided
     if not speakers:
         speakers = DEFAULT_SPEAKERS
 
-    # Fetch source content
-    source_context = ""
-    if source_urls:
-        source_context = fetch_source_content(source_urls)
+    # Fetch source content, packed to the source token budget by relevance to the topic
+    if source_context is None:
+        source_context = fetch_source_content(source_urls) if source_urls else ""
+    packed_sources = rank_source_chunks(source_context, topic, CONTEXT_BUDGET_CONFIG["source_tokens"])
 
     # Calculate number of segments based on duration
     # ~2 min per segment to ensure more content is generated
@@ -301,14 +1068,14 @@ def generate_outline(
     print(f"📊 Outline: duration={duration_minutes}min → num_segments={num_segments}")
 
     # Render the prompt
-    prompt = render_template(
-        OUTLINE_PROMPT,
+    prompt = prompts.render(
+        "outline",
         topic=topic,
         lesson_number=lesson_number,
         total_lessons=total_lessons,
         duration_minutes=duration_minutes,
         user_level=user_level,
-        source_context=source_context,
+        source_context=packed_sources,
         speakers=speakers,
         num_segments=num_segments,
     )
@@ -333,6 +1100,17 @@ def generate_outline(
     outline["total_lessons"] = total_lessons
     outline["duration_minutes"] = duration_minutes
     outline["speakers"] = speakers
+    # URLs, not text: the outline goes back to clients. Stage 2 gets the text from the orchestrator
+    outline["source_urls"] = source_urls or []
+    outline["speech_rate"] = calibrated_speech_rate(speakers)  # Sizes every segment's target_words
+    outline["prompt_version"] = prompts.version()
+    outline["prompt_versions"] = prompts.versions()
+    outline["context_usage"] = {
+        "prompt_tokens": count_tokens(prompt),
+        "render_ms": prompts.stats()["templates"]["outline"]["last_render_ms"],
+        "prompt_tokens_saved": count_tokens(source_context) - count_tokens(packed_sources),
+    }
+    outline["container"] = openai_container_metrics()
 
     return outline
 
@@ -351,71 +1129,115 @@ def generate_segment_transcript(
     segment_index: int,
     previous_transcript: str = "",
     target_duration_seconds: int | None = None,
+    handoff: str = "",
+    story_so_far: str = "",
+    source_context: str = "",
 ) -> dict:
     """
     Stage 2: Generate transcript for a single segment
     Inspired by Open Notebook's transcript.jinja
-    """
-    import os
-    from openai import OpenAI
 
-    client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    source_context is the lesson's fetched source text, fetched once per lesson
+    by the orchestrator rather than once per segment.
+    """
+    client = get_openai_client()
 
     segment = outline["segments"][segment_index]
     is_final = segment_index == len(outline["segments"]) - 1
     speakers = outline.get("speakers", DEFAULT_SPEAKERS)
 
-    # Calculate turns based on segment size
-    min_turns = calculate_segment_turns(segment.get("size", "medium"))
     target_seconds = target_duration_seconds or _calculate_target_duration_seconds(
         outline, segment_index
     )
-    # Updated calculation: We want to generate MORE content to ensure lessons hit target duration.
-    # Using 210 wpm as the target to account for:
-    # - Dialogue formatting consuming tokens without adding audio time
-    # - Natural pauses between speakers
-    # - Buffer for TTS pacing variations
-    # - Tendency of LLMs to under-generate length
-    target_words = int((target_seconds / 60) * 210)
-    target_words_high = int(target_words * 1.25)  # Aim 25% higher for buffer
+    # Honest target; shortfalls are closed by continue_to_target instead of prompt inflation
+    words_per_minute = outline.get("speech_rate", {}).get("words_per_minute", LENGTH_CONTROL_CONFIG["words_per_minute"])
+    target_words = int((target_seconds / 60) * words_per_minute)
+    # Turns scale with the word target so the prompt never asks for more than the ceiling allows
+    min_turns = calculate_segment_turns(target_words)
     target_minutes = round(target_seconds / 60, 1)
 
-    print(f"📝 Segment {segment_index}: target_seconds={target_seconds}, target_words={target_words}, target_words_high={target_words_high}")
+    print(f"📝 Segment {segment_index}: target_seconds={target_seconds}, target_words={target_words}")
 
-    prompt = render_template(
-        TRANSCRIPT_PROMPT,
+    # Token-budgeted context; the baseline is what the untrimmed prompt used to send
+    outline_json = pack_outline(outline, segment_index, CONTEXT_BUDGET_CONFIG["outline_tokens"])
+    if story_so_far:
+        # The rolling summary replaces the raw tail; only the last line stays verbatim
+        last_line = previous_transcript.strip().splitlines()[-1:] if previous_transcript else []
+        previous_context = tail_tokens("\n".join(last_line), SUMMARY_MEMORY_CONFIG["last_turn_tokens"])
+    else:
+        previous_context = tail_tokens(previous_transcript, CONTEXT_BUDGET_CONFIG["transcript_tokens"])
+    source_excerpts = rank_source_chunks(
+        source_context,
+        f"{segment.get('name', '')} {segment.get('description', '')}",
+        CONTEXT_BUDGET_CONFIG["source_tokens"],
+    )
+    context_tokens = (
+        count_tokens(outline_json) + count_tokens(story_so_far)
+        + count_tokens(previous_context) + count_tokens(source_excerpts)
+    )
+    baseline_tokens = baseline_outline_tokens(outline) + count_tokens(previous_transcript[-2000:])
+
+    prompt = prompts.render(
+        "transcript",
         title=outline.get("title", ""),
         topic=outline.get("topic", ""),
         user_level=outline.get("user_level", "intermediate"),
         lesson_number=outline.get("lesson_number", 1),
         total_lessons=outline.get("total_lessons", 1),
         speakers=speakers,
-        outline_json=json.dumps(outline, indent=2),
-        previous_transcript=previous_transcript[-2000:] if previous_transcript else "",
+        outline_json=outline_json,
+        previous_transcript=previous_context,
+        story_so_far=story_so_far,
+        source_excerpts=source_excerpts,
+        handoff=handoff,
         segment=segment,
         is_final=is_final,
         min_turns=min_turns,
+        words_per_turn=LENGTH_CONTROL_CONFIG["words_per_turn"],
         target_seconds=target_seconds,
         target_words=target_words,
-        target_words_high=target_words_high,
         target_minutes=target_minutes,
     )
 
+    messages = [
+        {
+            "role": "system",
+            "content": "You are an expert podcast script writer. Create natural, engaging dialogue. Return only valid JSON.",
+        },
+        {"role": "user", "content": prompt},
+    ]
+    params = {
+        "model": "gpt-4-turbo-preview",
+        "response_format": {"type": "json_object"},
+        "temperature": 0.8,
+    }
     response = client.chat.completions.create(
-        model="gpt-4-turbo-preview",
-        messages=[
-            {
-                "role": "system",
-                "content": "You are an expert podcast script writer. Create natural, engaging dialogue. Return only valid JSON.",
-            },
-            {"role": "user", "content": prompt},
-        ],
-        response_format={"type": "json_object"},
-        max_tokens=3500,  # Increased from 2000 to allow for longer transcripts
-        temperature=0.8,
+        messages=messages,
+        # Overshoot ceiling; the final segment keeps full room so its wrap-up is never cut
+        max_tokens=3500 if is_final else completion_budget(target_words),
+        **params,
     )
 
-    return json.loads(response.choices[0].message.content)
+    result = parse_transcript_result(response.choices[0].message.content)
+    result.setdefault("segment_name", segment.get("name", f"Part {segment_index + 1}"))
+    result["transcript"] = result.get("transcript", [])
+    result["length_control"] = continue_to_target(
+        client,
+        messages,
+        params,
+        result["transcript"],
+        target_words,
+        is_final,
+        " and ".join(speaker["name"] for speaker in speakers),
+    )
+    result["context_usage"] = {
+        "prompt_tokens": count_tokens(prompt),
+        "render_ms": prompts.stats()["templates"]["transcript"]["last_render_ms"],
+        "context_tokens": context_tokens,
+        "prompt_tokens_saved": baseline_tokens - context_tokens,
+    }
+    result["container"] = openai_container_metrics()
+    return result
 
 
 # ============================================================================
@@ -439,15 +1261,25 @@ def generate_lesson_content(
     source_urls: list = None,
     style: str = "conversational",
     speakers: list = None,
+    parallel: bool = False,
 ) -> dict:
     """
     Generate complete lesson content using Open Notebook-style two-stage process:
     1. Generate outline with segments
     2. Generate transcript for each segment with multi-speaker dialogue
+
+    With parallel=True, segment transcripts are generated concurrently and
+    rely on outline-derived handoff notes for continuity.
     
     Returns structured content ready for TTS processing.
     """
+    import time
+
     print(f"🎙️ Generating lesson: {topic} ({duration_minutes} min)")
+    started_at = time.perf_counter()
+
+    # Sources are fetched once and shared by the outline and every segment
+    source_context = fetch_source_content(source_urls) if source_urls else ""
 
     # Stage 1: Generate outline
     print("📋 Stage 1: Generating outline...")
@@ -459,52 +1291,89 @@ def generate_lesson_content(
         duration_minutes=duration_minutes,
         source_urls=source_urls,
         speakers=speakers,
+        source_context=source_context,
     )
+    outline_seconds = time.perf_counter() - started_at
     print(f"✅ Outline created: {outline.get('title', 'Untitled')}")
     print(f"   Segments: {len(outline.get('segments', []))}")
 
     # Stage 2: Generate transcript for each segment
-    print("🎤 Stage 2: Generating transcripts...")
+    generation_mode = "parallel" if parallel else "sequential"
+    print(f"🎤 Stage 2: Generating transcripts ({generation_mode})...")
+    segments = outline.get("segments", [])
+    target_seconds_by_segment = [_calculate_target_duration_seconds(outline, i) for i in range(len(segments))]
+
+    if parallel:
+        # Fan out every segment at once, then collect results in outline order
+        calls = [
+            generate_segment_transcript.spawn(
+                outline=outline,
+                segment_index=i,
+                target_duration_seconds=target_seconds_by_segment[i],
+                handoff=build_segment_handoff(outline, i),
+                source_context=source_context,
+            )
+            for i in range(len(segments))
+        ]
+        segment_results = [call.get() for call in calls]
+    else:
+        segment_results = []
+        story_so_far = ""
+        recent_transcript = ""  # Bounded tail: last line for the hand-off, baseline for token accounting
+        for i, segment in enumerate(segments):
+            print(f"   Processing segment {i + 1}/{len(segments)}: {segment.get('name', 'Unknown')}")
+            segment_result = generate_segment_transcript.remote(
+                outline=outline,
+                segment_index=i,
+                previous_transcript=recent_transcript,
+                target_duration_seconds=target_seconds_by_segment[i],
+                story_so_far=story_so_far,
+                source_context=source_context,
+            )
+            segment_results.append(segment_result)
+
+            # Fold the segment into the rolling summary for the next one
+            segment_transcript = segment_result.get("transcript", [])
+            recent_transcript = (
+                recent_transcript + "".join(f"\n{turn['speaker']}: {turn['dialogue']}" for turn in segment_transcript)
+            )[-2000:]
+            if i < len(segments) - 1:
+                story_so_far = update_story_so_far(story_so_far, segment.get("name", f"Part {i + 1}"), segment_transcript)
+
     full_transcript = []
     segments_with_transcript = []
-    accumulated_transcript = ""
-
-    for i, segment in enumerate(outline.get("segments", [])):
-        print(f"   Processing segment {i + 1}/{len(outline['segments'])}: {segment.get('name', 'Unknown')}")
-
-        target_seconds = _calculate_target_duration_seconds(outline, i)
-        segment_result = generate_segment_transcript.remote(
-            outline=outline,
-            segment_index=i,
-            previous_transcript=accumulated_transcript,
-            target_duration_seconds=target_seconds,
-        )
+    script = ""
 
-        # Accumulate transcript for context
+    for i, (segment, segment_result) in enumerate(zip(segments, segment_results)):
         segment_transcript = segment_result.get("transcript", [])
         for turn in segment_transcript:
-            accumulated_transcript += f"\n{turn['speaker']}: {turn['dialogue']}"
+            script += f"\n{turn['speaker']}: {turn['dialogue']}"
 
         # Build combined segment text for TTS
         segment_text = " ".join([turn["dialogue"] for turn in segment_transcript])
 
         segments_with_transcript.append({
-            "type": "intro" if i == 0 else ("summary" if i == len(outline["segments"]) - 1 else "content"),
+            "type": "intro" if i == 0 else ("summary" if i == len(segments) - 1 else "content"),
             "title": segment.get("name", f"Part {i + 1}"),
             "text": segment_text,
             "transcript": segment_transcript,
-            "duration_estimate": segment_result.get("duration_estimate_seconds", target_seconds),
+            "duration_estimate": segment_result.get("duration_estimate_seconds", target_seconds_by_segment[i]),
             "key_points": segment.get("key_points", []),
         })
 
         full_transcript.extend(segment_transcript)
 
-    # Calculate total word count
-    total_words = sum(len(turn.get("dialogue", "").split()) for turn in full_transcript)
-    estimated_audio_minutes = total_words / 130  # ~130 wpm speaking rate
-    
+    total_seconds = time.perf_counter() - started_at
+
+    length_control = summarize_length_control(segment_results, outline.get("speech_rate", {}).get("words_per_minute"))
+
     print(f"✅ Generated {len(full_transcript)} dialogue turns across {len(segments_with_transcript)} segments")
-    print(f"📊 Total words: {total_words}, Estimated audio: {estimated_audio_minutes:.1f} min (target: {duration_minutes} min)")
+    print(
+        f"📊 Total words: {length_control.get('words', 0)}/{length_control.get('target_words', 0)}, "
+        f"Estimated audio: {length_control.get('estimated_audio_minutes', 0)} min (target: {duration_minutes} min), "
+        f"continuations: {length_control.get('continuation_calls', 0)}"
+    )
+    print(f"⏱️ {generation_mode}: outline={outline_seconds:.1f}s, total={total_seconds:.1f}s")
 
     # Build final result
     result = {
@@ -514,16 +1383,115 @@ def generate_lesson_content(
         "lesson_number": lesson_number,
         "total_lessons": total_lessons,
         "duration_minutes": duration_minutes,
-        "script": accumulated_transcript,  # Full script as text
+        "script": script,  # Full script as text
         "segments": segments_with_transcript,
         "full_transcript": full_transcript,  # For advanced TTS with multiple voices
         "key_takeaways": outline.get("key_takeaways", []),
         "speakers": outline.get("speakers", DEFAULT_SPEAKERS),
+        "generation": {
+            "mode": generation_mode,
+            "outline_seconds": round(outline_seconds, 2),
+            "total_seconds": round(total_seconds, 2),
+            "prompt_tokens_saved": outline.get("context_usage", {}).get("prompt_tokens_saved", 0) + sum(
+                r.get("context_usage", {}).get("prompt_tokens_saved", 0) for r in segment_results
+            ),
+            "length_control": length_control,
+            "openai_pool": summarize_client_reuse([outline, *segment_results]),
+        },
     }
 
     return result
 
 
+@app.function(
+    image=image,
+    timeout=1800,  # Runs both modes back to back
+    secrets=[
+        modal.Secret.from_name("openai-secret"),
+        modal.Secret.from_name("supabase-secret"),
+    ],
+)
+def benchmark_generation_modes(topic: str, duration_minutes: int = 15, user_level: str = "intermediate") -> dict:
+    """Generate the same lesson in sequential and parallel mode and report end-to-end latency"""
+    import time
+
+    report = {"topic": topic, "duration_minutes": duration_minutes}
+    for mode in ("sequential", "parallel"):
+        started_at = time.perf_counter()
+        lesson = generate_lesson_content.remote(
+            topic=topic,
+            user_level=user_level,
+            duration_minutes=duration_minutes,
+            parallel=mode == "parallel",
+        )
+        report[mode] = {
+            "end_to_end_seconds": round(time.perf_counter() - started_at, 2),
+            "segments": len(lesson["segments"]),
+            "words": sum(len(turn.get("dialogue", "").split()) for turn in lesson["full_transcript"]),
+            **lesson["generation"],
+        }
+
+    report["speedup"] = round(
+        report["sequential"]["end_to_end_seconds"] / max(0.01, report["parallel"]["end_to_end_seconds"]), 2
+    )
+    print(f"⏱️ Sequential {report['sequential']['end_to_end_seconds']}s vs parallel {report['parallel']['end_to_end_seconds']}s ({report['speedup']}x)")
+    return report
+
+
+@app.function(image=image, timeout=600, volumes={"/corpus": html_corpus_volume})
+def benchmark_html_extraction(urls: list = None, runs: int = 5) -> dict:
+    """
+    Compare BeautifulSoup full-tree extraction with the streaming and selectolax
+    extractors on saved HTML pages. Pages missing from the corpus volume are
+    downloaded once and saved, so later runs measure the same bytes.
+    Reports mean latency and tracemalloc peak memory per extractor.
+    """
+    import hashlib
+    import os
+    import time
+    import tracemalloc
+    import httpx
+
+    urls = urls or BENCHMARK_SOURCE_URLS
+    pages = {}
+    for url in urls:
+        path = f"/corpus/{hashlib.sha256(url.encode('utf-8')).hexdigest()[:16]}.html"
+        if not os.path.exists(path):
+            response = httpx.get(url, timeout=30, follow_redirects=True)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(response.text)
+            html_corpus_volume.commit()
+        with open(path, encoding="utf-8") as f:
+            pages[url] = f.read()
+
+    max_chars = SOURCE_FETCH_CONFIG["max_chars"]
+    extractors = {
+        "bs4": extract_article_text_bs4,
+        "html_parser": lambda html: _extract_with_html_parser(html, max_chars),
+        "selectolax": lambda html: _extract_with_selectolax(html, max_chars),
+    }
+
+    report = {"pages": len(pages), "html_chars": sum(len(html) for html in pages.values()), "runs": runs}
+    for name, extract in extractors.items():
+        started_at = time.perf_counter()
+        for _ in range(runs):
+            for html in pages.values():
+                extract(html)
+        seconds = (time.perf_counter() - started_at) / runs
+
+        peak = 0
+        for html in pages.values():
+            tracemalloc.start()
+            extract(html)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+        report[name] = {"ms_per_corpus": round(seconds * 1000, 1), "peak_kib": round(peak / 1024, 1)}
+        print(f"⏱️ {name}: {report[name]['ms_per_corpus']}ms per corpus, peak {report[name]['peak_kib']} KiB")
+
+    return report
+
+
 # ============================================================================
 # HTTP Endpoints
 # ============================================================================
@@ -550,6 +1518,7 @@ def generate_content(request: dict) -> dict:
             source_urls=request.get("source_urls", []),
             style=request.get("style", "conversational"),
             speakers=request.get("speakers"),  # Optional custom speakers
+            parallel=request.get("parallel", False),
         )
         return {"success": True, "lesson": result}
     except Exception as e:
@@ -599,7 +1568,16 @@ def health() -> dict:
             "two-stage-generation",
             "multi-speaker-dialogue",
             "open-notebook-aligned",
+            "parallel-segment-generation",
+            "concurrent-source-fetching",
+            "source-cache",
+            "fast-html-extraction",
+            "prompt-registry",
+            "length-control",
+            "speech-rate-calibration",
         ],
+        "prompts": prompts.stats(),
+        "source_cache": source_cache.stats(),
     }
 
 
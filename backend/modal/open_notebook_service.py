@@ -10,10 +10,14 @@ Two-stage podcast generation pipeline:
 """
 import modal
 import json
+from pathlib import Path
 from typing import Optional
 
 app = modal.App("daydif-content")
 
+# Prompt templates live next to this file locally and under /root in the container
+PROMPTS_DIR = Path(__file__).parent / "prompts" / "open_notebook"
+
 # Image with content generation dependencies
 image = (
     modal.Image.debian_slim(python_version="3.11")
@@ -21,10 +25,93 @@ image = (
         "openai",
         "jinja2",
         "httpx",
+        "tiktoken",
         "fastapi",
     )
+    .add_local_dir(PROMPTS_DIR, remote_path="/root/prompts/open_notebook")
 )
 
+# ============================================================================
+# LLM Scheduler - shared rate-limit budget and adaptive concurrency for OpenAI
+# ============================================================================
+
+RATE_LIMIT_CONFIG = {
+    "tokens_per_minute": 300_000,  # Starting guesses; replaced by x-ratelimit-* headers
+    "requests_per_minute": 500,
+    "initial_concurrency": 4,
+    "min_concurrency": 1,
+    "max_concurrency": 24,
+    "additive_increase": 1.0,  # Added per window of successful calls (AIMD)
+    "multiplicative_decrease": 0.5,  # Applied on every 429
+    "interactive_reserve": 0.2,  # Share of the token budget background work leaves for previews
+    "lease_seconds": 300,  # In-flight slots expire if a container dies mid-call
+    "acquire_timeout_seconds": 180,  # acquire() raises TimeoutError past this
+    "max_retries": 6,
+    "base_backoff_seconds": 1.0,
+    "max_backoff_seconds": 30.0,
+    "stats_publish_seconds": 10,  # How often the budget snapshots its stats for /health
+}
+
+# Budget stats published by RateLimitBudget, so /health never has to start it
+scheduler_stats_store = modal.Dict.from_name("daydif-llm-scheduler-stats", create_if_missing=True)
+
+# ============================================================================
+# Completion Cache - content-addressed outline/transcript cache
+# ============================================================================
+
+CACHE_CONFIG = {
+    "enabled": True,  # Global kill switch; callers can also pass use_cache=False
+    "max_entries": 2000,  # LRU bound on cached completions
+    "evict_slack": 0.1,  # Scan for LRU victims only once the cache is 10% over its bound
+    "ttl_seconds": 7 * 24 * 3600,  # Cached completions expire after 7 days
+}
+
+# Shared across all containers of this app
+completion_cache_store = modal.Dict.from_name("daydif-content-cache", create_if_missing=True)
+
+# ============================================================================
+# Context Budgets - token-aware packing of prompt context
+# ============================================================================
+
+CONTEXT_BUDGET_CONFIG = {
+    "encoding": "cl100k_base",  # Tokenizer for the gpt-4 family
+    "outline_tokens": 800,  # Compact outline JSON in each segment prompt
+    "transcript_tokens": 500,  # Tail of the transcript so far (sequential mode)
+}
+
+# Rolling "story so far" memory that replaces the raw transcript tail in sequential mode
+SUMMARY_MEMORY_CONFIG = {
+    "mode": "llm",  # "llm" (cheap model call) or "extractive"
+    "model": "gpt-4o-mini",
+    "max_words": 180,  # Length of the rolling summary
+    "summary_tokens": 320,  # Hard cap used by the extractive mode
+    "last_turn_tokens": 120,  # The final line is still passed verbatim for the hand-off
+}
+
+# ============================================================================
+# Length Control - measure each segment against its target, continue only when short
+# ============================================================================
+
+LENGTH_CONTROL_CONFIG = {
+    "enabled": True,
+    "words_per_minute": 150,  # Fallback until the TTS calibration has enough samples
+    "tolerance": 0.1,  # Segments within 10% of target words are accepted as-is
+    "min_continuation_words": 60,  # Smaller shortfalls aren't worth another call
+    "max_continuations": 2,
+    "overshoot_ratio": 1.2,  # Completion ceiling relative to target; generation stops there
+    "tokens_per_word": 1.6,  # Dialogue plus JSON framing, for sizing max_tokens
+    "words_per_turn": 50,  # Typical turn length; min_turns is derived from target words with it
+}
+
+# Speaking rate measured by the TTS service from every synthesized turn
+SPEECH_RATE_CONFIG = {
+    "enabled": True,
+    "min_words": 2000,  # Samples a voice profile needs before its fitted rate replaces the default
+    "round_to_wpm": 5,  # Keeps prompts (and completion-cache keys) stable as the fit drifts
+}
+# Written by TTSGenerator in the TTS app (named Dicts are workspace-wide)
+speech_rate_store = modal.Dict.from_name("daydif-speech-rate", create_if_missing=True)
+
 # ============================================================================
 # Episode Profiles - Speaker Configuration (Open Notebook style)
 # Maps to Chatterbox TTS voice parameters
@@ -54,182 +141,626 @@ DEFAULT_EPISODE_PROFILE = {
         },
     ],
     "style": "conversational",
-    "min_turns_per_segment": 6,  # Increased from 4 for more content
+    "min_turns_per_segment": 4,  # Floor; longer segments scale with their target words
 }
 
 # ============================================================================
-# Prompt Templates (Ported from Open Notebook)
+# Prompt Templates - versioned .jinja files in prompts/open_notebook/
 # ============================================================================
 
-OUTLINE_PROMPT = """You are an AI assistant specialized in creating podcast outlines.
-Your task is to create a detailed outline for a podcast episode based on the provided topic and context.
-
-Here is the topic for the podcast episode:
-<topic>
-{{ topic }}
-</topic>
-
-{% if lesson_context %}
-Additional context about this lesson:
-<context>
-{{ lesson_context }}
-</context>
-{% endif %}
-
-The podcast will feature the following speakers:
-<speakers>
-{% for speaker in speakers %}
-- **{{ speaker.name }}**: {{ speaker.backstory }}
-  Personality: {{ speaker.personality }}
-{% endfor %}
-</speakers>
-
-This is lesson {{ lesson_number }} of {{ total_lessons }} in a learning series.
-{% if lesson_number == 1 %}
-- This is the FIRST lesson: introduce the topic broadly, set expectations for the series.
-{% elif lesson_number == total_lessons %}
-- This is the FINAL lesson: wrap up the series comprehensively, summarize key learnings.
-{% else %}
-- Build on previous concepts, introduce new material progressively.
-{% endif %}
-
-Target duration: {{ duration_minutes }} minutes (approximately {{ words_estimate }} words total).
-
-Please create an outline based on this topic. Your outline should consist of {{ num_segments }} main segments for the podcast episode.
-
-Follow these guidelines:
-1. Read the topic carefully and identify the main concepts to cover.
-2. Create {{ num_segments }} distinct segments that build a complete learning journey.
-3. For each segment, provide a clear and concise name that reflects its content.
-4. Write a detailed description for each segment, explaining what will be discussed.
-5. Consider the speaker personalities when planning segments - match content to speaker expertise.
-6. Ensure that the segments flow logically from one to the next.
-7. This is a whole podcast so no need to reintroduce speakers on each segment.
-8. Include an introduction segment at the beginning and a conclusion segment at the end.
-9. The size field determines how long the segment should be (affects word count).
-
-Return your outline as JSON:
-{
-  "title": "Catchy episode title",
-  "summary": "2-3 sentence description of what listeners will learn",
-  "segments": [
-    {
-      "name": "Segment Name",
-      "description": "What will be covered and key points to discuss",
-      "size": "short|medium|long"
-    }
-  ],
-  "key_takeaways": ["takeaway 1", "takeaway 2", "takeaway 3"]
-}
+class PromptRegistry:
+    """
+    Loads prompt templates from PROMPTS_DIR through one shared jinja2 Environment.
+    Each template is compiled once per container (with a bytecode cache for
+    restarts) and renders are timed. version() hashes the template sources so
+    generated content can be traced back to the prompts that produced it.
+    """
 
-Size guide:
-- short: ~1-2 minutes (introduction, transitions, quick points)
-- medium: ~2-3 minutes (main content segments)
-- long: ~3-4 minutes (deep dives, complex explanations)
-
-Return only valid JSON, no additional text."""
-
-
-TRANSCRIPT_PROMPT = """You are an AI assistant specialized in creating podcast transcripts.
-Your task is to generate a natural dialogue transcript for a specific segment of a podcast episode.
-
-Here is the topic for the podcast:
-<topic>
-{{ topic }}
-</topic>
-
-{% if lesson_context %}
-Additional context:
-<context>
-{{ lesson_context }}
-</context>
-{% endif %}
-
-The podcast features the following speakers:
-<speakers>
-{% for speaker in speakers %}
-- **{{ speaker.name }}**: {{ speaker.backstory }}
-  Personality: {{ speaker.personality }}
-{% endfor %}
-</speakers>
-
-Here is the full episode outline:
-<outline>
-{{ outline_json }}
-</outline>
-
-{% if previous_transcript %}
-Here is the transcript so far (for continuity):
-<previous_transcript>
-{{ previous_transcript }}
-</previous_transcript>
-{% endif %}
-
-{% if is_final_segment %}
-This is the FINAL segment. Make sure to wrap up the conversation and provide a conclusion.
-{% endif %}
-
-You are creating dialogue for THIS segment only:
-<segment>
-Name: {{ segment_name }}
-Description: {{ segment_description }}
-Size: {{ segment_size }}
-</segment>
-
-Requirements:
-- Use the actual speaker names ({{ speaker_names }}) to denote speakers.
-- The transcript must have at least {{ min_turns }} turns of dialogue.
-- Choose which speaker should speak based on their personality and expertise.
-- Make the dialogue sound natural, conversational and engaging.
-- Include relevant details that teach the topic effectively.
-- Avoid long monologues; keep exchanges between speakers balanced.
-- Match each speaker's dialogue to their personality.
-{% if segment_size == "short" %}
-- This is a SHORT segment: aim for 250-350 words total.
-{% elif segment_size == "medium" %}
-- This is a MEDIUM segment: aim for 400-550 words total.
-{% else %}
-- This is a LONG segment: go deep, aim for 600-800 words total.
-{% endif %}
-
-**CRITICAL LENGTH REQUIREMENT - MANDATORY:**
-- Target audio length: {{ target_seconds }} seconds minimum (approximately {{ target_words }} words).
-- You MUST generate at least {{ target_words }} words. This is NOT optional.
-- Each speaker turn should be 2-4 sentences, NOT short one-liners.
-- If you generate less than {{ target_words }} words, the lesson will be TOO SHORT.
-- Expand with:
-  * Detailed explanations with examples
-  * Real-world analogies and scenarios
-  * Follow-up questions and answers
-  * "What if" situations
-  * Brief summaries of key points
-- Do NOT use filler; every word should teach something.
-
-Return your transcript as JSON:
-{
-  "transcript": [
-    {
-      "speaker": "Alex",
-      "dialogue": "Speaker's dialogue here..."
-    },
-    {
-      "speaker": "Sam", 
-      "dialogue": "Other speaker's response..."
-    }
-  ]
-}
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self._env = None
+        self._templates = {}
+        self._stats = {}
+
+    @property
+    def env(self):
+        if self._env is None:
+            import tempfile
+            from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+            cache_dir = Path(tempfile.gettempdir()) / "jinja-bytecode"
+            cache_dir.mkdir(exist_ok=True)
+            self._env = Environment(
+                loader=FileSystemLoader(str(self.directory)),
+                bytecode_cache=FileSystemBytecodeCache(str(cache_dir)),
+                auto_reload=False,  # Templates ship with the image and never change at runtime
+            )
+        return self._env
+
+    def get(self, name: str):
+        """Compiled template for name (file {name}.jinja), compiled on first use"""
+        import time
+
+        if name not in self._templates:
+            started_at = time.perf_counter()
+            self._templates[name] = self.env.get_template(f"{name}.jinja")
+            self._stats[name] = {
+                "compile_ms": round((time.perf_counter() - started_at) * 1000, 2),
+                "renders": 0,
+                "total_render_ms": 0.0,
+                "last_render_ms": 0.0,
+            }
+        return self._templates[name]
+
+    def render(self, name: str, **kwargs) -> str:
+        import time
+
+        template = self.get(name)
+        started_at = time.perf_counter()
+        text = template.render(**kwargs)
+        elapsed_ms = round((time.perf_counter() - started_at) * 1000, 3)
+
+        stats = self._stats[name]
+        stats["renders"] += 1
+        stats["total_render_ms"] = round(stats["total_render_ms"] + elapsed_ms, 3)
+        stats["last_render_ms"] = elapsed_ms
+        return text
+
+    def versions(self) -> dict:
+        """Short content hash per template"""
+        import hashlib
+
+        return {
+            path.stem: hashlib.sha256(path.read_bytes()).hexdigest()[:12]
+            for path in sorted(self.directory.glob("*.jinja"))
+        }
+
+    def version(self) -> str:
+        """Single hash over every template, stamped into outline metadata"""
+        import hashlib
+
+        return hashlib.sha256(json.dumps(self.versions(), sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+    def stats(self) -> dict:
+        return {"version": self.version(), "templates": self._stats}
+
+
+prompts = PromptRegistry(PROMPTS_DIR)
 
-Return only valid JSON, no additional text."""
 
 
 # ============================================================================
 # Helper Functions
 # ============================================================================
 
-def render_template(template: str, **kwargs) -> str:
-    """Render a Jinja2-style template with provided variables."""
-    from jinja2 import Template
-    return Template(template).render(**kwargs)
+_token_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken, falling back to ~4 characters per token"""
+    global _token_encoding
+    if not text:
+        return 0
+    if _token_encoding is None:
+        try:
+            import tiktoken
+            _token_encoding = tiktoken.get_encoding(CONTEXT_BUDGET_CONFIG["encoding"])
+        except Exception as e:
+            # Not installed, or the encoding file can't be downloaded
+            print(f"⚠️ tiktoken unavailable ({e}), estimating tokens from characters")
+            _token_encoding = False
+    if _token_encoding:
+        return len(_token_encoding.encode(text))
+    return max(1, len(text) // 4)
+
+
+def tail_tokens(text: str, max_tokens: int) -> str:
+    """Keep the last max_tokens of text, starting at a line boundary so no turn is cut mid-way"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    lines = text.splitlines()
+    kept, used = [], 0
+    for line in reversed(lines):
+        cost = count_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(line)
+        used += cost
+    return "\n".join(reversed(kept))
+
+
+def baseline_outline_tokens(outline: dict) -> int:
+    """
+    Tokens of the outline JSON the untrimmed segment prompt used to send: the
+    outline without the fields the pipeline has since stamped on it.
+    """
+    stamped = {"speech_rate", "prompt_version", "prompt_versions", "container"}
+    return count_tokens(json.dumps({k: v for k, v in outline.items() if k not in stamped}, indent=2))
+
+
+def pack_outline(outline: dict, segment_index: int, max_tokens: int) -> str:
+    """
+    Compact outline JSON for a segment prompt. Speakers, topic and other fields
+    already rendered elsewhere in the prompt are left out; when still over budget,
+    descriptions of the segments farthest from segment_index are dropped first.
+    """
+    segments = [
+        {key: segment[key] for key in ("name", "description", "size") if key in segment}
+        for segment in outline.get("segments", [])
+    ]
+    view = {
+        "title": outline.get("title", ""),
+        "summary": outline.get("summary", ""),
+        "segments": segments,
+    }
+
+    def render() -> str:
+        return json.dumps(view, separators=(",", ":"), ensure_ascii=False)
+
+    text = render()
+    for j in sorted(range(len(segments)), key=lambda j: -abs(j - segment_index)):
+        if count_tokens(text) <= max_tokens or abs(j - segment_index) <= 1:
+            break
+        segments[j].pop("description", None)
+        text = render()
+    return text
+
+
+class CompletionCache:
+    """
+    Content-addressed cache for LLM completions with TTL expiry and LRU eviction.
+
+    Keys are a stable hash of the rendered messages plus model parameters, so
+    identical (topic, lesson_number, total_lessons, duration, speakers, context)
+    requests reuse the earlier completion. Each entry carries its own last_used
+    timestamp, so containers never rewrite a shared index; eviction scans the
+    entries once the Dict grows evict_slack past max_entries. Hit/miss counters
+    live in the same Modal Dict and are best-effort under concurrency.
+    """
+
+    STATS_KEY = "__stats__"
+
+    def __init__(self, store, max_entries: int, ttl_seconds: int, evict_slack: float = 0.1):
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.evict_slack = evict_slack
+
+    @staticmethod
+    def make_key(kind: str, messages: list, **params) -> str:
+        """Hash the rendered prompt and model parameters into a cache key."""
+        import hashlib
+
+        payload = json.dumps({"kind": kind, "messages": messages, "params": params}, sort_keys=True)
+        return f"{kind}:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+    def get(self, key: str) -> Optional[str]:
+        import time
+
+        entry = self.store.get(key)
+        now = time.time()
+        if entry is None or now - entry["created_at"] > self.ttl_seconds:
+            if entry is not None:
+                self.store.pop(key, None)
+                self._count("expired")
+            self._count("misses")
+            return None
+
+        # Only this entry is rewritten, so concurrent touches of other keys can't be lost
+        self.store[key] = {**entry, "last_used": now}
+        self._count("hits")
+        return entry["value"]
+
+    def put(self, key: str, value: str) -> None:
+        import time
+
+        now = time.time()
+        self.store[key] = {"value": value, "created_at": now, "last_used": now}
+        if self.store.len() - 1 > self.max_entries * (1 + self.evict_slack):
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries, then least-recently-used ones until max_entries remain"""
+        import time
+
+        now = time.time()
+        live, evicted = [], 0
+        # Snapshot first: entries are popped while we go
+        for key, entry in list(self.store.items()):
+            if key.startswith("__"):  # Counters, not completions
+                continue
+            if now - entry["created_at"] > self.ttl_seconds:
+                self.store.pop(key, None)
+                evicted += 1
+            else:
+                live.append((entry.get("last_used", entry["created_at"]), key))
+
+        for _, key in sorted(live)[:max(0, len(live) - self.max_entries)]:
+            self.store.pop(key, None)
+            evicted += 1
+
+        if evicted:
+            self._count("evictions", evicted)
+            print(f"🧹 Evicted {evicted} cached completions")
+        return evicted
+
+    def stats(self) -> dict:
+        stats = dict(self.store.get(self.STATS_KEY) or {})
+        hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+        stats["entries"] = max(0, self.store.len() - (1 if stats else 0))
+        stats["hit_rate"] = round(hits / (hits + misses), 3) if hits + misses else 0.0
+        stats["max_entries"] = self.max_entries
+        stats["ttl_seconds"] = self.ttl_seconds
+        return stats
+
+    def _count(self, field: str, amount: int = 1) -> None:
+        stats = self.store.get(self.STATS_KEY) or {}
+        stats[field] = stats.get(field, 0) + amount
+        self.store[self.STATS_KEY] = stats
+
+
+completion_cache = CompletionCache(
+    completion_cache_store,
+    max_entries=CACHE_CONFIG["max_entries"],
+    ttl_seconds=CACHE_CONFIG["ttl_seconds"],
+    evict_slack=CACHE_CONFIG["evict_slack"],
+)
+
+
+def parse_ratelimit_reset(value: str) -> float:
+    """Parse OpenAI reset durations such as '1s', '6m0s' or '120ms' into seconds"""
+    import re
+
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    seconds = sum(float(amount) * units[unit] for amount, unit in re.findall(r"([\d.]+)(ms|s|m|h)", value or ""))
+    return seconds or 1.0
+
+
+class RateLimitState:
+    """
+    Token/request budget, in-flight leases and AIMD concurrency for OpenAI calls.
+    Plain state with no locking or I/O; RateLimitBudget serves one instance from
+    a single container.
+
+    The budget is debited with each call's estimate and resynced from OpenAI's
+    x-ratelimit-* headers. Concurrency adapts AIMD-style: +1 per window of
+    successes, halved on a 429. Background calls leave interactive_reserve of the
+    token budget (and one concurrency slot) for interactive outline previews.
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.tokens_limit = config["tokens_per_minute"]
+        self.requests_limit = config["requests_per_minute"]
+        self.tokens_remaining = config["tokens_per_minute"]
+        self.requests_remaining = config["requests_per_minute"]
+        self.reset_at = 0.0
+        self.concurrency = float(config["initial_concurrency"])
+        self.leases = {}
+        self.rate_limited = 0
+        self.errors = 0
+
+    def refresh(self, now: float) -> None:
+        if now >= self.reset_at:
+            # Budget window has rolled over since the last response we saw
+            self.tokens_remaining = self.tokens_limit
+            self.requests_remaining = self.requests_limit
+            self.reset_at = now + 60
+        self.leases = {lease: expires for lease, expires in self.leases.items() if expires > now}
+
+    def admits(self, tokens: int, priority: str) -> bool:
+        interactive = priority == "interactive"
+        reserve = 0 if interactive else self.config["interactive_reserve"] * self.tokens_limit
+        slots = int(self.concurrency) + (1 if interactive else 0)
+        return (
+            len(self.leases) < slots
+            and self.requests_remaining >= 1
+            and self.tokens_remaining - tokens >= reserve
+        )
+
+    def try_acquire(self, tokens: int, priority: str, now: float) -> dict:
+        """Admit and debit the call if it fits; otherwise say how long to wait before asking again"""
+        import uuid
+
+        self.refresh(now)
+        if self.admits(tokens, priority):
+            lease = uuid.uuid4().hex
+            self.leases[lease] = now + self.config["lease_seconds"]
+            self.tokens_remaining -= tokens
+            self.requests_remaining -= 1
+            return {"lease": lease}
+        # Interactive previews poll faster so they win the next free slot
+        poll = 0.25 if priority == "interactive" else 1.0
+        return {"lease": None, "retry_in": min(max(poll, self.reset_at - now), poll * 4)}
+
+    def release(self, lease: str, estimated_tokens: int, headers: dict, used_tokens: int, outcome: str, now: float) -> None:
+        """Return the slot, sync the budget from response headers and adapt concurrency"""
+        config = self.config
+        self.refresh(now)
+        self.leases.pop(lease, None)
+
+        if headers and headers.get("x-ratelimit-remaining-tokens") is not None:
+            self.tokens_limit = int(headers.get("x-ratelimit-limit-tokens", self.tokens_limit))
+            self.requests_limit = int(headers.get("x-ratelimit-limit-requests", self.requests_limit))
+            self.tokens_remaining = int(headers["x-ratelimit-remaining-tokens"])
+            self.requests_remaining = int(headers.get("x-ratelimit-remaining-requests", self.requests_remaining))
+            self.reset_at = now + parse_ratelimit_reset(headers.get("x-ratelimit-reset-tokens", "60s"))
+        elif used_tokens is not None:
+            # No headers: refund the over-estimate
+            self.tokens_remaining += estimated_tokens - used_tokens
+
+        if outcome == "rate_limited":
+            self.concurrency = max(config["min_concurrency"], self.concurrency * config["multiplicative_decrease"])
+            self.rate_limited += 1
+        elif outcome == "ok":
+            self.concurrency = min(config["max_concurrency"], self.concurrency + config["additive_increase"] / self.concurrency)
+        else:
+            self.errors += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "concurrency": round(self.concurrency, 2),
+            "inflight": len(self.leases),
+            "tokens_remaining": self.tokens_remaining,
+            "tokens_limit": self.tokens_limit,
+            "requests_remaining": self.requests_remaining,
+            "rate_limited": self.rate_limited,
+            "errors": self.errors,
+        }
+
+
+@app.cls(
+    image=image,
+    max_containers=1,  # One authoritative budget for the whole app
+    scaledown_window=600,
+)
+@modal.concurrent(max_inputs=200)
+class RateLimitBudget:
+    """
+    Admission control for every OpenAI call in the app. A single container holds
+    the RateLimitState in memory behind a lock, so check-and-debit is atomic no
+    matter how many LessonWriter containers fan out.
+    """
+
+    @modal.enter()
+    def setup(self):
+        import threading
+
+        self.lock = threading.Lock()
+        self.state = RateLimitState(RATE_LIMIT_CONFIG)
+        self.published_at = 0.0
+
+    def _publish(self, snapshot: dict, now: float) -> None:
+        """Write the stats snapshot for /health, at most every stats_publish_seconds"""
+        if now - self.published_at < RATE_LIMIT_CONFIG["stats_publish_seconds"]:
+            return
+        self.published_at = now
+        try:
+            scheduler_stats_store["budget"] = {**snapshot, "published_at": now}
+        except Exception as e:
+            print(f"⚠️ Scheduler stats not published: {e}")
+
+    @modal.method()
+    def try_acquire(self, tokens: int, priority: str = "background") -> dict:
+        """Admit and debit the call if it fits; otherwise say how long to wait before asking again"""
+        import time
+
+        with self.lock:
+            return self.state.try_acquire(tokens, priority, time.time())
+
+    @modal.method()
+    def release(self, lease: str, estimated_tokens: int, headers: dict = None, used_tokens: int = None, outcome: str = "ok") -> None:
+        """Return the slot, sync the budget from response headers and adapt concurrency"""
+        import time
+
+        with self.lock:
+            now = time.time()
+            self.state.release(lease, estimated_tokens, headers, used_tokens, outcome, now)
+            snapshot = self.state.snapshot()
+        self._publish(snapshot, now)
+
+    @modal.method()
+    def stats(self) -> dict:
+        import time
+
+        with self.lock:
+            self.state.refresh(time.time())
+            return self.state.snapshot()
+
+
+class LLMScheduler:
+    """
+    Caller side of RateLimitBudget, used around every OpenAI call: acquire() blocks
+    until the budget admits the call or raises TimeoutError after
+    acquire_timeout_seconds, release() reports the outcome and rate-limit headers,
+    and backoff() spaces out retries.
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self._budget = None
+
+    @property
+    def budget(self):
+        if self._budget is None:
+            self._budget = RateLimitBudget()
+        return self._budget
+
+    def acquire(self, tokens: int, priority: str = "background") -> str:
+        """Block until the call fits the shared budget; returns a lease id for release()"""
+        import random
+        import time
+
+        started_at = time.monotonic()
+        deadline = started_at + self.config["acquire_timeout_seconds"]
+        while True:
+            grant = self.budget.try_acquire.remote(tokens, priority)
+            if grant["lease"]:
+                waited = time.monotonic() - started_at
+                if waited > 0.5:
+                    print(f"🚦 {priority} LLM call admitted after {waited:.1f}s")
+                return grant["lease"]
+            delay = grant["retry_in"] * random.uniform(0.8, 1.2)
+            if time.monotonic() + delay > deadline:
+                raise TimeoutError(
+                    f"OpenAI rate-limit budget did not admit a {tokens}-token {priority} call "
+                    f"within {self.config['acquire_timeout_seconds']}s"
+                )
+            time.sleep(delay)
+
+    def release(self, lease: str, estimated_tokens: int, headers=None, used_tokens: int = None, outcome: str = "ok") -> None:
+        """Report a finished call; never raises, so it is safe in finally blocks"""
+        rate_headers = {
+            name.lower(): value for name, value in (headers or {}).items() if name.lower().startswith("x-ratelimit-")
+        }
+        try:
+            self.budget.release.remote(lease, estimated_tokens, rate_headers or None, used_tokens, outcome)
+        except Exception as e:
+            # The lease expires on its own after lease_seconds
+            print(f"⚠️ Rate-limit lease not released: {e}")
+
+    def backoff(self, attempt: int, retry_after: str = None) -> float:
+        """Full-jitter exponential backoff, or the server's retry-after when given"""
+        import random
+
+        if retry_after:
+            try:
+                return float(retry_after) + random.uniform(0, 0.5)
+            except ValueError:
+                pass
+        ceiling = min(self.config["max_backoff_seconds"], self.config["base_backoff_seconds"] * 2 ** attempt)
+        return random.uniform(0, ceiling)
+
+    def published_stats(self) -> dict:
+        """Last stats snapshot the budget published; never touches its container"""
+        import time
+
+        snapshot = scheduler_stats_store.get("budget")
+        if snapshot is None:
+            return {"published": False}
+        return {**snapshot, "age_seconds": round(time.time() - snapshot["published_at"], 1)}
+
+
+llm_scheduler = LLMScheduler(RATE_LIMIT_CONFIG)
+
+
+def estimate_request_tokens(messages: list, max_tokens: int) -> int:
+    """Prompt tokens plus the completion ceiling, debited from the budget up front"""
+    return sum(count_tokens(message["content"]) + 4 for message in messages) + max_tokens
+
+
+def scheduled_chat_completion(client, messages: list, priority: str = "background", **params):
+    """
+    Run a chat completion through llm_scheduler, retrying 429s, timeouts and 5xx
+    with jittered backoff instead of failing the whole lesson. The lease is always
+    released, whatever the call raises. Returns the completion.
+    """
+    import time
+    import openai
+
+    estimated = estimate_request_tokens(messages, params.get("max_tokens", 1000))
+    for attempt in range(RATE_LIMIT_CONFIG["max_retries"] + 1):
+        lease = llm_scheduler.acquire(estimated, priority)
+        outcome, headers, used_tokens, retry_after = "error", None, None, None
+        try:
+            raw = client.chat.completions.with_raw_response.create(messages=messages, **params)
+            response = raw.parse()
+            outcome, headers = "ok", raw.headers
+            used_tokens = response.usage.total_tokens if response.usage else None
+            return response
+        except openai.RateLimitError as e:
+            outcome, headers = "rate_limited", e.response.headers
+            error, retry_after = e, e.response.headers.get("retry-after")
+        except (openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError) as e:
+            error = e
+        finally:
+            llm_scheduler.release(lease, estimated, headers, used_tokens, outcome)
+
+        if attempt == RATE_LIMIT_CONFIG["max_retries"]:
+            raise error
+        delay = llm_scheduler.backoff(attempt, retry_after)
+        print(f"⏳ OpenAI {type(error).__name__}, retry {attempt + 1} in {delay:.1f}s")
+        time.sleep(delay)
+
+
+def cached_chat_completion(
+    kind: str,
+    messages: list,
+    use_cache: bool = True,
+    client=None,
+    priority: str = "background",
+    **params,
+) -> str:
+    """
+    Run an OpenAI chat completion, serving identical prompts from the completion cache.
+    Pass a pooled client to reuse its connections; otherwise a one-off client is built.
+    Misses go through the rate-limit scheduler at the given priority.
+    Returns the message content string.
+    """
+    import os
+    from openai import OpenAI
+
+    use_cache = use_cache and CACHE_CONFIG["enabled"]
+    cache_key = CompletionCache.make_key(kind, messages, **params) if use_cache else None
+
+    if cache_key:
+        cached = completion_cache.get(cache_key)
+        if cached is not None:
+            print(f"⚡ Cache hit for {kind}")
+            return cached
+
+    # Retries are owned by the scheduler
+    client = client or OpenAI(api_key=os.environ["OPENAI_API_KEY"], max_retries=0)
+    response = scheduled_chat_completion(client, messages, priority, **params)
+    content = response.choices[0].message.content
+
+    if cache_key:
+        completion_cache.put(cache_key, content)
+
+    return content
+
+
+def extractive_story_so_far(story_so_far: str, segment_name: str, transcript: list) -> str:
+    """Cheap fallback summary: first sentence of each turn, oldest segments dropped past the cap"""
+    import re
+
+    firsts = [re.split(r"(?<=[.!?])\s+", turn.get("dialogue", "").strip())[0] for turn in transcript]
+    line = f"{segment_name}: " + " ".join(sentence for sentence in firsts if sentence)
+    combined = f"{story_so_far}\n{line}".strip()
+    return tail_tokens(combined, SUMMARY_MEMORY_CONFIG["summary_tokens"])
+
+
+def update_story_so_far(
+    story_so_far: str, segment_name: str, transcript: list, use_cache: bool = True, client=None
+) -> str:
+    """
+    Fold a finished segment into the rolling summary. Each call sees the previous
+    summary plus one segment, so its cost stays flat as the lesson grows.
+    Pass a LessonWriter's pooled client; callers use LessonWriter.summarize_segment.
+    """
+    if SUMMARY_MEMORY_CONFIG["mode"] != "llm":
+        return extractive_story_so_far(story_so_far, segment_name, transcript)
+
+    prompt = prompts.render(
+        "story_so_far",
+        story_so_far=story_so_far,
+        segment_name=segment_name,
+        segment_transcript="\n".join(f"{turn['speaker']}: {turn['dialogue']}" for turn in transcript),
+        max_words=SUMMARY_MEMORY_CONFIG["max_words"],
+    )
+    try:
+        return cached_chat_completion(
+            "story_so_far",
+            messages=[{"role": "user", "content": prompt}],
+            use_cache=use_cache,
+            client=client,
+            model=SUMMARY_MEMORY_CONFIG["model"],
+            max_tokens=SUMMARY_MEMORY_CONFIG["max_words"] * 2,
+            temperature=0.2,
+        ).strip()
+    except Exception as e:
+        print(f"⚠️ Story-so-far summary failed ({e}), using extractive fallback")
+        return extractive_story_so_far(story_so_far, segment_name, transcript)
 
 
 def calculate_segments(duration_minutes: int) -> int:
@@ -253,9 +784,9 @@ def calculate_segments(duration_minutes: int) -> int:
     return result
 
 
-def estimate_words(duration_minutes: int) -> int:
-    """Estimate total words needed (roughly 150 words per minute for natural speech)."""
-    return duration_minutes * 150
+def estimate_words(duration_minutes: int, words_per_minute: float = None) -> int:
+    """Estimate total words needed at the given (default: configured) speaking rate."""
+    return int(duration_minutes * (words_per_minute or LENGTH_CONTROL_CONFIG["words_per_minute"]))
 
 
 def get_segment_duration_estimate(size: str, total_duration: int, num_segments: int) -> int:
@@ -265,11 +796,32 @@ def get_segment_duration_estimate(size: str, total_duration: int, num_segments:
     return int(avg_per_segment * multipliers.get(size, 1.0))
 
 
-def calculate_segment_turns(size: str, base_turns: int = 6) -> int:
-    """Scale minimum dialogue turns with segment size for richer conversations."""
-    # Increased base_turns from 4 to 6 for more content
-    multipliers = {"short": 1.5, "medium": 2, "long": 3}
-    return int(base_turns * multipliers.get(size, 2))
+def calculate_segment_turns(target_words: int, floor: int = 4) -> int:
+    """Minimum dialogue turns that still fit target_words at the typical turn length"""
+    return max(floor, target_words // LENGTH_CONTROL_CONFIG["words_per_turn"])
+
+
+def build_segment_handoff(outline: dict, segment_index: int) -> str:
+    """
+    Build a continuity note for a segment from the outline alone.
+    Used in parallel mode instead of the accumulated previous transcript.
+    """
+    segments = outline.get("segments", []) or []
+    lines = []
+
+    if segment_index > 0:
+        lines.append("Already covered earlier in the episode (do not repeat or re-introduce):")
+        for i, seg in enumerate(segments[:segment_index]):
+            lines.append(f"- Segment {i + 1} \"{seg.get('name', '')}\": {seg.get('description', '')}")
+        lines.append("Pick up naturally from the end of the previous segment; speakers are already introduced.")
+    else:
+        lines.append("This is the opening segment: welcome listeners and introduce the speakers.")
+
+    if segment_index < len(segments) - 1:
+        upcoming = segments[segment_index + 1]
+        lines.append(f"Coming up next: \"{upcoming.get('name', '')}\". End with a brief lead-in to it, without covering it.")
+
+    return "\n".join(lines)
 
 
 def _calculate_target_duration_seconds(outline: dict, segment_index: int) -> int:
@@ -288,109 +840,161 @@ def _calculate_target_duration_seconds(outline: dict, segment_index: int) -> int
     return result
 
 
-# ============================================================================
-# Stage 1: Generate Outline (Open Notebook style)
-# ============================================================================
+def speech_rate_key(exaggeration: float, cfg_weight: float) -> str:
+    """Profile key shared with the TTS service's record_speech_rate"""
+    return f"{float(exaggeration):.2f}|{float(cfg_weight):.2f}"
 
-@app.function(
-    image=image,
-    timeout=300,
-    secrets=[modal.Secret.from_name("openai-secret")],
-)
-def generate_outline(
-    topic: str,
-    lesson_number: int = 1,
-    total_lessons: int = 1,
-    duration_minutes: int = 10,
-    speakers: list = None,
-    lesson_context: str = "",
-) -> dict:
+
+def calibrated_speech_rate(speakers: list) -> dict:
     """
-    Stage 1: Generate lesson outline with segments.
-    Based on Open Notebook's outline.jinja template.
+    Words per minute of produced lesson audio for these speakers, averaged over
+    their voice profiles as fitted by the TTS service. Profiles without enough
+    samples use LENGTH_CONTROL_CONFIG["words_per_minute"]; speakers without
+    voice_params use the rate pooled over every calibrated profile.
     """
-    import os
-    from openai import OpenAI
+    default_wpm = LENGTH_CONTROL_CONFIG["words_per_minute"]
+    profiles = {}
+    if SPEECH_RATE_CONFIG["enabled"]:
+        try:
+            profiles = speech_rate_store.get("profiles") or {}
+        except Exception as e:
+            print(f"⚠️ Speech rate calibration unavailable: {e}")
+
+    def fitted_wpm(entries: list) -> Optional[float]:
+        words = sum(entry["words"] for entry in entries)
+        if words < SPEECH_RATE_CONFIG["min_words"]:
+            return None
+        seconds = sum(entry["seconds"] + entry["turns"] * entry["gap_seconds"] for entry in entries)
+        return 60 * words / seconds
+
+    rates = []
+    for speaker in speakers:
+        params = speaker.get("voice_params")
+        if params:
+            entry = profiles.get(speech_rate_key(params.get("exaggeration", 0.5), params.get("cfg_weight", 0.5)))
+            rates.append(fitted_wpm([entry] if entry else []))
+        else:
+            rates.append(fitted_wpm(list(profiles.values())))
+
+    calibrated = [rate for rate in rates if rate is not None]
+    mean_wpm = sum(rate if rate is not None else default_wpm for rate in rates) / max(1, len(rates))
+    step = SPEECH_RATE_CONFIG["round_to_wpm"]
+    words_per_minute = int(round(mean_wpm / step) * step) if calibrated else default_wpm
+    print(f"🗣️ Speaking rate: {words_per_minute} wpm ({len(calibrated)}/{len(rates)} speakers calibrated)")
+    return {
+        "words_per_minute": words_per_minute,
+        "source": "calibrated" if calibrated else "default",
+        "calibrated_speakers": len(calibrated),
+    }
 
-    client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
 
-    # Use default speakers if none provided
-    if not speakers:
-        speakers = DEFAULT_EPISODE_PROFILE["speakers"]
+def count_transcript_words(transcript: list) -> int:
+    return sum(len(turn.get("dialogue", "").split()) for turn in transcript)
 
-    num_segments = calculate_segments(duration_minutes)
-    words_estimate = estimate_words(duration_minutes)
 
-    prompt = render_template(
-        OUTLINE_PROMPT,
-        topic=topic,
-        lesson_number=lesson_number,
-        total_lessons=total_lessons,
-        duration_minutes=duration_minutes,
-        speakers=speakers,
-        num_segments=num_segments,
-        words_estimate=words_estimate,
-        lesson_context=lesson_context,
-    )
+def completion_budget(words: int) -> int:
+    """max_tokens that lets a transcript completion reach words * overshoot_ratio and no further"""
+    config = LENGTH_CONTROL_CONFIG
+    return int(words * config["overshoot_ratio"] * config["tokens_per_word"]) + 100
 
-    print(f"📋 Generating outline for: {topic}")
-    print(f"   Duration: {duration_minutes} min, Segments: {num_segments}")
 
-    response = client.chat.completions.create(
-        model="gpt-4-turbo-preview",
-        messages=[
-            {
-                "role": "system",
-                "content": "You are an expert educational podcast creator. Return only valid JSON.",
-            },
+def parse_transcript(content: str) -> list:
+    """Turns from a transcript completion; one cut off at its token ceiling keeps the turns that closed"""
+    try:
+        return json.loads(content).get("transcript", [])
+    except json.JSONDecodeError:
+        turns = TranscriptTurnParser().feed(content)
+        print(f"✂️ Completion stopped at its length ceiling, kept {len(turns)} complete turns")
+        return turns
+
+
+def continue_to_target(transcript: list, request: dict, complete) -> dict:
+    """
+    Closed-loop length control for one segment. While the transcript is short of
+    its target by more than the tolerance, ask for only the missing words as a
+    continuation of the same conversation; on the final segment the new turns go
+    before the sign-off. complete(messages, max_tokens) returns completion text.
+    Extends transcript in place and returns the segment's length report.
+    """
+    config = LENGTH_CONTROL_CONFIG
+    target_words = request["target_words"]
+    is_final = request["is_final"]
+    initial_words = words = count_transcript_words(transcript)
+    continuations = 0
+
+    while config["enabled"] and transcript and continuations < config["max_continuations"]:
+        missing_words = target_words - words
+        if missing_words < max(config["min_continuation_words"], target_words * config["tolerance"]):
+            break
+
+        print(f"  ➕ Segment is {words}/{target_words} words, continuing for ~{missing_words} more")
+        prompt = prompts.render(
+            "continuation",
+            words=words,
+            missing_words=missing_words,
+            target_words=target_words,
+            speaker_names=request["speaker_names"],
+            is_final_segment=is_final,
+        )
+        messages = request["messages"] + [
+            {"role": "assistant", "content": json.dumps({"transcript": transcript})},
             {"role": "user", "content": prompt},
-        ],
-        response_format={"type": "json_object"},
-        max_tokens=2000,
-        temperature=0.7,
-    )
+        ]
+        new_turns = parse_transcript(complete(messages, completion_budget(missing_words)))
+        continuations += 1
+        if not new_turns:
+            break
 
-    outline = json.loads(response.choices[0].message.content)
-    
-    # Enrich outline with metadata
-    outline["topic"] = topic
-    outline["lesson_number"] = lesson_number
-    outline["total_lessons"] = total_lessons
-    outline["duration_minutes"] = duration_minutes
-    outline["speakers"] = speakers
+        insert_at = len(transcript) - 1 if is_final else len(transcript)
+        transcript[insert_at:insert_at] = new_turns
+        words = count_transcript_words(transcript)
 
-    print(f"✅ Outline created: {outline.get('title', 'Untitled')}")
-    print(f"   Segments: {len(outline.get('segments', []))}")
+    return {
+        "target_words": target_words,
+        "initial_words": initial_words,
+        "words": words,
+        "continuations": continuations,
+        "ratio": round(words / max(1, target_words), 2),
+    }
 
-    return outline
+
+def summarize_length_control(results: list, words_per_minute: float = None) -> dict:
+    """Lesson-level view of how close segments landed to their word targets"""
+    reports = [r["length_control"] for r in results if r and r.get("length_control")]
+    if not reports:
+        return {}
+    target_words = sum(r["target_words"] for r in reports)
+    words = sum(r["words"] for r in reports)
+    return {
+        "target_words": target_words,
+        "words": words,
+        "ratio": round(words / max(1, target_words), 2),
+        "segments_continued": sum(1 for r in reports if r["continuations"]),
+        "continuation_calls": sum(r["continuations"] for r in reports),
+        "estimated_audio_minutes": round(words / (words_per_minute or LENGTH_CONTROL_CONFIG["words_per_minute"]), 1),
+    }
 
 
 # ============================================================================
 # Stage 2: Generate Segment Transcript (Open Notebook style)
 # ============================================================================
 
-@app.function(
-    image=image,
-    timeout=300,
-    secrets=[modal.Secret.from_name("openai-secret")],
-)
-def generate_segment_transcript(
+def _build_segment_request(
     topic: str,
     outline: dict,
     segment_index: int,
     previous_transcript: str = "",
     speakers: list = None,
     lesson_context: str = "",
+    handoff: str = "",
+    story_so_far: str = "",
 ) -> dict:
     """
-    Stage 2: Generate dialogue transcript for a single segment.
-    Based on Open Notebook's transcript.jinja template.
+    Render the transcript prompt for one segment.
+    Returns {"messages", "params", "result"} plus the length-control inputs;
+    "result" holds the segment fields that both the blocking and the streaming
+    variant return alongside the turns.
     """
-    import os
-    from openai import OpenAI
-
-    client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
-
     if not speakers:
         speakers = outline.get("speakers", DEFAULT_EPISODE_PROFILE["speakers"])
 
@@ -400,64 +1004,547 @@ def generate_segment_transcript(
 
     segment = segments[segment_index]
     is_final = segment_index == len(segments) - 1
-    
+
     # Get segment details
     segment_name = segment.get("name", f"Segment {segment_index + 1}")
     segment_description = segment.get("description", "")
     segment_size = segment.get("size", "medium")
 
     speaker_names = ", ".join([s["name"] for s in speakers])
-    min_turns = calculate_segment_turns(segment_size, DEFAULT_EPISODE_PROFILE["min_turns_per_segment"])
     target_seconds = _calculate_target_duration_seconds(outline, segment_index)
-    # Increased from 165 wpm to 180 wpm to generate more content
-    target_words = max(300, int((target_seconds / 60) * 180))
-    
+    words_per_minute = outline.get("speech_rate", {}).get("words_per_minute", LENGTH_CONTROL_CONFIG["words_per_minute"])
+    target_words = int((target_seconds / 60) * words_per_minute)
+    min_turns = calculate_segment_turns(target_words, DEFAULT_EPISODE_PROFILE["min_turns_per_segment"])
+
     print(f"📝 Segment {segment_index}: min_turns={min_turns}, target_seconds={target_seconds}, target_words={target_words}")
 
-    prompt = render_template(
-        TRANSCRIPT_PROMPT,
+    # Token-budgeted context; the baseline is what the untrimmed prompt used to send
+    outline_json = pack_outline(outline, segment_index, CONTEXT_BUDGET_CONFIG["outline_tokens"])
+    if story_so_far:
+        # The rolling summary replaces the raw tail; only the last line stays verbatim
+        last_line = previous_transcript.strip().splitlines()[-1:] if previous_transcript else []
+        previous_context = tail_tokens("\n".join(last_line), SUMMARY_MEMORY_CONFIG["last_turn_tokens"])
+    else:
+        previous_context = tail_tokens(previous_transcript, CONTEXT_BUDGET_CONFIG["transcript_tokens"])
+    context_tokens = count_tokens(outline_json) + count_tokens(story_so_far) + count_tokens(previous_context)
+    baseline_tokens = baseline_outline_tokens(outline) + count_tokens(previous_transcript[-2000:])
+
+    prompt = prompts.render(
+        "transcript",
         topic=topic,
         speakers=speakers,
-        outline_json=json.dumps(outline, indent=2),
-        previous_transcript=previous_transcript[-2000:] if previous_transcript else "",  # Last 2000 chars for context
+        outline_json=outline_json,
+        previous_transcript=previous_context,
+        story_so_far=story_so_far,
+        handoff=handoff,
         is_final_segment=is_final,
         segment_name=segment_name,
         segment_description=segment_description,
         segment_size=segment_size,
         speaker_names=speaker_names,
         min_turns=min_turns,
+        words_per_turn=LENGTH_CONTROL_CONFIG["words_per_turn"],
         lesson_context=lesson_context,
         target_seconds=target_seconds,
         target_words=target_words,
     )
 
-    print(f"  🎤 Generating transcript for segment {segment_index + 1}: {segment_name}")
-
-    response = client.chat.completions.create(
-        model="gpt-4-turbo-preview",
-        messages=[
+    return {
+        "messages": [
             {
                 "role": "system",
-                "content": "You are an expert podcast scriptwriter creating natural, engaging dialogue. Generate LONG, substantive dialogue turns. Return only valid JSON.",
+                "content": "You are an expert podcast scriptwriter creating natural, engaging dialogue. Return only valid JSON.",
             },
             {"role": "user", "content": prompt},
         ],
-        response_format={"type": "json_object"},
-        max_tokens=3500,  # Increased from 2000 for longer transcripts
-        temperature=0.8,
-    )
+        "params": {
+            "model": "gpt-4-turbo-preview",
+            "response_format": {"type": "json_object"},
+            # Overshoot ceiling; the final segment keeps full room so its wrap-up is never cut
+            "max_tokens": 3500 if is_final else completion_budget(target_words),
+            "temperature": 0.8,
+        },
+        "target_words": target_words,
+        "is_final": is_final,
+        "speaker_names": speaker_names,
+        "result": {
+            "segment_index": segment_index,
+            "segment_name": segment_name,
+            "segment_size": segment_size,
+            "duration_estimate_seconds": target_seconds,
+            "context_usage": {
+                "prompt_tokens": count_tokens(prompt),
+                "render_ms": prompts.stats()["templates"]["transcript"]["last_render_ms"],
+                "context_tokens": context_tokens,
+                "prompt_tokens_saved": baseline_tokens - context_tokens,
+            },
+        },
+    }
 
-    result = json.loads(response.choices[0].message.content)
-    transcript = result.get("transcript", [])
 
-    print(f"  ✅ Generated {len(transcript)} dialogue turns")
+class TranscriptTurnParser:
+    """
+    Incremental parser for {"transcript": [{...}, ...]} completions.
+    feed() takes text deltas and returns the turn objects that closed in them,
+    tracking string/escape state so braces inside dialogue don't confuse it.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.in_array = False
+        self.done = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.start = None
+
+    def feed(self, delta: str) -> list:
+        import re
+
+        self.buffer += delta
+        turns = []
+        if not self.in_array:
+            match = re.search(r'"transcript"\s*:\s*\[', self.buffer)
+            if not match:
+                return turns
+            self.in_array = True
+            self.pos = match.end()
+
+        while self.pos < len(self.buffer) and not self.done:
+            char = self.buffer[self.pos]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char == "{":
+                if self.depth == 0:
+                    self.start = self.pos
+                self.depth += 1
+            elif char == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    turns.append(json.loads(self.buffer[self.start:self.pos + 1]))
+                    # Drop consumed text so the buffer stays one turn long
+                    self.buffer = self.buffer[self.pos + 1:]
+                    self.pos = -1
+            elif char == "]" and self.depth == 0:
+                self.done = True
+            self.pos += 1
+        return turns
+
+
+# ============================================================================
+# Lesson Writer - outline + transcript generation on warm containers
+# ============================================================================
+
+OPENAI_POOL_CONFIG = {
+    "max_connections": 20,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry_seconds": 300,  # Matches the container scaledown window
+    "timeout_seconds": 120,
+}
+
+
+@app.cls(
+    image=image,
+    timeout=300,
+    secrets=[modal.Secret.from_name("openai-secret")],
+    scaledown_window=300,  # Keep warm (and connected) between a lesson's calls
+)
+class LessonWriter:
+    """
+    Runs Stage 1 and Stage 2 LLM calls. Each container opens one pooled sync and
+    one async OpenAI client at startup, so the 5-10 calls of a lesson reuse
+    keep-alive TLS connections instead of building a client per call.
+    """
+
+    @modal.enter()
+    def connect(self):
+        """Create the pooled clients and pay connection setup once per container"""
+        import os
+        import time
+        import httpx
+        from openai import AsyncOpenAI, OpenAI
+
+        limits = httpx.Limits(
+            max_connections=OPENAI_POOL_CONFIG["max_connections"],
+            max_keepalive_connections=OPENAI_POOL_CONFIG["max_keepalive_connections"],
+            keepalive_expiry=OPENAI_POOL_CONFIG["keepalive_expiry_seconds"],
+        )
+        timeout = httpx.Timeout(OPENAI_POOL_CONFIG["timeout_seconds"], connect=10)
+
+        started_at = time.perf_counter()
+        # Retries are owned by llm_scheduler, so the SDK's own retry loop is off
+        self.client = OpenAI(
+            api_key=os.environ["OPENAI_API_KEY"],
+            http_client=httpx.Client(limits=limits, timeout=timeout),
+            max_retries=0,
+        )
+        self.async_client = AsyncOpenAI(
+            api_key=os.environ["OPENAI_API_KEY"],
+            http_client=httpx.AsyncClient(limits=limits, timeout=timeout),
+            max_retries=0,
+        )
+        # One cheap request opens the TLS connection the pool will keep alive
+        self.client.models.list()
+        self.connection_setup_seconds = round(time.perf_counter() - started_at, 3)
+        self.requests_served = 0
+        print(f"🔌 OpenAI client pool connected in {self.connection_setup_seconds}s")
+
+    @modal.exit()
+    async def disconnect(self):
+        """Close both pools so their keep-alive connections are shut down cleanly"""
+        self.client.close()
+        await self.async_client.close()
+
+    @modal.method()
+    def summarize_segment(self, story_so_far: str, segment_name: str, transcript: list, use_cache: bool = True) -> str:
+        """update_story_so_far over this container's pooled client"""
+        return update_story_so_far(story_so_far, segment_name, transcript, use_cache, client=self.client)
+
+    def _container_metrics(self) -> dict:
+        """Connection setup cost and reuse count for this container"""
+        self.requests_served += 1
+        return {
+            "connection_setup_seconds": self.connection_setup_seconds,
+            "requests_served": self.requests_served,
+        }
+
+    @modal.method()
+    def generate_outline(
+        self,
+        topic: str,
+        lesson_number: int = 1,
+        total_lessons: int = 1,
+        duration_minutes: int = 10,
+        speakers: list = None,
+        lesson_context: str = "",
+        use_cache: bool = True,
+        priority: str = "background",
+    ) -> dict:
+        """
+        Stage 1: Generate lesson outline with segments.
+        Based on Open Notebook's outline.jinja template.
+        priority="interactive" is used for previews and jumps background plan generation.
+        """
+        # Use default speakers if none provided
+        if not speakers:
+            speakers = DEFAULT_EPISODE_PROFILE["speakers"]
+
+        num_segments = calculate_segments(duration_minutes)
+        speech_rate = calibrated_speech_rate(speakers)
+        words_estimate = estimate_words(duration_minutes, speech_rate["words_per_minute"])
+
+        prompt = prompts.render(
+            "outline",
+            topic=topic,
+            lesson_number=lesson_number,
+            total_lessons=total_lessons,
+            duration_minutes=duration_minutes,
+            speakers=speakers,
+            num_segments=num_segments,
+            words_estimate=words_estimate,
+            lesson_context=lesson_context,
+        )
+
+        print(f"📋 Generating outline for: {topic}")
+        print(f"   Duration: {duration_minutes} min, Segments: {num_segments}")
+
+        content = cached_chat_completion(
+            "outline",
+            client=self.client,
+            priority=priority,
+            messages=[
+                {
+                    "role": "system",
+                    "content": "You are an expert educational podcast creator. Return only valid JSON.",
+                },
+                {"role": "user", "content": prompt},
+            ],
+            use_cache=use_cache,
+            model="gpt-4-turbo-preview",
+            response_format={"type": "json_object"},
+            max_tokens=2000,
+            temperature=0.7,
+        )
+
+        outline = json.loads(content)
+
+        # Enrich outline with metadata
+        outline["topic"] = topic
+        outline["lesson_number"] = lesson_number
+        outline["total_lessons"] = total_lessons
+        outline["duration_minutes"] = duration_minutes
+        outline["speakers"] = speakers
+        outline["speech_rate"] = speech_rate  # Sizes every segment's target_words
+        outline["prompt_version"] = prompts.version()
+        outline["prompt_versions"] = prompts.versions()
+        outline["container"] = self._container_metrics()
+
+        print(f"✅ Outline created: {outline.get('title', 'Untitled')}")
+        print(f"   Segments: {len(outline.get('segments', []))}")
+
+        return outline
+
+    @modal.method()
+    def generate_segment_transcript(
+        self,
+        topic: str,
+        outline: dict,
+        segment_index: int,
+        previous_transcript: str = "",
+        speakers: list = None,
+        lesson_context: str = "",
+        handoff: str = "",
+        use_cache: bool = True,
+        story_so_far: str = "",
+        priority: str = "background",
+    ) -> dict:
+        """
+        Stage 2: Generate dialogue transcript for a single segment.
+        Based on Open Notebook's transcript.jinja template.
+
+        Continuity comes from either the rolling story_so_far summary plus the last
+        line of previous_transcript (sequential mode) or an outline-derived handoff
+        note (parallel mode).
+        """
+        request = _build_segment_request(
+            topic, outline, segment_index, previous_transcript, speakers, lesson_context, handoff, story_so_far
+        )
+        result = request["result"]
+
+        print(f"  🎤 Generating transcript for segment {segment_index + 1}: {result['segment_name']}")
+
+        content = cached_chat_completion(
+            "transcript",
+            client=self.client,
+            priority=priority,
+            messages=request["messages"],
+            use_cache=use_cache,
+            **request["params"],
+        )
+
+        transcript = parse_transcript(content)
+        length_control = continue_to_target(
+            transcript,
+            request,
+            lambda messages, max_tokens: cached_chat_completion(
+                "continuation",
+                client=self.client,
+                priority=priority,
+                messages=messages,
+                use_cache=use_cache,
+                **{**request["params"], "max_tokens": max_tokens},
+            ),
+        )
+
+        print(f"  ✅ Generated {len(transcript)} dialogue turns ({length_control['words']}/{length_control['target_words']} words)")
+
+        return {
+            **result,
+            "transcript": transcript,
+            "length_control": length_control,
+            "container": self._container_metrics(),
+        }
+
+    @modal.method()
+    async def stream_segment_transcript(
+        self,
+        topic: str,
+        outline: dict,
+        segment_index: int,
+        previous_transcript: str = "",
+        speakers: list = None,
+        lesson_context: str = "",
+        handoff: str = "",
+        use_cache: bool = True,
+        story_so_far: str = "",
+        priority: str = "background",
+    ):
+        """
+        Streaming variant of generate_segment_transcript.
+
+        Yields {"event": "turn", "data": {...}} for each dialogue turn as soon as its
+        JSON object closes in the token stream, then {"event": "complete", "data": ...}
+        with the same fields generate_segment_transcript returns plus stream timings.
+        Consume with LessonWriter().stream_segment_transcript.remote_gen(...).
+        Tokens arrive over the container's pooled async client. The stream is closed
+        once a non-final segment passes its overshoot ceiling; short segments get
+        continuation turns after it ends (on the final segment the last turn is held
+        back so they can land before the sign-off).
+        """
+        import asyncio
+        import time
+        import openai
+
+        started_at = time.perf_counter()
+        request = _build_segment_request(
+            topic, outline, segment_index, previous_transcript, speakers, lesson_context, handoff, story_so_far
+        )
+        result = request["result"]
+        print(f"  🎤 Streaming transcript for segment {segment_index + 1}: {result['segment_name']}")
+
+        use_cache = use_cache and CACHE_CONFIG["enabled"]
+        cache_key = CompletionCache.make_key("transcript", request["messages"], **request["params"]) if use_cache else None
+        cached = await asyncio.to_thread(completion_cache.get, cache_key) if cache_key else None
+
+        async def deltas():
+            if cached is not None:
+                yield cached
+                return
+
+            # Admission and retries happen before the first token; the lease is held until the stream ends
+            estimated = estimate_request_tokens(request["messages"], request["params"]["max_tokens"])
+            for attempt in range(RATE_LIMIT_CONFIG["max_retries"] + 1):
+                lease = await asyncio.to_thread(llm_scheduler.acquire, estimated, priority)
+                try:
+                    raw = await self.async_client.chat.completions.with_raw_response.create(
+                        messages=request["messages"],
+                        stream=True,
+                        stream_options={"include_usage": True},
+                        **request["params"],
+                    )
+                    break
+                except openai.RateLimitError as e:
+                    await asyncio.to_thread(llm_scheduler.release, lease, estimated, e.response.headers, None, "rate_limited")
+                    error, retry_after = e, e.response.headers.get("retry-after")
+                except (openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError) as e:
+                    await asyncio.to_thread(llm_scheduler.release, lease, estimated, None, None, "error")
+                    error, retry_after = e, None
+                except BaseException:
+                    await asyncio.to_thread(llm_scheduler.release, lease, estimated, None, None, "error")
+                    raise
+                if attempt == RATE_LIMIT_CONFIG["max_retries"]:
+                    raise error
+                delay = llm_scheduler.backoff(attempt, retry_after)
+                print(f"⏳ OpenAI {type(error).__name__}, retry {attempt + 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+            used_tokens = None
+            outcome = "error"
+            stream = None
+            try:
+                stream = await raw.parse()
+                async for chunk in stream:
+                    if chunk.usage:
+                        used_tokens = chunk.usage.total_tokens
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                outcome = "ok"
+            except GeneratorExit:
+                # Closed early at the overshoot ceiling: a successful call, not a failure
+                outcome = "ok"
+                raise
+            finally:
+                try:
+                    if stream is not None:
+                        await stream.close()
+                finally:
+                    await asyncio.to_thread(llm_scheduler.release, lease, estimated, raw.headers, used_tokens, outcome)
+
+        parser = TranscriptTurnParser()
+        content_parts, transcript = [], []
+        first_turn_at = None
+        emitted = 0
+        ceiling_words = request["target_words"] * LENGTH_CONTROL_CONFIG["overshoot_ratio"]
+
+        def turn_events(holdback: int) -> list:
+            nonlocal emitted
+            events = []
+            while emitted < len(transcript) - holdback:
+                turn = transcript[emitted]
+                events.append({
+                    "event": "turn",
+                    "data": {
+                        "segment_index": segment_index,
+                        "turn_index": emitted,
+                        "speaker": turn.get("speaker", ""),
+                        "dialogue": turn.get("dialogue", ""),
+                        "elapsed_seconds": round(time.perf_counter() - started_at, 2),
+                    },
+                })
+                emitted += 1
+            return events
+
+        holdback = 1 if request["is_final"] else 0
+        overshoot = False
+        stream = deltas()
+        async for delta in stream:
+            content_parts.append(delta)
+            for turn in parser.feed(delta):
+                if first_turn_at is None:
+                    first_turn_at = time.perf_counter()
+                    print(f"  ⚡ First turn after {first_turn_at - started_at:.1f}s")
+                transcript.append(turn)
+                for event in turn_events(holdback):
+                    yield event
+            if not request["is_final"] and count_transcript_words(transcript) >= ceiling_words:
+                overshoot = True
+                print(f"  ✂️ Stopping stream at the overshoot ceiling ({ceiling_words:.0f} words)")
+                break
+        await stream.aclose()
+
+        content = "".join(content_parts)
+        if cache_key and cached is None and not overshoot:
+            await asyncio.to_thread(completion_cache.put, cache_key, content)
+
+        # Safety net: anything the incremental parser missed comes from the full parse
+        if not overshoot:
+            transcript.extend(parse_transcript(content)[len(transcript):])
+
+        def complete(messages: list, max_tokens: int) -> str:
+            return cached_chat_completion(
+                "continuation",
+                client=self.client,
+                priority=priority,
+                messages=messages,
+                use_cache=use_cache,
+                **{**request["params"], "max_tokens": max_tokens},
+            )
+
+        length_control = await asyncio.to_thread(continue_to_target, transcript, request, complete)
+        for event in turn_events(0):
+            yield event
+
+        total_seconds = time.perf_counter() - started_at
+        print(f"  ✅ Streamed {len(transcript)} dialogue turns in {total_seconds:.1f}s")
+        yield {
+            "event": "complete",
+            "data": {
+                **result,
+                "transcript": transcript,
+                "length_control": length_control,
+                "streaming": {
+                    "first_turn_seconds": round(first_turn_at - started_at, 2) if first_turn_at else None,
+                    "total_seconds": round(total_seconds, 2),
+                    "cached": cached is not None,
+                },
+                "container": self._container_metrics(),
+            },
+        }
+
 
+def summarize_client_reuse(results: list) -> dict:
+    """
+    Per-lesson view of client pooling: how many LLM calls hit a fresh container
+    (and paid setup) versus reused a warm pool, and the setup time that reuse saved.
+    """
+    metrics = [r["container"] for r in results if r and r.get("container")]
+    if not metrics:
+        return {}
+    fresh = [m for m in metrics if m["requests_served"] == 1]
+    mean_setup = sum(m["connection_setup_seconds"] for m in metrics) / len(metrics)
     return {
-        "segment_index": segment_index,
-        "segment_name": segment_name,
-        "segment_size": segment_size,
-        "transcript": transcript,
-        "duration_estimate_seconds": target_seconds,
+        "llm_calls": len(metrics),
+        "client_setups": len(fresh),
+        "connection_setup_seconds_paid": round(sum(m["connection_setup_seconds"] for m in fresh), 3),
+        "connection_setup_seconds_saved": round(mean_setup * (len(metrics) - len(fresh)), 3),
     }
 
 
@@ -465,6 +1552,85 @@ def generate_segment_transcript(
 # Combined Generation: Full Lesson Content
 # ============================================================================
 
+def _build_segment_data(outline: dict, segment_index: int, segment_result: dict, duration_minutes: int) -> dict:
+    """Shape a generate_segment_transcript result into the segment format the TTS service expects."""
+    segments = outline["segments"]
+    segment_transcript = segment_result["transcript"]
+    transcript_text = " ".join([turn["dialogue"] for turn in segment_transcript]) or segments[segment_index].get("description", "")
+
+    return {
+        # episodes.type allows intro/content/summary/quiz; the closing segment is the summary
+        "type": "content" if 0 < segment_index < len(segments) - 1 else ("intro" if segment_index == 0 else "summary"),
+        "title": segment_result["segment_name"],
+        "text": transcript_text,
+        "transcript": segment_transcript,
+        "duration_estimate": segment_result.get(
+            "duration_estimate_seconds",
+            get_segment_duration_estimate(
+                segment_result["segment_size"],
+                duration_minutes,
+                len(segments)
+            ),
+        ),
+    }
+
+
+def _generate_segments_sequential(topic: str, outline: dict, speakers: list, lesson_context: str, use_cache: bool = True):
+    """
+    Generate segments one at a time, feeding each a rolling summary of the
+    episode so far. Yields results in order.
+    """
+    story_so_far = ""
+    recent_transcript = ""  # Bounded tail: last line for the hand-off, baseline for token accounting
+
+    writer = LessonWriter()
+    for i, _segment in enumerate(outline.get("segments", [])):
+        segment_result = writer.generate_segment_transcript.remote(
+            topic=topic,
+            outline=outline,
+            segment_index=i,
+            previous_transcript=recent_transcript,
+            speakers=speakers,
+            lesson_context=lesson_context,
+            use_cache=use_cache,
+            story_so_far=story_so_far,
+        )
+        yield segment_result
+
+        segment_text = "".join(f"{turn['speaker']}: {turn['dialogue']}\n" for turn in segment_result["transcript"])
+        recent_transcript = (recent_transcript + segment_text)[-2000:]
+        if i < len(outline.get("segments", [])) - 1:
+            story_so_far = writer.summarize_segment.remote(
+                story_so_far, segment_result["segment_name"], segment_result["transcript"], use_cache
+            )
+
+
+def _generate_segments_parallel(topic: str, outline: dict, speakers: list, lesson_context: str, use_cache: bool = True):
+    """
+    Fan all segments out at once. Continuity comes from outline-derived
+    handoff notes instead of the previous transcript, so no segment waits
+    on another. Yields results in outline order.
+    """
+    writer = LessonWriter()
+    calls = [
+        writer.generate_segment_transcript.spawn(
+            topic=topic,
+            outline=outline,
+            segment_index=i,
+            speakers=speakers,
+            lesson_context=lesson_context,
+            handoff=build_segment_handoff(outline, i),
+            use_cache=use_cache,
+        )
+        for i in range(len(outline.get("segments", [])))
+    ]
+    print(f"   Spawned {len(calls)} segment calls in parallel")
+
+    # Collect in outline order
+    for call in calls:
+        yield call.get()
+
+
 @app.function(
     image=image,
     timeout=900,  # 15 minutes max
@@ -479,15 +1645,23 @@ def generate_lesson_content(
     source_urls: list = None,
     style: str = "conversational",
     speakers: list = None,
+    parallel: bool = False,
+    use_cache: bool = True,
 ) -> dict:
     """
     Generate complete lesson content using Open Notebook-style two-stage process:
     1. Generate outline with segments
     2. Generate transcript for each segment with multi-speaker dialogue
-    
+
+    With parallel=True, all segment transcripts are generated concurrently
+    using outline-derived handoff notes for continuity.
+
     Returns structured content ready for Chatterbox TTS processing.
     """
+    import time
+
     print(f"🎙️ Generating lesson: {topic} ({duration_minutes} min)")
+    started_at = time.perf_counter()
 
     # Build lesson context from user level
     lesson_context = f"Target audience: {user_level} level learners."
@@ -498,63 +1672,44 @@ def generate_lesson_content(
 
     # Stage 1: Generate outline
     print("📋 Stage 1: Generating outline...")
-    outline = generate_outline.remote(
+    outline = LessonWriter().generate_outline.remote(
         topic=topic,
         lesson_number=lesson_number,
         total_lessons=total_lessons,
         duration_minutes=duration_minutes,
         speakers=speakers,
         lesson_context=lesson_context,
+        use_cache=use_cache,
     )
+    outline_seconds = time.perf_counter() - started_at
 
     # Stage 2: Generate transcript for each segment
-    print("🎤 Stage 2: Generating transcripts...")
+    generation_mode = "parallel" if parallel else "sequential"
+    print(f"🎤 Stage 2: Generating transcripts ({generation_mode})...")
+    generate_segments = _generate_segments_parallel if parallel else _generate_segments_sequential
+    segment_results = list(generate_segments(topic, outline, speakers, lesson_context, use_cache))
+
     segments_with_transcript = []
     accumulated_transcript = ""
     full_transcript = []
 
-    for i, segment in enumerate(outline.get("segments", [])):
-        # Generate transcript for this segment
-        segment_result = generate_segment_transcript.remote(
-            topic=topic,
-            outline=outline,
-            segment_index=i,
-            previous_transcript=accumulated_transcript,
-            speakers=speakers,
-            lesson_context=lesson_context,
-        )
-
-        segment_transcript = segment_result["transcript"]
-        transcript_text = " ".join([turn["dialogue"] for turn in segment_transcript]) or segment.get("description", "")
-
-        # Build segment with transcript
-        segment_data = {
-            "type": "content" if i > 0 and i < len(outline["segments"]) - 1 else ("intro" if i == 0 else "outro"),
-            "title": segment_result["segment_name"],
-            "text": transcript_text,
-            "transcript": segment_transcript,
-            "duration_estimate": segment_result.get(
-                "duration_estimate_seconds",
-                get_segment_duration_estimate(
-                    segment_result["segment_size"],
-                    duration_minutes,
-                    len(outline["segments"])
-                ),
-            ),
-        }
-        segments_with_transcript.append(segment_data)
-
-        # Accumulate transcript for context
-        for turn in segment_transcript:
+    for i, segment_result in enumerate(segment_results):
+        segments_with_transcript.append(_build_segment_data(outline, i, segment_result, duration_minutes))
+        for turn in segment_result["transcript"]:
             full_transcript.append(turn)
             accumulated_transcript += f"{turn['speaker']}: {turn['dialogue']}\n"
 
-    # Calculate total word count for debugging
-    total_words = sum(len(turn.get("dialogue", "").split()) for turn in full_transcript)
-    estimated_audio_minutes = total_words / 130  # ~130 wpm speaking rate
-    
+    total_seconds = time.perf_counter() - started_at
+
+    length_control = summarize_length_control(segment_results, outline.get("speech_rate", {}).get("words_per_minute"))
+
     print(f"✅ Generated {len(full_transcript)} dialogue turns across {len(segments_with_transcript)} segments")
-    print(f"📊 Total words: {total_words}, Estimated audio: {estimated_audio_minutes:.1f} min (target: {duration_minutes} min)")
+    print(
+        f"📊 Total words: {length_control.get('words', 0)}/{length_control.get('target_words', 0)}, "
+        f"Estimated audio: {length_control.get('estimated_audio_minutes', 0)} min (target: {duration_minutes} min), "
+        f"continuations: {length_control.get('continuation_calls', 0)}"
+    )
+    print(f"⏱️ {generation_mode}: outline={outline_seconds:.1f}s, total={total_seconds:.1f}s")
 
     # Build final result (matches expected format for TTS service)
     result = {
@@ -569,11 +1724,151 @@ def generate_lesson_content(
         "full_transcript": full_transcript,
         "key_takeaways": outline.get("key_takeaways", []),
         "speakers": speakers,
+        "generation": {
+            "mode": generation_mode,
+            "outline_seconds": round(outline_seconds, 2),
+            "total_seconds": round(total_seconds, 2),
+            "prompt_tokens_saved": sum(r.get("context_usage", {}).get("prompt_tokens_saved", 0) for r in segment_results),
+            "openai_pool": summarize_client_reuse([outline, *segment_results]),
+            "length_control": length_control,
+        },
     }
 
     return result
 
 
+@app.function(
+    image=image,
+    timeout=1800,  # Runs both modes back to back
+    secrets=[modal.Secret.from_name("openai-secret")],
+)
+def benchmark_generation_modes(topic: str, duration_minutes: int = 15, user_level: str = "intermediate") -> dict:
+    """Generate the same lesson sequentially and in parallel and report end-to-end latency for each."""
+    import time
+
+    report = {"topic": topic, "duration_minutes": duration_minutes}
+    for mode in ("sequential", "parallel"):
+        started_at = time.perf_counter()
+        lesson = generate_lesson_content.remote(
+            topic=topic,
+            user_level=user_level,
+            duration_minutes=duration_minutes,
+            parallel=mode == "parallel",
+            use_cache=False,  # Measure real generation, not cache hits
+        )
+        report[mode] = {
+            "end_to_end_seconds": round(time.perf_counter() - started_at, 2),
+            "segments": len(lesson["segments"]),
+            "words": sum(len(turn.get("dialogue", "").split()) for turn in lesson["full_transcript"]),
+            **lesson["generation"],
+        }
+
+    report["speedup"] = round(
+        report["sequential"]["end_to_end_seconds"] / max(0.01, report["parallel"]["end_to_end_seconds"]), 2
+    )
+    print(f"⏱️ Sequential {report['sequential']['end_to_end_seconds']}s vs parallel {report['parallel']['end_to_end_seconds']}s ({report['speedup']}x)")
+    return report
+
+
+@app.function(
+    image=image,
+    timeout=900,  # 15 minutes max
+    secrets=[modal.Secret.from_name("openai-secret")],
+)
+def stream_lesson_content(
+    topic: str,
+    lesson_number: int = 1,
+    total_lessons: int = 1,
+    user_level: str = "intermediate",
+    duration_minutes: int = 10,
+    speakers: list = None,
+    parallel: bool = False,
+    use_cache: bool = True,
+):
+    """
+    Generator variant of generate_lesson_content.
+
+    Yields {"event": ..., "data": ...} dicts: "outline" as soon as Stage 1 is done,
+    then one "segment" per transcript in outline order, then "complete".
+    Consume with stream_lesson_content.remote_gen(...).
+    """
+    import time
+
+    print(f"🎙️ Streaming lesson: {topic} ({duration_minutes} min)")
+    started_at = time.perf_counter()
+
+    lesson_context = f"Target audience: {user_level} level learners."
+    if not speakers:
+        speakers = DEFAULT_EPISODE_PROFILE["speakers"]
+
+    outline = LessonWriter().generate_outline.remote(
+        topic=topic,
+        lesson_number=lesson_number,
+        total_lessons=total_lessons,
+        duration_minutes=duration_minutes,
+        speakers=speakers,
+        lesson_context=lesson_context,
+        use_cache=use_cache,
+    )
+    outline_seconds = time.perf_counter() - started_at
+    yield {
+        "event": "outline",
+        "data": {
+            "title": outline.get("title", f"{topic} - Lesson {lesson_number}"),
+            "summary": outline.get("summary", ""),
+            "segments": outline.get("segments", []),
+            "key_takeaways": outline.get("key_takeaways", []),
+            "speakers": speakers,
+            "elapsed_seconds": round(outline_seconds, 2),
+        },
+    }
+
+    generate_segments = _generate_segments_parallel if parallel else _generate_segments_sequential
+    segment_count = 0
+    prompt_tokens_saved = 0
+    pool_results = [outline]
+    for i, segment_result in enumerate(generate_segments(topic, outline, speakers, lesson_context, use_cache)):
+        pool_results.append(segment_result)
+        segment_data = _build_segment_data(outline, i, segment_result, duration_minutes)
+        segment_count += 1
+        prompt_tokens_saved += segment_result.get("context_usage", {}).get("prompt_tokens_saved", 0)
+        print(f"  📤 Streaming segment {i + 1}/{len(outline.get('segments', []))}")
+        yield {
+            "event": "segment",
+            "data": {
+                "segment_index": i,
+                **segment_data,
+                "elapsed_seconds": round(time.perf_counter() - started_at, 2),
+            },
+        }
+
+    total_seconds = time.perf_counter() - started_at
+    print(f"⏱️ Stream complete: first outline at {outline_seconds:.1f}s, total={total_seconds:.1f}s")
+    yield {
+        "event": "complete",
+        "data": {
+            "segment_count": segment_count,
+            "generation": {
+                "mode": "parallel" if parallel else "sequential",
+                "outline_seconds": round(outline_seconds, 2),
+                "total_seconds": round(total_seconds, 2),
+                "prompt_tokens_saved": prompt_tokens_saved,
+                "openai_pool": summarize_client_reuse(pool_results),
+                "length_control": summarize_length_control(
+                    pool_results, outline.get("speech_rate", {}).get("words_per_minute")
+                ),
+            },
+        },
+    }
+
+
+def _format_stream_event(event: dict, stream_format: str) -> str:
+    """Serialize a stream event as a server-sent event or an NDJSON line."""
+    if stream_format == "ndjson":
+        return json.dumps(event) + "\n"
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+
 # ============================================================================
 # HTTP Endpoints
 # ============================================================================
@@ -597,7 +1892,9 @@ def generate_content(request: dict) -> dict:
         "user_level": "beginner",
         "duration_minutes": 10,
         "source_urls": [],
-        "style": "conversational"
+        "style": "conversational",
+        "parallel": false,  // optional: generate segments concurrently
+        "use_cache": true   // optional: set false to bypass the completion cache
     }
     """
     try:
@@ -609,6 +1906,8 @@ def generate_content(request: dict) -> dict:
         source_urls = request.get("source_urls", [])
         style = request.get("style", "conversational")
         speakers = request.get("speakers")
+        parallel = request.get("parallel", False)
+        use_cache = request.get("use_cache", True)
 
         if not topic:
             return {"success": False, "error": "Topic is required"}
@@ -624,6 +1923,8 @@ def generate_content(request: dict) -> dict:
             source_urls=source_urls,
             style=style,
             speakers=speakers,
+            parallel=parallel,
+            use_cache=use_cache,
         )
 
         return {
@@ -637,10 +1938,101 @@ def generate_content(request: dict) -> dict:
         return {"success": False, "error": str(e)}
 
 
+@app.function(
+    image=image,
+    timeout=900,
+    secrets=[modal.Secret.from_name("openai-secret")],
+)
+@modal.fastapi_endpoint(method="POST")
+def generate_content_stream(request: dict):
+    """
+    Streaming HTTP endpoint for content generation.
+    Emits the outline immediately, then each segment's transcript as it completes,
+    so TTS can start on segment 0 while later segments are still being written.
+
+    Accepts the same body as generate_content, plus:
+    {
+        "format": "sse"  // "sse" (text/event-stream, default) or "ndjson"
+    }
+
+    Events: outline, segment (one per segment, in order), complete, error.
+    """
+    from fastapi.responses import StreamingResponse
+
+    stream_format = request.get("format", "sse")
+    media_type = "application/x-ndjson" if stream_format == "ndjson" else "text/event-stream"
+
+    def event_stream():
+        topic = request.get("topic", "")
+        if not topic:
+            yield _format_stream_event({"event": "error", "data": {"error": "Topic is required"}}, stream_format)
+            return
+
+        print(f"🎙️ Streaming content generation request: {topic}")
+        try:
+            for event in stream_lesson_content.remote_gen(
+                topic=topic,
+                lesson_number=request.get("lesson_number", 1),
+                total_lessons=request.get("total_lessons", 1),
+                user_level=request.get("user_level", "intermediate"),
+                duration_minutes=request.get("duration_minutes", 10),
+                speakers=request.get("speakers"),
+                parallel=request.get("parallel", False),
+                use_cache=request.get("use_cache", True),
+            ):
+                yield _format_stream_event(event, stream_format)
+        except Exception as e:
+            import traceback
+            print(f"❌ Streaming content generation error: {traceback.format_exc()}")
+            yield _format_stream_event({"event": "error", "data": {"error": str(e)}}, stream_format)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type=media_type,
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.function(
+    image=image,
+    timeout=300,
+    secrets=[modal.Secret.from_name("openai-secret")],
+)
+@modal.fastapi_endpoint(method="POST")
+def generate_outline_only(request: dict) -> dict:
+    """HTTP endpoint to generate only the outline (for preview); scheduled ahead of background work"""
+    try:
+        topic = request.get("topic")
+        if not topic:
+            return {"success": False, "error": "Topic is required"}
+
+        outline = LessonWriter().generate_outline.remote(
+            topic=topic,
+            lesson_number=request.get("lesson_number", 1),
+            total_lessons=request.get("total_lessons", 1),
+            duration_minutes=request.get("duration_minutes", 10),
+            speakers=request.get("speakers"),
+            lesson_context=f"Target audience: {request.get('user_level', 'intermediate')} level learners.",
+            use_cache=request.get("use_cache", True),
+            priority="interactive",
+        )
+        return {"success": True, "outline": outline}
+    except Exception as e:
+        import traceback
+        print(f"Error generating outline: {traceback.format_exc()}")
+        return {"success": False, "error": str(e)}
+
+
 @app.function(image=image)
 @modal.fastapi_endpoint(method="GET")
 def health() -> dict:
     """Health check endpoint"""
+    try:
+        scheduler = llm_scheduler.published_stats()
+    except Exception as e:
+        # Stats are read from a Modal Dict; an outage there must not fail the probe
+        scheduler = {"error": str(e)}
+
     return {
         "status": "healthy",
         "service": "daydif-content-opennotebook",
@@ -650,8 +2042,20 @@ def health() -> dict:
             "two-stage-generation",
             "multi-speaker-dialogue",
             "episode-profiles",
+            "parallel-segment-generation",
+            "completion-cache",
+            "streaming-generation",
+            "streaming-turns",
+            "pooled-openai-clients",
+            "rate-limit-scheduler",
+            "length-control",
+            "speech-rate-calibration",
+            "prompt-registry",
         ],
+        "prompt_version": prompts.version(),
         "default_speakers": [s["name"] for s in DEFAULT_EPISODE_PROFILE["speakers"]],
+        "cache": {"enabled": CACHE_CONFIG["enabled"], **completion_cache.stats()},
+        "scheduler": scheduler,
     }
 
 
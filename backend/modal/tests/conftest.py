@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Service modules are standalone Modal app files, not an installed package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,60 @@
+import io
+
+import pytest
+
+pytest.importorskip("modal")
+np = pytest.importorskip("numpy")
+sf = pytest.importorskip("soundfile")
+
+import tts_service as service  # noqa: E402
+
+
+def decode(wav_bytes: bytes):
+    samples, sample_rate = sf.read(io.BytesIO(wav_bytes), dtype="int16")
+    assert sample_rate == service.SAMPLE_RATE
+    return samples
+
+
+def make_turns(lengths: list) -> list:
+    rng = np.random.default_rng(0)
+    return [rng.uniform(-0.5, 0.5, length).astype(np.float32) for length in lengths]
+
+
+@pytest.mark.parametrize("transcript_length, positions", [
+    (3, [0, 1, 2]),  # No pause after the final turn
+    (4, [0, 2]),  # Skipped empty turns; pause after the last kept one
+])
+def test_numpy_assembly_matches_pydub_baseline(transcript_length, positions):
+    pytest.importorskip("pydub")
+    waveforms = make_turns([2400, 4800, 1200][:len(positions)])
+
+    numpy_samples = decode(service.assemble_dialogue_audio(transcript_length, positions, waveforms))
+    pydub_samples = decode(service.assemble_dialogue_audio_pydub(transcript_length, positions, waveforms))
+
+    # pydub builds its 300ms pauses at 11025Hz, so each one lands a few samples short
+    pauses = sum(1 for i in positions if i < transcript_length - 1)
+    assert 0 <= len(numpy_samples) - len(pydub_samples) <= 3 * pauses
+    assert np.array_equal(numpy_samples[:len(waveforms[0])], pydub_samples[:len(waveforms[0])])
+    assert np.array_equal(np.sort(numpy_samples[numpy_samples != 0]), np.sort(pydub_samples[pydub_samples != 0]))
+
+
+def test_pauses_sit_between_turns():
+    waveforms = [np.full(100, 0.5, dtype=np.float32), np.full(100, -0.5, dtype=np.float32)]
+    samples = decode(service.assemble_dialogue_audio(2, [0, 1], waveforms))
+
+    assert len(samples) == 200 + service.SILENCE_SAMPLES
+    assert np.all(samples[100:100 + service.SILENCE_SAMPLES] == 0)
+    assert samples[0] > 0 and samples[-1] < 0
+
+
+def test_no_turns_gives_one_second_of_silence():
+    samples = decode(service.assemble_dialogue_audio(0, [], []))
+    assert len(samples) == service.SAMPLE_RATE and not samples.any()
+
+
+def test_streamed_file_matches_in_memory_assembly(tmp_path):
+    waveforms = make_turns([2400, 1200, 600])
+    path = tmp_path / "dialogue.wav"
+    service.write_dialogue_wav(str(path), 3, [0, 1, 2], iter(waveforms))
+
+    assert np.array_equal(decode(path.read_bytes()), decode(service.assemble_dialogue_audio(3, [0, 1, 2], waveforms)))
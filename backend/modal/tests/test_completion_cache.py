@@ -0,0 +1,91 @@
+import time
+
+import pytest
+
+pytest.importorskip("modal")
+pytest.importorskip("jinja2")
+
+import open_notebook_service as service  # noqa: E402
+
+
+class FakeDict(dict):
+    """dict with the modal.Dict len() method"""
+
+    def len(self):
+        return len(self)
+
+
+class Clock:
+    def __init__(self, monkeypatch):
+        self.now = 1_000_000.0
+        monkeypatch.setattr(time, "time", lambda: self.now)
+
+
+def make_cache(max_entries=3, ttl_seconds=100, evict_slack=0.0):
+    return service.CompletionCache(FakeDict(), max_entries, ttl_seconds, evict_slack)
+
+
+def test_make_key_ignores_param_order():
+    messages = [{"role": "user", "content": "Vaccines"}]
+    a = service.CompletionCache.make_key("outline", messages, model="gpt", temperature=0.7)
+    b = service.CompletionCache.make_key("outline", messages, temperature=0.7, model="gpt")
+    assert a == b
+    assert a != service.CompletionCache.make_key("transcript", messages, model="gpt", temperature=0.7)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    clock = Clock(monkeypatch)
+    cache = make_cache(ttl_seconds=100)
+    cache.put("k", "value")
+
+    clock.now += 99
+    assert cache.get("k") == "value"
+    clock.now += 2
+    assert cache.get("k") is None
+    assert "k" not in cache.store
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expired"]) == (1, 1, 1)
+
+
+def test_hit_bumps_last_used_so_lru_keeps_it(monkeypatch):
+    clock = Clock(monkeypatch)
+    cache = make_cache(max_entries=2)
+    cache.put("old", "a")
+    clock.now += 1
+    cache.put("new", "b")
+    clock.now += 1
+    assert cache.get("old") == "a"  # Now the most recently used
+    assert cache.store["old"]["last_used"] == clock.now
+
+    clock.now += 1
+    cache.put("newest", "c")
+    assert set(key for key in cache.store if not key.startswith("__")) == {"old", "newest"}
+
+
+def test_eviction_waits_for_slack(monkeypatch):
+    clock = Clock(monkeypatch)
+    cache = make_cache(max_entries=4, evict_slack=0.5)  # Scan only past 6 entries
+    cache.get("missing")  # Creates the stats entry, as in production
+    for i in range(6):
+        clock.now += 1
+        cache.put(f"k{i}", str(i))
+    assert cache.store.len() - 1 == 6
+
+    clock.now += 1
+    cache.put("k6", "6")
+    completions = sorted(key for key in cache.store if not key.startswith("__"))
+    assert completions == ["k3", "k4", "k5", "k6"]
+    assert cache.stats()["evictions"] == 3
+
+
+def test_evict_drops_expired_before_lru(monkeypatch):
+    clock = Clock(monkeypatch)
+    cache = make_cache(max_entries=2, ttl_seconds=10)
+    cache.put("stale", "a")
+    clock.now += 8
+    cache.put("fresh1", "b")
+    cache.put("fresh2", "c")
+    clock.now += 5
+    assert cache.evict() == 1
+    assert "stale" not in cache.store and {"fresh1", "fresh2"} <= set(cache.store)
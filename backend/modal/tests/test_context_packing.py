@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+pytest.importorskip("modal")
+
+import content_service as service  # noqa: E402
+
+
+def make_outline(num_segments: int) -> dict:
+    return {
+        "title": "Compound Interest",
+        "summary": "How money grows on money",
+        "speakers": [{"name": "Alex"}, {"name": "Sam"}],
+        "speech_rate": {"words_per_minute": 150},
+        "segments": [
+            {
+                "name": f"Part {i + 1}",
+                "description": f"A long description of part {i + 1} " + "with many details " * 20,
+                "size": "medium",
+                "key_points": ["not sent"],
+            }
+            for i in range(num_segments)
+        ],
+    }
+
+
+def test_pack_outline_drops_fields_rendered_elsewhere():
+    packed = json.loads(service.pack_outline(make_outline(3), 0, 10_000))
+    assert set(packed) == {"title", "summary", "segments"}
+    assert all(set(segment) == {"name", "description", "size"} for segment in packed["segments"])
+
+
+def test_pack_outline_trims_farthest_descriptions_first():
+    outline = make_outline(6)
+    full = service.count_tokens(service.pack_outline(outline, 0, 10_000))
+    packed = json.loads(service.pack_outline(outline, 2, full * 2 // 3))
+
+    kept = [i for i, segment in enumerate(packed["segments"]) if "description" in segment]
+    assert 2 in kept and 1 in kept and 3 in kept
+    assert 5 not in kept
+    # Every segment name survives
+    assert [segment["name"] for segment in packed["segments"]] == [f"Part {i + 1}" for i in range(6)]
+
+
+def test_pack_outline_keeps_neighbour_descriptions_even_over_budget():
+    packed = json.loads(service.pack_outline(make_outline(4), 1, 1))
+    kept = [i for i, segment in enumerate(packed["segments"]) if "description" in segment]
+    assert kept == [0, 1, 2]
+
+
+def test_rank_source_chunks_passes_small_context_through():
+    text = "Interest compounds yearly."
+    assert service.rank_source_chunks(text, "compound interest", 1000) == text
+    assert service.rank_source_chunks("", "compound interest", 10) == ""
+
+
+def test_rank_source_chunks_keeps_relevant_chunks_in_source_order():
+    filler = "The weather was mild and the harbor was calm that season. " * 10
+    relevant_a = "Compound interest adds interest to the principal every period. " * 3
+    relevant_b = "Interest earned on interest makes compound growth exponential. " * 3
+    source = "\n\n".join([relevant_b, filler, filler, relevant_a])
+
+    budget = service.count_tokens(relevant_a) + service.count_tokens(relevant_b) + 10
+    packed = service.rank_source_chunks(source, "compound interest growth", budget)
+
+    assert service.count_tokens(packed) <= budget + 5
+    assert "weather" not in packed
+    # Best chunks, but back in the order they appear in the sources
+    assert packed.index("exponential") < packed.index("principal")
@@ -0,0 +1,54 @@
+import pytest
+
+pytest.importorskip("modal")
+
+import content_service as service  # noqa: E402
+
+
+def extract(html: str) -> str:
+    return service._extract_with_html_parser(html, 10_000)
+
+
+def test_unclosed_list_items_followed_by_paragraph():
+    html = (
+        "<ul><li>First item with plenty of words in it"
+        "<li>Second item with plenty of words in it</ul>"
+        "<p>A following paragraph with enough characters to keep"
+    )
+    assert extract(html) == (
+        "First item with plenty of words in it Second item with plenty of words in it "
+        "A following paragraph with enough characters to keep"
+    )
+
+
+def test_unclosed_paragraphs():
+    html = "<p>Paragraph one is long enough to keep.<p>Paragraph two is also long enough to keep."
+    assert extract(html) == "Paragraph one is long enough to keep. Paragraph two is also long enough to keep."
+
+
+def test_paragraph_closed_by_enclosing_container():
+    html = "<div><p>Paragraph inside a div that never closes its p</div><p>Closed paragraph with plenty of text.</p>"
+    assert extract(html) == "Paragraph inside a div that never closes its p Closed paragraph with plenty of text."
+
+
+def test_unclosed_table_cells():
+    html = "<table><tr><td>Cell one has enough text to keep it<td>Cell two has enough text to keep it</table>"
+    assert extract(html) == "Cell one has enough text to keep it Cell two has enough text to keep it"
+
+
+def test_nested_blocks_still_collected_once():
+    html = "<blockquote><p>Quoted paragraph that is long enough.</p></blockquote><nav><p>Skipped navigation text here</p></nav>"
+    assert extract(html) == "Quoted paragraph that is long enough."
+
+
+def test_selectolax_keeps_document_order():
+    pytest.importorskip("selectolax.lexbor")
+    html = (
+        "<article><h2>Heading</h2><p>First paragraph with plenty of words.</p>"
+        "<ul><li>List item with plenty of words in it</li></ul>"
+        "<p>Second paragraph with plenty of words.</p></article>"
+    )
+    assert service._extract_with_selectolax(html, 10_000) == (
+        "Heading First paragraph with plenty of words. "
+        "List item with plenty of words in it Second paragraph with plenty of words."
+    )
@@ -0,0 +1,54 @@
+import pytest
+
+pytest.importorskip("modal")
+pytest.importorskip("jinja2")
+
+import open_notebook_service as service  # noqa: E402
+
+
+def make_outline(sizes: list, duration_minutes: int = 10) -> dict:
+    return {
+        "title": "How Vaccines Work",
+        "duration_minutes": duration_minutes,
+        "segments": [
+            {"name": f"Part {i + 1}", "description": "Antigens and memory cells", "size": size}
+            for i, size in enumerate(sizes)
+        ],
+    }
+
+
+def test_medium_segment_prompt_fits_completion_ceiling():
+    outline = make_outline(["short", "medium", "long", "short"])
+    request = service._build_segment_request("Vaccines", outline, 1)
+    config = service.LENGTH_CONTROL_CONFIG
+
+    min_turns = service.calculate_segment_turns(
+        request["target_words"], service.DEFAULT_EPISODE_PROFILE["min_turns_per_segment"]
+    )
+    prompt = request["messages"][1]["content"]
+    assert f"at least {min_turns} turns" in prompt
+
+    # The minimum the prompt demands must be writable under the overshoot ceiling
+    required_words = min_turns * config["words_per_turn"]
+    assert required_words <= request["target_words"]
+    assert required_words * config["tokens_per_word"] <= request["params"]["max_tokens"]
+    assert "LONG" not in request["messages"][0]["content"]
+
+
+@pytest.mark.parametrize("target_words", [90, 375, 525, 1200])
+def test_min_turns_never_exceed_target_words(target_words):
+    min_turns = service.calculate_segment_turns(target_words, floor=1)
+    assert min_turns * service.LENGTH_CONTROL_CONFIG["words_per_turn"] <= max(
+        target_words, service.LENGTH_CONTROL_CONFIG["words_per_turn"]
+    )
+
+
+def test_count_tokens_falls_back_when_encoding_fails(monkeypatch):
+    tiktoken = pytest.importorskip("tiktoken")
+
+    def unavailable(name):
+        raise ConnectionError("encoding download failed")
+
+    monkeypatch.setattr(tiktoken, "get_encoding", unavailable)
+    monkeypatch.setattr(service, "_token_encoding", None)
+    assert service.count_tokens("x" * 40) == 10
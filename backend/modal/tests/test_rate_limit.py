@@ -0,0 +1,86 @@
+import pytest
+
+pytest.importorskip("modal")
+pytest.importorskip("jinja2")
+
+import open_notebook_service as service  # noqa: E402
+
+
+def make_state(**overrides):
+    return service.RateLimitState({**service.RATE_LIMIT_CONFIG, **overrides})
+
+
+@pytest.mark.parametrize("value, seconds", [
+    ("1s", 1.0),
+    ("6m0s", 360.0),
+    ("120ms", 0.12),
+    ("1h2m3.5s", 3723.5),
+    ("", 1.0),
+    (None, 1.0),
+    ("soon", 1.0),
+])
+def test_parse_ratelimit_reset(value, seconds):
+    assert service.parse_ratelimit_reset(value) == pytest.approx(seconds)
+
+
+def test_success_adds_one_slot_per_window():
+    state = make_state(initial_concurrency=4, max_concurrency=24)
+    for _ in range(4):
+        lease = state.try_acquire(100, "background", now=0.0)["lease"]
+        state.release(lease, 100, None, 100, "ok", now=0.0)
+    # +1/concurrency per success: roughly one slot after a window of successes
+    assert 4.9 < state.concurrency < 5.0
+
+
+def test_rate_limit_halves_concurrency_down_to_the_floor():
+    state = make_state(initial_concurrency=8, min_concurrency=1)
+    for expected in (4, 2, 1, 1):
+        lease = state.try_acquire(100, "background", now=0.0)["lease"]
+        state.release(lease, 100, None, None, "rate_limited", now=0.0)
+        assert state.concurrency == expected
+    assert state.rate_limited == 4
+
+
+def test_concurrency_caps_inflight_leases():
+    state = make_state(initial_concurrency=2)
+    assert state.try_acquire(10, "background", now=0.0)["lease"]
+    assert state.try_acquire(10, "background", now=0.0)["lease"]
+    refused = state.try_acquire(10, "background", now=0.0)
+    assert refused["lease"] is None and refused["retry_in"] > 0
+    # Interactive previews get one slot beyond the background limit
+    assert state.try_acquire(10, "interactive", now=0.0)["lease"]
+
+
+def test_background_leaves_the_interactive_reserve():
+    state = make_state(tokens_per_minute=1000, interactive_reserve=0.2)
+    assert state.try_acquire(900, "background", now=0.0)["lease"] is None
+    assert state.try_acquire(900, "interactive", now=0.0)["lease"]
+
+
+def test_headers_resync_the_budget():
+    state = make_state()
+    lease = state.try_acquire(500, "background", now=0.0)["lease"]
+    state.release(lease, 500, {
+        "x-ratelimit-limit-tokens": "90000",
+        "x-ratelimit-remaining-tokens": "1234",
+        "x-ratelimit-limit-requests": "60",
+        "x-ratelimit-remaining-requests": "7",
+        "x-ratelimit-reset-tokens": "6m0s",
+    }, 400, "ok", now=10.0)
+    assert (state.tokens_limit, state.tokens_remaining) == (90000, 1234)
+    assert (state.requests_limit, state.requests_remaining) == (60, 7)
+    assert state.reset_at == 370.0
+
+
+def test_over_estimate_is_refunded_without_headers():
+    state = make_state(tokens_per_minute=10_000)
+    lease = state.try_acquire(3000, "background", now=0.0)["lease"]
+    state.release(lease, 3000, None, 1000, "ok", now=1.0)
+    assert state.tokens_remaining == 9000
+
+
+def test_expired_leases_free_their_slot():
+    state = make_state(initial_concurrency=1, lease_seconds=300)
+    assert state.try_acquire(10, "background", now=0.0)["lease"]
+    assert state.try_acquire(10, "background", now=1.0)["lease"] is None
+    assert state.try_acquire(10, "background", now=301.0)["lease"]
@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("modal")
+np = pytest.importorskip("numpy")
+
+import tts_service as service  # noqa: E402
+
+
+def test_short_text_stays_one_chunk():
+    assert service.split_text_chunks("Hello there. How are you?", 250) == ["Hello there. How are you?"]
+
+
+def test_splits_at_sentence_ends_and_packs_neighbours():
+    text = "One two three. Four five six. Seven eight nine. Ten."
+    assert service.split_text_chunks(text, 30) == ["One two three. Four five six.", "Seven eight nine. Ten."]
+
+
+def test_long_sentence_splits_at_clauses_then_words():
+    clause = "a fairly long clause with several words"
+    text = f"{clause}, {clause}; " + " ".join(["word"] * 30) + "."
+    chunks = service.split_text_chunks(text, 45)
+    assert all(len(chunk) <= 45 for chunk in chunks)
+    assert chunks[0] == f"{clause},"
+    # Nothing is dropped or reordered
+    assert " ".join(chunks).split() == text.split()
+
+
+def test_empty_text_has_no_chunks():
+    assert service.split_text_chunks("   ", 250) == []
+
+
+def test_crossfade_single_waveform_is_untouched():
+    waveform = np.ones(10, dtype=np.float32)
+    assert service.crossfade_waveforms([waveform], 4) is waveform
+
+
+def test_crossfade_overlaps_neighbours():
+    a = np.ones(100, dtype=np.float32)
+    b = np.full(80, 0.5, dtype=np.float32)
+    out = service.crossfade_waveforms([a, b], 20)
+
+    assert out.dtype == np.float32
+    assert len(out) == 100 + 80 - 20
+    assert np.all(out[:80] == 1.0)
+    assert np.all(out[100:] == 0.5)
+    # Equal-power ramp: starts on a, ends on b
+    assert out[80] == pytest.approx(1.0)
+    assert out[99] == pytest.approx(0.5, abs=0.01)
+
+
+def test_crossfade_never_overlaps_more_than_the_shorter_waveform():
+    out = service.crossfade_waveforms([np.ones(50, dtype=np.float32), np.ones(5, dtype=np.float32)], 20)
+    assert len(out) == 50
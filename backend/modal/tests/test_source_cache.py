@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip("modal")
+
+import content_service as service  # noqa: E402
+
+make_key = service.SourceCache.make_key
+
+
+@pytest.mark.parametrize("url", [
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+    "https://youtu.be/dQw4w9WgXcQ",
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42s",
+])
+def test_youtube_urls_key_by_video_id(url):
+    assert make_key(url) == "yt:dQw4w9WgXcQ"
+
+
+def test_equivalent_article_urls_share_a_key():
+    base = make_key("https://example.com/articles/interest")
+    assert make_key("HTTPS://Example.COM/articles/interest/") == base
+    assert make_key("https://example.com/articles/interest#section-2") == base
+    assert make_key("https://example.com/articles/interest?utm_source=x&utm_medium=y") == base
+    assert make_key("  https://example.com/articles/interest  ") == base
+
+
+def test_query_order_does_not_matter_but_values_do():
+    a = make_key("https://example.com/search?q=interest&page=2")
+    assert make_key("https://example.com/search?page=2&q=interest") == a
+    assert make_key("https://example.com/search?q=interest&page=3") != a
+
+
+def test_path_case_is_preserved():
+    assert make_key("https://example.com/Wiki/Interest") != make_key("https://example.com/wiki/interest")
+
+
+def test_root_path_normalizes():
+    assert make_key("https://example.com") == make_key("https://example.com/") == "web:https://example.com/"
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+pytest.importorskip("modal")
+pytest.importorskip("jinja2")
+
+import open_notebook_service as service  # noqa: E402
+
+
+TURNS = [
+    {"speaker": "Alex", "dialogue": "So what is a vaccine, really?"},
+    {"speaker": "Sam", "dialogue": "Think of it as a training exercise for your immune system."},
+    {"speaker": "Alex", "dialogue": "Like a fire drill?"},
+]
+
+
+def feed_all(parser, chunks: list) -> list:
+    turns = []
+    for chunk in chunks:
+        turns.extend(parser.feed(chunk))
+    return turns
+
+
+def test_turns_split_across_chunk_boundaries():
+    text = json.dumps({"segment_name": "Intro", "transcript": TURNS})
+    for size in (1, 3, 7, 50):
+        chunks = [text[i:i + size] for i in range(0, len(text), size)]
+        assert feed_all(service.TranscriptTurnParser(), chunks) == TURNS
+
+
+def test_turns_are_emitted_as_soon_as_they_close():
+    parser = service.TranscriptTurnParser()
+    assert parser.feed('{"transcript": [{"speaker": "Alex", "dialogue": "Hi"') == []
+    assert parser.feed('}, {"speaker": "Sam", ') == [{"speaker": "Alex", "dialogue": "Hi"}]
+
+
+def test_braces_and_escaped_quotes_inside_strings():
+    turns = [
+        {"speaker": "Sam", "dialogue": 'Write it as {"dose": 2} and say "booster" } ] {'},
+        {"speaker": "Alex", "dialogue": "A backslash \\ then a quote \\\" stays text"},
+    ]
+    text = json.dumps({"transcript": turns})
+    chunks = [text[i:i + 4] for i in range(0, len(text), 4)]
+    assert feed_all(service.TranscriptTurnParser(), chunks) == turns
+
+
+def test_truncated_trailing_json_keeps_closed_turns():
+    text = json.dumps({"transcript": TURNS})
+    cut = text.index('{"speaker": "Alex", "dialogue": "Like')
+    parser = service.TranscriptTurnParser()
+    assert parser.feed(text[:cut + 30]) == TURNS[:2]
+    assert parser.feed("") == []
+
+
+def test_stops_at_end_of_transcript_array():
+    text = json.dumps({"transcript": TURNS[:1], "key_points": [{"speaker": "x", "dialogue": "not a turn"}]})
+    assert service.TranscriptTurnParser().feed(text) == TURNS[:1]
@@ -0,0 +1,50 @@
+import pytest
+
+pytest.importorskip("modal")
+np = pytest.importorskip("numpy")
+
+import tts_service as service  # noqa: E402
+
+
+class FakeVolume:
+    def reload(self):
+        pass
+
+    def commit(self):
+        pass
+
+
+def make_cache(tmp_path):
+    return service.TurnAudioCache(str(tmp_path), FakeVolume(), max_bytes=10**9)
+
+
+def key(text: str) -> str:
+    return service.TurnAudioCache.make_key(text, 0.5, 0.5, "test-model")
+
+
+def test_hit_rate_counts_cached_and_uncached_turns(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put(key("cached one"), np.zeros(10, dtype="float32"))
+    cache.put(key("cached two"), np.zeros(10, dtype="float32"))
+
+    # Same lookup pattern as _stream_turns: contains() per turn, counted get() per cached turn
+    keys = [key("cached one"), key("fresh one"), key("cached two"), key("fresh two")]
+    cached = [k for k in keys if cache.contains(k)]
+    for k in cached:
+        assert cache.get(k, counted=True) is not None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 2)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_turn_evicted_after_lookup_counts_as_miss(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put(key("cached"), np.zeros(10, dtype="float32"))
+
+    assert cache.contains(key("cached"))
+    cache.max_bytes = 0
+    cache.evict()
+    assert cache.get(key("cached"), counted=True) is None
+
+    assert (cache.hits, cache.misses) == (0, 1)
@@ -5,6 +5,7 @@ Converts text to speech using Chatterbox TTS on Modal GPU
 Supports multi-speaker dialogue aligned with Open Notebook-style content
 """
 import modal
+import json
 from typing import Optional
 
 app = modal.App("daydif-tts")
@@ -19,11 +20,47 @@ image = (
         "soundfile",
         "scipy",
         "supabase",
-        "pydub",  # For audio concatenation
+        "pydub",  # Baseline for the audio assembly benchmark
         "fastapi",  # Required for Modal web endpoints
     )
 )
 
+SAMPLE_RATE = 24000  # Chatterbox outputs 24kHz audio
+SILENCE_MS = 300  # Pause between dialogue turns
+SILENCE_SAMPLES = SAMPLE_RATE * SILENCE_MS // 1000
+
+# Output encodings for uploaded audio (ffmpeg is in the image)
+AUDIO_FORMATS = {
+    "wav": {"extension": "wav", "content_type": "audio/wav", "codec": None, "bitrate": None},
+    "opus": {"extension": "opus", "content_type": "audio/ogg", "codec": "libopus", "bitrate": "32k"},
+    "aac": {"extension": "m4a", "content_type": "audio/mp4", "codec": "aac", "bitrate": "64k"},
+    "mp3": {"extension": "mp3", "content_type": "audio/mpeg", "codec": "libmp3lame", "bitrate": "64k"},
+}
+
+# Supabase Storage bucket for lesson audio
+AUDIO_BUCKET = "lesson-audio"
+
+# Chunked TUS uploads to Supabase Storage
+RESUMABLE_UPLOAD_CONFIG = {
+    "chunk_bytes": 6 * 1024 * 1024,  # Supabase requires 6MB TUS chunks
+    "max_retries": 5,  # Per chunk
+    "backoff_seconds": 1.0,  # Doubles on each retry
+}
+
+# Progressive HLS output (AAC in MPEG-TS chunks)
+HLS_CONFIG = {
+    "chunk_seconds": 10,  # Target media chunk length
+    "bitrate": "64k",
+    "playlist_name": "playlist.m3u8",
+}
+
+# Long turns are split into sentence/clause chunks and crossfaded back together
+CHUNKING_CONFIG = {
+    "enabled": True,
+    "max_chars": 250,  # Per-chunk character budget passed to model.generate
+    "crossfade_ms": 30,
+}
+
 # Voice profiles for multi-speaker support
 # Chatterbox uses exaggeration and cfg_weight for voice variation
 VOICE_PROFILES = {
@@ -44,50 +81,783 @@ VOICE_PROFILES = {
     },
 }
 
+# Per-turn waveform cache on a Modal Volume
+TURN_CACHE_CONFIG = {
+    "enabled": True,
+    "mount_path": "/turn-cache",
+    "max_bytes": 20 * 1024 ** 3,  # Evict least-recently-used turns beyond 20GB
+    "touch_commit_batch": 200,  # Persist recency bumps from cache-hit-only calls every N hits
+    "rescan_seconds": 3600,  # Re-measure the volume so other containers' writes count toward the bound
+}
+turn_cache_volume = modal.Volume.from_name("daydif-tts-turn-cache", create_if_missing=True)
+
+# Measured speaking rate per voice profile; the content services size transcripts from it
+SPEECH_RATE_CONFIG = {
+    "enabled": True,
+    "window_words": 50_000,  # Older samples are scaled down past this so the fit tracks model changes
+}
+# Shared with the content apps (named Dicts are workspace-wide)
+speech_rate_store = modal.Dict.from_name("daydif-speech-rate", create_if_missing=True)
+
+# Multi-container fan-out for whole-lesson synthesis
+TTS_FANOUT_CONFIG = {
+    "num_containers": 4,  # Default shard count (= parallel GPU containers)
+    "max_containers": 8,  # Hard cap on shards per lesson
+}
+
+# Alternating short/long turns used by the TTS benchmarks
+BENCHMARK_TRANSCRIPT = [
+    {"speaker": "Alex", "dialogue": "So what actually happens when a model learns from data?"},
+    {"speaker": "Sam", "dialogue": "Great question. At its core, the model makes a guess, measures how wrong it was, and nudges its internal settings to be a little less wrong next time. Repeat that millions of times and the guesses get surprisingly good."},
+    {"speaker": "Alex", "dialogue": "Like practicing free throws until your aim improves?"},
+    {"speaker": "Sam", "dialogue": "Exactly like that. Each miss tells you which way to adjust, and over many attempts the adjustments add up to real skill."},
+] * 5
+
+
+def resolve_dialogue_turns(transcript: list, voice_profiles: dict) -> tuple:
+    """
+    Resolve each non-empty turn to (text, exaggeration, cfg_weight).
+    Returns (positions, turns) where positions are the turns' transcript indices.
+    """
+    positions = []
+    turns = []
+    for i, turn in enumerate(transcript):
+        speaker = turn.get("speaker", "default")
+        dialogue = turn.get("dialogue", "")
+
+        if not dialogue.strip():
+            continue
+
+        # Get voice profile for speaker
+        profile = voice_profiles.get(speaker, voice_profiles.get("default", VOICE_PROFILES["default"]))
+        positions.append(i)
+        turns.append((dialogue, profile.get("exaggeration", 0.5), profile.get("cfg_weight", 0.5)))
+
+    return positions, turns
+
+
+def speech_rate_key(exaggeration: float, cfg_weight: float) -> str:
+    """Profile key shared with the content services' calibrated_speech_rate"""
+    return f"{float(exaggeration):.2f}|{float(cfg_weight):.2f}"
+
+
+def record_speech_rate(samples: list, model_id: str) -> None:
+    """
+    Fold (exaggeration, cfg_weight, words, seconds) samples of synthesized turns
+    into the per-profile totals in speech_rate_store. The fitted rate is
+    words / (seconds + turns * gap_seconds): minutes of lesson audio including
+    the silence inserted between turns. Best-effort, like the other shared stores.
+    """
+    import time
+
+    if not SPEECH_RATE_CONFIG["enabled"] or not samples:
+        return
+
+    try:
+        profiles = speech_rate_store.get("profiles") or {}
+        for exaggeration, cfg_weight, words, seconds in samples:
+            key = speech_rate_key(exaggeration, cfg_weight)
+            entry = profiles.get(key) or {
+                "exaggeration": float(exaggeration),
+                "cfg_weight": float(cfg_weight),
+                "turns": 0.0,
+                "words": 0.0,
+                "seconds": 0.0,
+            }
+            if entry["words"] + words > SPEECH_RATE_CONFIG["window_words"]:
+                scale = SPEECH_RATE_CONFIG["window_words"] / (entry["words"] + words)
+                for field in ("turns", "words", "seconds"):
+                    entry[field] *= scale
+            entry["turns"] += 1
+            entry["words"] += words
+            entry["seconds"] += seconds
+            entry["gap_seconds"] = SILENCE_MS / 1000
+            entry["words_per_minute"] = round(
+                60 * entry["words"] / (entry["seconds"] + entry["turns"] * entry["gap_seconds"]), 1
+            )
+            entry["model_id"] = model_id
+            entry["updated_at"] = time.time()
+            profiles[key] = entry
+        speech_rate_store["profiles"] = profiles
+    except Exception as e:
+        print(f"⚠️ Speech rate calibration not recorded: {e}")
+
+
+def split_text_chunks(text: str, max_chars: int) -> list:
+    """
+    Split text into chunks of at most max_chars, breaking at sentence ends first,
+    then at clause punctuation, then at word boundaries. Short neighbouring
+    pieces are packed into the same chunk.
+    """
+    import re
+
+    def pack(pieces: list) -> list:
+        chunks, current = [], ""
+        for piece in pieces:
+            candidate = f"{current} {piece}".strip()
+            if current and len(candidate) > max_chars:
+                chunks.append(current)
+                current = piece
+            else:
+                current = candidate
+        if current:
+            chunks.append(current)
+        return chunks
+
+    pieces = []
+    for sentence in re.split(r"(?<=[.!?])\s+", text.strip()):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        for clause in re.split(r"(?<=[,;:—–])\s+", sentence):
+            pieces.extend(pack(clause.split()) if len(clause) > max_chars else [clause])
+    return pack([piece for piece in pieces if piece])
+
+
+def crossfade_waveforms(waveforms: list, crossfade_samples: int):
+    """Join float32 waveforms with equal-power crossfades of crossfade_samples"""
+    import numpy as np
+
+    if len(waveforms) == 1:
+        return waveforms[0]
+
+    total = sum(len(w) for w in waveforms)
+    overlaps = [min(crossfade_samples, len(a), len(b)) for a, b in zip(waveforms, waveforms[1:])]
+    out = np.zeros(total - sum(overlaps), dtype=np.float32)
+
+    out[:len(waveforms[0])] = waveforms[0]
+    cursor = len(waveforms[0])
+    for overlap, waveform in zip(overlaps, waveforms[1:]):
+        start = cursor - overlap
+        if overlap:
+            ramp = np.linspace(0.0, np.pi / 2, overlap, dtype=np.float32)
+            out[start:cursor] = out[start:cursor] * np.cos(ramp) + waveform[:overlap] * np.sin(ramp)
+        out[cursor:start + len(waveform)] = waveform[overlap:]
+        cursor = start + len(waveform)
+    return out
+
+
+def encode_wav(waveform) -> bytes:
+    """Encode a float32 waveform as 16-bit PCM WAV bytes"""
+    import soundfile as sf
+    import io
+
+    buffer = io.BytesIO()
+    sf.write(buffer, waveform, SAMPLE_RATE, format="WAV", subtype="PCM_16")
+    buffer.seek(0)
+    return buffer.read()
+
+
+def encode_audio_file(wav_path: str, output_format: str = "wav", bitrate: str = None) -> tuple:
+    """
+    Encode a WAV file to output_format with ffmpeg, next to the input file.
+    Returns (output_path, stats) where stats carries encode time and size ratio.
+    """
+    import os
+    import subprocess
+    import time
+
+    if output_format not in AUDIO_FORMATS:
+        raise ValueError(f"Unsupported output_format '{output_format}' (expected one of {', '.join(AUDIO_FORMATS)})")
+
+    audio_format = AUDIO_FORMATS[output_format]
+    wav_size = os.path.getsize(wav_path)
+    if audio_format["codec"] is None:
+        return wav_path, {"format": output_format, "encode_seconds": 0.0, "wav_bytes": wav_size,
+                          "encoded_bytes": wav_size, "size_ratio": 1.0}
+
+    bitrate = bitrate or audio_format["bitrate"]
+    output_path = f"{os.path.splitext(wav_path)[0]}.{audio_format['extension']}"
+    started_at = time.perf_counter()
+
+    # Files rather than pipes: the m4a muxer needs a seekable output
+    subprocess.run(
+        ["ffmpeg", "-y", "-loglevel", "error", "-i", wav_path,
+         "-c:a", audio_format["codec"], "-b:a", bitrate, "-ac", "1", output_path],
+        check=True,
+    )
+
+    encoded_size = os.path.getsize(output_path)
+    stats = {
+        "format": output_format,
+        "bitrate": bitrate,
+        "encode_seconds": round(time.perf_counter() - started_at, 3),
+        "wav_bytes": wav_size,
+        "encoded_bytes": encoded_size,
+        "size_ratio": round(encoded_size / max(1, wav_size), 4),
+    }
+    print(f"🗜️ Encoded {output_format}@{bitrate}: {wav_size} → {encoded_size} bytes "
+          f"({stats['size_ratio']:.1%}) in {stats['encode_seconds']}s")
+    return output_path, stats
+
+
+def write_dialogue_wav(path: str, transcript_length: int, positions: list, waveforms) -> None:
+    """
+    Stream turn waveforms to a 16-bit WAV file on disk, turn by turn, with the
+    same 300ms pauses as assemble_dialogue_audio. waveforms may be a generator,
+    so only the turn being written is held in memory. The header is finalized
+    when the file closes.
+    """
+    import numpy as np
+    import soundfile as sf
+
+    silence = np.zeros(SILENCE_SAMPLES, dtype=np.float32)
+    with sf.SoundFile(path, "w", samplerate=SAMPLE_RATE, channels=1, format="WAV", subtype="PCM_16") as f:
+        written = 0
+        # Waveforms first, so a generator is run to completion (and its cleanup runs)
+        for waveform, i in zip(waveforms, positions):
+            f.write(waveform)
+            if i < transcript_length - 1:
+                f.write(silence)
+            written += 1
+        if not written:
+            f.write(np.zeros(SAMPLE_RATE, dtype=np.float32))
+
+
+def assemble_dialogue_audio(transcript_length: int, positions: list, waveforms: list) -> bytes:
+    """
+    Join turn waveforms into one WAV with 300ms pauses between speakers.
+
+    The output buffer is preallocated from the known turn lengths plus gaps and
+    each turn is copied in once, then the whole thing is encoded a single time.
+    """
+    import numpy as np
+
+    if not waveforms:
+        # Return silent audio if nothing to combine
+        return encode_wav(np.zeros(SAMPLE_RATE, dtype=np.float32))
+
+    # Pause after every turn except one at the very end of the transcript
+    gaps = [SILENCE_SAMPLES if i < transcript_length - 1 else 0 for i in positions]
+    output = np.zeros(sum(len(w) for w in waveforms) + sum(gaps), dtype=np.float32)
+
+    offset = 0
+    for waveform, gap in zip(waveforms, gaps):
+        output[offset:offset + len(waveform)] = waveform
+        offset += len(waveform) + gap
+
+    return encode_wav(output)
+
+
+def assemble_dialogue_audio_pydub(transcript_length: int, positions: list, waveforms: list) -> bytes:
+    """Previous pydub-based assembler, kept as the baseline for benchmark_audio_assembly"""
+    from pydub import AudioSegment
+    import io
+
+    audio_segments = []
+    silence = AudioSegment.silent(duration=SILENCE_MS)
+
+    for i, waveform in zip(positions, waveforms):
+        audio_segments.append(AudioSegment.from_wav(io.BytesIO(encode_wav(waveform))))
+        if i < transcript_length - 1:
+            audio_segments.append(silence)
+
+    if not audio_segments:
+        return AudioSegment.silent(duration=1000).export(format="wav").read()
+
+    combined = audio_segments[0]
+    for segment in audio_segments[1:]:
+        combined += segment
+
+    buffer = io.BytesIO()
+    combined.export(buffer, format="wav")
+    buffer.seek(0)
+
+    return buffer.read()
+
+
+def shard_turns(turns: list, num_shards: int) -> list:
+    """
+    Split (text, exaggeration, cfg_weight) turns into at most num_shards shards
+    with roughly equal total text length (longest-first greedy assignment).
+    Each shard is a list of (turn_index, turn) pairs.
+    """
+    shards = [[] for _ in range(max(1, min(num_shards, len(turns))))]
+    loads = [0] * len(shards)
+    for index in sorted(range(len(turns)), key=lambda i: len(turns[i][0]), reverse=True):
+        target = loads.index(min(loads))
+        shards[target].append((index, turns[index]))
+        loads[target] += len(turns[index][0])
+    return shards
+
+
+class TurnAudioCache:
+    """
+    Content-addressed cache of synthesized turn waveforms stored as .npy files.
+
+    Keys hash the dialogue text, exaggeration, cfg_weight and model identifier,
+    so only turns whose text or voice settings changed are re-synthesized.
+    File mtimes track recency for size-bounded LRU eviction; hits bump them and
+    are committed in batches of touch_commit_batch. The volume is walked only
+    when a running size estimate crosses max_bytes (or goes rescan_seconds stale).
+    """
+
+    def __init__(self, root: str, volume, max_bytes: int, touch_commit_batch: int = 200, rescan_seconds: int = 3600):
+        self.root = root
+        self.volume = volume
+        self.max_bytes = max_bytes
+        self.touch_commit_batch = touch_commit_batch
+        self.rescan_seconds = rescan_seconds
+        self.hits = 0
+        self.misses = 0
+        self.dirty = False
+        self.touched = 0  # Recency bumps not yet committed
+        self.size_estimate = None  # Bytes on the volume as of the last walk, plus our puts since
+        self.scanned_at = 0.0
+
+    @staticmethod
+    def make_key(text: str, exaggeration: float, cfg_weight: float, model_id: str) -> str:
+        import hashlib
+
+        payload = json.dumps([text, float(exaggeration), float(cfg_weight), model_id])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        import os
+
+        return os.path.join(self.root, "turns", key[:2], f"{key}.npy")
+
+    def reload(self) -> None:
+        """Pick up turns written by other containers"""
+        try:
+            self.volume.reload()
+        except Exception as e:
+            print(f"⚠️ Turn cache reload skipped: {e}")
+
+    def get(self, key: str, counted: bool = False):
+        """
+        Load a cached waveform, or None. Pass counted=True when contains() already
+        recorded this lookup, so it is not counted twice.
+        """
+        import os
+        import numpy as np
+
+        path = self._path(key)
+        try:
+            waveform = np.load(path)
+        except (FileNotFoundError, ValueError):
+            if counted:
+                # Evicted since contains() saw it: that lookup was a miss after all
+                self.hits -= 1
+            self.misses += 1
+            return None
+
+        os.utime(path)  # Mark as recently used
+        self.touched += 1
+        if not counted:
+            self.hits += 1
+        return waveform
+
+    def contains(self, key: str) -> bool:
+        """Whether a turn is cached, without loading it; records the lookup as a hit or miss"""
+        import os
+
+        found = os.path.exists(self._path(key))
+        if found:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return found
+
+    def put(self, key: str, waveform) -> None:
+        import os
+        import numpy as np
+
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, waveform)
+        os.replace(tmp_path, path)
+        if self.size_estimate is not None:
+            self.size_estimate += os.path.getsize(path)
+        self.dirty = True
+
+    def _scan(self) -> list:
+        """Walk the cache: (mtime, size, path) per turn; refreshes the size estimate"""
+        import os
+        import time
+
+        entries = []
+        for dir_path, _, file_names in os.walk(os.path.join(self.root, "turns")):
+            for file_name in file_names:
+                path = os.path.join(dir_path, file_name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        self.size_estimate = sum(size for _, size, _ in entries)
+        self.scanned_at = time.time()
+        return entries
+
+    def evict(self) -> int:
+        """Delete least-recently-used turns until the cache fits max_bytes"""
+        import os
+
+        entries = self._scan()
+        total_bytes = self.size_estimate
+        evicted = 0
+        for _, size, path in sorted(entries):
+            if total_bytes <= self.max_bytes:
+                break
+            os.remove(path)
+            total_bytes -= size
+            evicted += 1
+
+        self.size_estimate = total_bytes
+        if evicted:
+            self.dirty = True
+            print(f"🧹 Evicted {evicted} cached turns ({total_bytes} bytes remain)")
+        return evicted
+
+    def _over_budget(self) -> bool:
+        import time
+
+        if self.size_estimate is None or time.time() - self.scanned_at > self.rescan_seconds:
+            self._scan()
+        return self.size_estimate > self.max_bytes
+
+    def commit(self, force: bool = False) -> None:
+        """Persist new turns (and batched recency bumps) so other containers can see them"""
+        if self.dirty and self._over_budget():
+            self.evict()
+        if self.dirty or self.touched >= self.touch_commit_batch or (force and self.touched):
+            self.volume.commit()
+            self.dirty = False
+            self.touched = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "size_estimate_bytes": self.size_estimate,
+        }
+
+
+_supabase_client = None
+
+
+def get_supabase_client():
+    """Service-role Supabase client, created once per container and reused"""
+    global _supabase_client
+    import os
+    from supabase import create_client
+
+    if _supabase_client is None:
+        _supabase_client = create_client(
+            os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_ROLE_KEY"]
+        )
+    return _supabase_client
+
+
+def upload_file_resumable(
+    file_path: str,
+    object_path: str,
+    content_type: str,
+    bucket: str = AUDIO_BUCKET,
+    cache_control: str = "3600",
+) -> None:
+    """
+    Upload a file to Supabase Storage with the TUS resumable protocol.
+
+    The file is read from disk one chunk at a time, so memory stays flat no matter
+    how long the lesson is. A failed chunk is retried with backoff after asking the
+    server how much it actually stored, so a network blip never restarts the upload.
+    """
+    import base64
+    import os
+    import time
+    import httpx
+
+    base_url = os.environ["SUPABASE_URL"].rstrip("/")
+    service_key = os.environ["SUPABASE_SERVICE_ROLE_KEY"]
+    headers = {"Authorization": f"Bearer {service_key}", "apikey": service_key, "Tus-Resumable": "1.0.0"}
+    chunk_bytes = RESUMABLE_UPLOAD_CONFIG["chunk_bytes"]
+    max_retries = RESUMABLE_UPLOAD_CONFIG["max_retries"]
+    total_bytes = os.path.getsize(file_path)
+
+    metadata = ",".join(
+        f"{name} {base64.b64encode(value.encode()).decode()}"
+        for name, value in {
+            "bucketName": bucket,
+            "objectName": object_path,
+            "contentType": content_type,
+            "cacheControl": cache_control,
+        }.items()
+    )
+
+    def with_retries(description: str, request):
+        for attempt in range(max_retries):
+            try:
+                response = request()
+                response.raise_for_status()
+                return response
+            except httpx.HTTPError as e:
+                if attempt == max_retries - 1:
+                    raise
+                wait = RESUMABLE_UPLOAD_CONFIG["backoff_seconds"] * 2 ** attempt
+                print(f"⚠️ {description} failed ({e}); retrying in {wait:.0f}s")
+                time.sleep(wait)
+
+    with httpx.Client(timeout=60) as client, open(file_path, "rb") as f:
+        created = with_retries("Create upload", lambda: client.post(
+            f"{base_url}/storage/v1/upload/resumable",
+            headers={**headers, "Upload-Length": str(total_bytes), "Upload-Metadata": metadata, "x-upsert": "true"},
+        ))
+        upload_url = created.headers["Location"]
+
+        offset = 0
+        while offset < total_bytes:
+            def send_chunk():
+                nonlocal offset
+                # Resume from the server's offset in case a previous attempt partly landed
+                head = client.head(upload_url, headers=headers)
+                if head.status_code == 200 and "Upload-Offset" in head.headers:
+                    offset = int(head.headers["Upload-Offset"])
+                f.seek(offset)
+                return client.patch(
+                    upload_url,
+                    headers={**headers, "Upload-Offset": str(offset), "Content-Type": "application/offset+octet-stream"},
+                    content=f.read(chunk_bytes),
+                )
+
+            response = with_retries(f"Chunk at {offset}/{total_bytes}", send_chunk)
+            offset = int(response.headers["Upload-Offset"])
+
+    print(f"📤 Uploaded {object_path} ({total_bytes} bytes, {-(-total_bytes // chunk_bytes)} chunks)")
+
+
+def upload_audio_file(wav_path: str, uid: str, eid: str, output_format: str = "wav", bitrate: str = None) -> tuple:
+    """
+    Encode a WAV file to output_format and upload it as {uid}/{eid}.{extension}.
+    Returns (public_url, encoding_stats).
+    """
+    audio_path, encoding = encode_audio_file(wav_path, output_format, bitrate)
+    audio_format = AUDIO_FORMATS[output_format]
+    file_path = f"{uid}/{eid}.{audio_format['extension']}"
+    upload_file_resumable(audio_path, file_path, audio_format["content_type"])
+
+    return get_supabase_client().storage.from_(AUDIO_BUCKET).get_public_url(file_path), encoding
+
+
+def upload_to_supabase(wav_path: str, uid: str, eid: str, output_format: str = "wav", bitrate: str = None) -> tuple:
+    """
+    Upload audio to Supabase storage and update episode record.
+    Returns (public_url, encoding_stats).
+    """
+    audio_url, encoding = upload_audio_file(wav_path, uid, eid, output_format, bitrate)
+    record_episode_audio(eid, audio_url)
+    return audio_url, encoding
+
+
+def record_episode_audio(eid: str, audio_url: str) -> dict:
+    """
+    Set the episode's audio_path and complete the lesson once every episode has audio.
+    One RPC round trip; the lesson flip happens atomically in complete_episode_audio
+    (supabase/migrations/009_episode_audio_completion.sql).
+    """
+    print(f"📝 Recording audio for episode {eid}...")
+    result = get_supabase_client().rpc("complete_episode_audio", {
+        "p_episode_id": eid,
+        "p_audio_path": audio_url,
+    }).execute().data or {}
+
+    if not result.get("episode_found"):
+        print(f"⚠️ Failed to update episode {eid}")
+        return result
+
+    print(f"📊 Lesson {result['lesson_id']}: {result['episodes_with_audio']}/{result['episodes_total']} episodes have audio")
+    if result.get("lesson_completed"):
+        print(f"🎉 All episodes ready! Lesson {result['lesson_id']} marked as completed")
+    return result
+
+
+def fail_episode_audio(eid: str) -> dict:
+    """
+    Clear audio recorded for an episode whose generation failed afterwards and
+    mark its lesson failed ('skipped'), undoing any completion
+    (supabase/migrations/010_fail_episode_audio.sql).
+    """
+    print(f"🧯 Clearing audio for failed episode {eid}...")
+    result = get_supabase_client().rpc("fail_episode_audio", {"p_episode_id": eid}).execute().data or {}
+    if not result.get("episode_found"):
+        print(f"⚠️ Failed to clear episode {eid}")
+    return result
+
 
 @app.cls(
     image=image,
     gpu="A10G",  # Chatterbox works best with A10G
-    timeout=600,
+    timeout=900,  # Longer timeout for full segment requests
     secrets=[modal.Secret.from_name("supabase-secret")],
+    volumes={TURN_CACHE_CONFIG["mount_path"]: turn_cache_volume},
     scaledown_window=300,  # Keep warm for 5 minutes
 )
 class TTSGenerator:
-    """Chatterbox TTS Generator class that loads model once and reuses"""
+    """
+    Chatterbox TTS Generator class that loads model once and reuses.
+    Serves both Modal method calls and the HTTP endpoints, so the model
+    load is paid once per container rather than once per request.
+    """
 
     @modal.enter()
     def load_model(self):
         """Load Chatterbox TTS model when container starts"""
+        import time
         from chatterbox.tts import ChatterboxTTS
 
+        from importlib.metadata import version
+
+        started_at = time.perf_counter()
         self.model = ChatterboxTTS.from_pretrained(device="cuda")
-        print("✅ Chatterbox TTS Model loaded")
+        self.model_load_seconds = round(time.perf_counter() - started_at, 2)
+        self.requests_served = 0
+        print(f"✅ Chatterbox TTS Model loaded in {self.model_load_seconds}s")
+
+        # Cached turns are only valid for the model that produced them
+        self.model_id = f"chatterbox-tts=={version('chatterbox-tts')}"
+        if CHUNKING_CONFIG["enabled"]:
+            # Chunked turns sound different from whole-paragraph ones
+            self.model_id += f"|chunks<={CHUNKING_CONFIG['max_chars']}"
+        self.turn_cache = TurnAudioCache(
+            TURN_CACHE_CONFIG["mount_path"],
+            turn_cache_volume,
+            TURN_CACHE_CONFIG["max_bytes"],
+            TURN_CACHE_CONFIG["touch_commit_batch"],
+            TURN_CACHE_CONFIG["rescan_seconds"],
+        )
 
-    @modal.method()
-    def generate_audio(
-        self,
-        text: str,
-        exaggeration: float = 0.5,
-        cfg_weight: float = 0.5,
-    ) -> bytes:
-        """Generate audio bytes from text using Chatterbox"""
-        import soundfile as sf
-        import io
+    @modal.exit()
+    def flush_turn_cache(self):
+        """Persist recency bumps still below the commit batch before the container goes away"""
+        self.turn_cache.commit(force=True)
+
+    def _container_metrics(self) -> dict:
+        """Model load cost, reuse count and turn cache stats for this container"""
+        return {
+            "model_load_seconds": self.model_load_seconds,
+            "requests_served": self.requests_served,
+            "turn_cache": self.turn_cache.stats(),
+        }
 
-        # Generate audio waveform with Chatterbox
+    def _waveform(self, text: str, exaggeration: float, cfg_weight: float):
+        """Generate a float32 waveform (24kHz) for a single piece of text"""
         wav = self.model.generate(
             text=text,
             exaggeration=exaggeration,
             cfg_weight=cfg_weight,
         )
+        return wav.squeeze().cpu().numpy().astype("float32")
+
+    def _synthesize(self, text: str, exaggeration: float, cfg_weight: float) -> bytes:
+        """Generate WAV bytes for a single piece of text (sentence-chunked like dialogue turns)"""
+        return encode_wav(self._synthesize_sequential([text], exaggeration, cfg_weight)[0])
+
+    def _synthesize_sequential(self, texts: list, exaggeration: float, cfg_weight: float, chunked: bool = None) -> list:
+        """
+        Chunked sequential synthesis of texts that share one voice profile.
+
+        Chatterbox's generate() takes a single text and has no batched forward
+        pass, so the texts run one after another under inference mode.
+
+        With chunking on, each text is split into sentence chunks that are
+        synthesized in turn and crossfaded back into one waveform.
+        """
+        import torch
+
+        chunked = CHUNKING_CONFIG["enabled"] if chunked is None else chunked
+        with torch.inference_mode():
+            if not chunked:
+                return [self._waveform(text, exaggeration, cfg_weight) for text in texts]
+
+            crossfade_samples = SAMPLE_RATE * CHUNKING_CONFIG["crossfade_ms"] // 1000
+            waveforms = []
+            for text in texts:
+                chunks = split_text_chunks(text, CHUNKING_CONFIG["max_chars"]) or [text]
+                waveforms.append(crossfade_waveforms(
+                    [self._waveform(chunk, exaggeration, cfg_weight) for chunk in chunks], crossfade_samples
+                ))
+            return waveforms
+
+    def _synthesize_turns(self, turns: list, use_cache: bool = True) -> list:
+        """Synthesize (text, exaggeration, cfg_weight) turns; waveforms in input order"""
+        return list(self._stream_turns(turns, use_cache))
+
+    def _stream_turns(self, turns: list, use_cache: bool = True):
+        """
+        Synthesize (text, exaggeration, cfg_weight) turns in transcript order,
+        yielding each waveform as soon as it is ready so callers can write it out
+        and drop it.
 
-        # Convert tensor to numpy and save as WAV bytes
-        audio_np = wav.squeeze().cpu().numpy()
-        buffer = io.BytesIO()
-        sf.write(buffer, audio_np, 24000, format="WAV")  # Chatterbox uses 24kHz
-        buffer.seek(0)
+        Turns already in the turn cache are loaded from the volume; the rest are
+        synthesized and cached. Words and seconds of every freshly synthesized
+        turn feed the speech rate calibration.
+        """
+        use_cache = use_cache and TURN_CACHE_CONFIG["enabled"]
+
+        cache_keys = [None] * len(turns)
+        cached = set()
+        if use_cache:
+            self.turn_cache.reload()
+            for index, (text, exaggeration, cfg_weight) in enumerate(turns):
+                cache_keys[index] = TurnAudioCache.make_key(text, exaggeration, cfg_weight, self.model_id)
+                if self.turn_cache.contains(cache_keys[index]):
+                    cached.add(index)
+            print(f"  💾 Turn cache: {len(cached)} cached, {len(turns) - len(cached)} to synthesize")
+
+        rate_samples = []
+        try:
+            for index, (text, exaggeration, cfg_weight) in enumerate(turns):
+                waveform = None
+                if index in cached:
+                    # None if evicted by another container since the lookup
+                    waveform = self.turn_cache.get(cache_keys[index], counted=True)
+                if waveform is None:
+                    waveform = self._synthesize_sequential([text], exaggeration, cfg_weight)[0]
+                    rate_samples.append((exaggeration, cfg_weight, len(text.split()), len(waveform) / SAMPLE_RATE))
+                    if use_cache:
+                        self.turn_cache.put(cache_keys[index], waveform)
+                yield waveform
+        finally:
+            if use_cache:
+                self.turn_cache.commit()
+            record_speech_rate(rate_samples, self.model_id)
+
+    def _synthesize_dialogue(self, transcript: list, voice_profiles: dict) -> bytes:
+        """Generate combined WAV bytes for a multi-speaker transcript"""
+        positions, turns = resolve_dialogue_turns(transcript, voice_profiles)
+
+        print(f"  Synthesizing {len(turns)} turns...")
+        waveforms = self._synthesize_turns(turns)
+
+        return assemble_dialogue_audio(len(transcript), positions, waveforms)
+
+    def _render_dialogue_file(self, transcript: list, voice_profiles: dict, wav_path: str) -> None:
+        """
+        Synthesize a multi-speaker transcript straight to a WAV file on disk. Each
+        turn is written as soon as it is ready, then freed.
+        """
+        positions, turns = resolve_dialogue_turns(transcript, voice_profiles)
 
-        return buffer.read()
+        print(f"  Synthesizing {len(turns)} turns...")
+        write_dialogue_wav(wav_path, len(transcript), positions, self._stream_turns(turns))
+
+    def _render_text_file(self, text: str, exaggeration: float, cfg_weight: float, wav_path: str) -> None:
+        """Synthesize a single piece of text straight to a WAV file on disk"""
+        write_dialogue_wav(wav_path, 1, [0], self._synthesize_sequential([text], exaggeration, cfg_weight))
+
+    @modal.method()
+    def generate_audio(
+        self,
+        text: str,
+        exaggeration: float = 0.5,
+        cfg_weight: float = 0.5,
+    ) -> bytes:
+        """Generate audio bytes from text using Chatterbox"""
+        return self._synthesize(text, exaggeration, cfg_weight)
 
     @modal.method()
     def generate_dialogue_audio(
@@ -105,57 +875,7 @@ class TTSGenerator:
         Returns:
             Combined audio bytes as WAV
         """
-        from pydub import AudioSegment
-        import io
-
-        if voice_profiles is None:
-            voice_profiles = VOICE_PROFILES
-
-        audio_segments = []
-        silence = AudioSegment.silent(duration=300)  # 300ms pause between speakers
-
-        for i, turn in enumerate(transcript):
-            speaker = turn.get("speaker", "default")
-            dialogue = turn.get("dialogue", "")
-
-            if not dialogue.strip():
-                continue
-
-            # Get voice profile for speaker
-            profile = voice_profiles.get(speaker, voice_profiles.get("default", VOICE_PROFILES["default"]))
-
-            print(f"  Generating audio for {speaker}: {dialogue[:50]}...")
-
-            # Generate audio for this turn
-            audio_bytes = self.generate_audio(
-                text=dialogue,
-                exaggeration=profile.get("exaggeration", 0.5),
-                cfg_weight=profile.get("cfg_weight", 0.5),
-            )
-
-            # Convert to AudioSegment
-            audio = AudioSegment.from_wav(io.BytesIO(audio_bytes))
-            audio_segments.append(audio)
-
-            # Add silence between speakers (except after last turn)
-            if i < len(transcript) - 1:
-                audio_segments.append(silence)
-
-        # Combine all segments
-        if not audio_segments:
-            # Return silent audio if nothing to combine
-            return AudioSegment.silent(duration=1000).export(format="wav").read()
-
-        combined = audio_segments[0]
-        for segment in audio_segments[1:]:
-            combined += segment
-
-        # Export to WAV bytes
-        buffer = io.BytesIO()
-        combined.export(buffer, format="wav")
-        buffer.seek(0)
-
-        return buffer.read()
+        return self._synthesize_dialogue(transcript, voice_profiles or VOICE_PROFILES)
 
     @modal.method()
     def generate_and_upload(
@@ -165,31 +885,18 @@ class TTSGenerator:
         episode_id: str,
         exaggeration: float = 0.5,
         cfg_weight: float = 0.5,
+        output_format: str = "wav",
+        bitrate: str = None,
     ) -> str:
-        """Generate audio and upload to Supabase Storage"""
+        """Generate audio, encode to output_format (wav/opus/aac/mp3) and upload to Supabase Storage"""
         import os
-        from supabase import create_client
-
-        # Generate audio
-        audio_bytes = self.generate_audio(text, exaggeration, cfg_weight)
-
-        # Connect to Supabase
-        supabase = create_client(
-            os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_ROLE_KEY"]
-        )
+        import tempfile
 
-        # Upload path: {user_id}/{episode_id}.wav
-        file_path = f"{user_id}/{episode_id}.wav"
-
-        # Upload to storage
-        result = supabase.storage.from_("lesson-audio").upload(
-            path=file_path,
-            file=audio_bytes,
-            file_options={"content-type": "audio/wav"},
-        )
-
-        # Get public URL
-        url = supabase.storage.from_("lesson-audio").get_public_url(file_path)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Render to disk, then upload in resumable chunks
+            wav_path = os.path.join(tmp_dir, "audio.wav")
+            self._render_text_file(text, exaggeration, cfg_weight, wav_path)
+            url, _ = upload_audio_file(wav_path, user_id, episode_id, output_format, bitrate)
 
         return url
 
@@ -200,6 +907,8 @@ class TTSGenerator:
         user_id: str,
         episode_id: str,
         voice_profiles: dict = None,
+        output_format: str = "wav",
+        bitrate: str = None,
     ) -> str:
         """
         Generate multi-speaker dialogue audio and upload to Supabase Storage.
@@ -209,289 +918,775 @@ class TTSGenerator:
             user_id: User ID for storage path
             episode_id: Episode ID for storage path
             voice_profiles: Optional custom voice profiles
+            output_format: wav (default), opus, aac or mp3
+            bitrate: Optional encoder bitrate, e.g. "48k"
         
         Returns:
             Public URL of uploaded audio
         """
         import os
-        from supabase import create_client
+        import tempfile
 
-        # Generate combined dialogue audio
-        audio_bytes = self.generate_dialogue_audio(transcript, voice_profiles)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Render turn by turn to disk, then upload in resumable chunks
+            wav_path = os.path.join(tmp_dir, "audio.wav")
+            self._render_dialogue_file(transcript, voice_profiles or VOICE_PROFILES, wav_path)
+            url, _ = upload_audio_file(wav_path, user_id, episode_id, output_format, bitrate)
 
-        # Connect to Supabase
-        supabase = create_client(
-            os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_ROLE_KEY"]
+        return url
+
+    def _render_dialogue_hls(
+        self,
+        transcript: list,
+        user_id: str,
+        episode_id: str,
+        voice_profiles: dict,
+        chunk_seconds: int = None,
+    ) -> dict:
+        """
+        Synthesize a transcript in turn order into an HLS stream, uploading each
+        media chunk and the updated playlist as soon as ffmpeg finalizes it.
+
+        Objects land under {user_id}/{episode_id}/hls/, so the playlist URL is known
+        up front. It is recorded as the episode's audio_path as soon as the first
+        chunk is uploaded, since the app only plays episodes that have one. If
+        anything fails after that, the recording is rolled back and the lesson
+        marked failed, so nothing points at a playlist that will never end.
+        """
+        import os
+        import subprocess
+        import tempfile
+        import time
+        import numpy as np
+
+        chunk_seconds = chunk_seconds or HLS_CONFIG["chunk_seconds"]
+        prefix = f"{user_id}/{episode_id}/hls"
+        playlist_name = HLS_CONFIG["playlist_name"]
+        started_at = time.perf_counter()
+        first_playable_at = None
+        uploaded = set()
+
+        playlist_url = get_supabase_client().storage.from_(AUDIO_BUCKET).get_public_url(f"{prefix}/{playlist_name}")
+
+        with tempfile.TemporaryDirectory() as hls_dir:
+            playlist_path = os.path.join(hls_dir, playlist_name)
+
+            def publish_ready_chunks():
+                """Upload chunks listed in the playlist that haven't been uploaded, then the playlist"""
+                nonlocal first_playable_at
+                if not os.path.exists(playlist_path):
+                    return
+                with open(playlist_path) as f:
+                    playlist = f.read()
+                chunks = [line for line in playlist.splitlines() if line and not line.startswith("#")]
+                new_chunks = [chunk for chunk in chunks if chunk not in uploaded]
+                if not new_chunks:
+                    return
+                for chunk in new_chunks:
+                    upload_file_resumable(os.path.join(hls_dir, chunk), f"{prefix}/{chunk}", "video/mp2t")
+                    uploaded.add(chunk)
+                upload_file_resumable(
+                    playlist_path, f"{prefix}/{playlist_name}", "application/vnd.apple.mpegurl", cache_control="0"
+                )
+                if first_playable_at is None:
+                    first_playable_at = time.perf_counter()
+                    print(f"▶️ First HLS chunk playable after {first_playable_at - started_at:.1f}s")
+                    record_episode_audio(episode_id, playlist_url)
+
+            # One continuous encoder so chunk boundaries stay gapless
+            encoder = subprocess.Popen(
+                ["ffmpeg", "-y", "-loglevel", "error",
+                 "-f", "f32le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-i", "pipe:0",
+                 "-c:a", "aac", "-b:a", HLS_CONFIG["bitrate"],
+                 "-f", "hls", "-hls_time", str(chunk_seconds), "-hls_list_size", "0",
+                 "-hls_playlist_type", "event", "-hls_flags", "temp_file",
+                 "-hls_segment_filename", os.path.join(hls_dir, "chunk_%04d.ts"),
+                 playlist_path],
+                stdin=subprocess.PIPE,
+            )
+
+            silence = np.zeros(SILENCE_SAMPLES, dtype=np.float32)
+            positions, turns = resolve_dialogue_turns(transcript, voice_profiles)
+            audio_seconds = 0.0
+            try:
+                try:
+                    for waveform, i in zip(self._stream_turns(turns), positions):
+                        encoder.stdin.write(waveform.tobytes())
+                        audio_seconds += len(waveform) / SAMPLE_RATE
+                        if i < len(transcript) - 1:
+                            encoder.stdin.write(silence.tobytes())
+                            audio_seconds += SILENCE_MS / 1000
+                        encoder.stdin.flush()
+                        publish_ready_chunks()
+                finally:
+                    encoder.stdin.close()
+                    encoder.wait()
+                if encoder.returncode != 0:
+                    raise RuntimeError(f"ffmpeg HLS encoder exited with {encoder.returncode}")
+
+                # Flush the final chunk and the ENDLIST playlist
+                synthesis_done_at = time.perf_counter()
+                publish_ready_chunks()
+            except Exception:
+                if first_playable_at is not None:
+                    fail_episode_audio(episode_id)
+                raise
+
+        finished_at = time.perf_counter()
+        report = {
+            "playlist_url": playlist_url,
+            "chunks": len(uploaded),
+            "audio_seconds": round(audio_seconds, 1),
+            "time_to_first_playable_seconds": round(first_playable_at - started_at, 2) if first_playable_at else None,
+            # Lower bound for today's flow: the full file can't exist before synthesis ends
+            "full_file_ready_seconds_lower_bound": round(synthesis_done_at - started_at, 2),
+            "total_seconds": round(finished_at - started_at, 2),
+        }
+        print(f"⏱️ HLS first playable at {report['time_to_first_playable_seconds']}s vs full file ≥ {report['full_file_ready_seconds_lower_bound']}s")
+        return report
+
+    @modal.method()
+    def generate_dialogue_hls(
+        self,
+        transcript: list,
+        user_id: str,
+        episode_id: str,
+        voice_profiles: dict = None,
+        chunk_seconds: int = None,
+    ) -> dict:
+        """
+        Generate multi-speaker dialogue as a progressive HLS stream in Supabase Storage.
+        
+        Args:
+            transcript: List of {"speaker": "Name", "dialogue": "Text"} objects
+            user_id: User ID for storage path
+            episode_id: Episode ID for storage path
+            voice_profiles: Optional custom voice profiles
+            chunk_seconds: Target media chunk length (default HLS_CONFIG)
+        
+        Returns:
+            Report with playlist_url and time-to-first-playable timings
+        """
+        return self._render_dialogue_hls(
+            transcript, user_id, episode_id, voice_profiles or VOICE_PROFILES, chunk_seconds
         )
 
-        # Upload path: {user_id}/{episode_id}.wav
-        file_path = f"{user_id}/{episode_id}.wav"
+    def _synthesize_shard(self, shard: list) -> list:
+        """
+        Synthesize one shard of (turn_index, (text, exaggeration, cfg_weight)) pairs.
+        Returns (turn_index, waveform) pairs so the caller can restore order.
+        """
+        waveforms = self._synthesize_turns([turn for _, turn in shard])
+        return [(index, waveform) for (index, _), waveform in zip(shard, waveforms)]
 
-        # Upload to storage
-        result = supabase.storage.from_("lesson-audio").upload(
-            path=file_path,
-            file=audio_bytes,
-            file_options={"content-type": "audio/wav"},
+    @modal.method()
+    def synthesize_shard(self, shard: list) -> list:
+        """Synthesize one shard of a lesson's turns (fan-out target for generate_lesson_audio)"""
+        return self._synthesize_shard(shard)
+
+    @modal.method()
+    def generate_lesson_audio(
+        self,
+        segments: list,
+        voice_profiles: dict = None,
+        num_containers: int = None,
+    ) -> list:
+        """
+        Generate audio for every segment of a lesson, sharding turns across containers.
+        
+        Args:
+            segments: List of {"title": "...", "transcript": [...]} objects
+            voice_profiles: Optional custom voice profiles
+            num_containers: Number of shards / parallel containers (capped by TTS_FANOUT_CONFIG)
+        
+        Returns:
+            List of WAV bytes, one per segment, in segment order
+        """
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+
+        voice_profiles = voice_profiles or VOICE_PROFILES
+        num_containers = min(
+            num_containers or TTS_FANOUT_CONFIG["num_containers"],
+            TTS_FANOUT_CONFIG["max_containers"],
         )
 
-        # Get public URL
-        url = supabase.storage.from_("lesson-audio").get_public_url(file_path)
+        # Flatten all segments' turns so shards balance across the whole lesson
+        segment_positions = []
+        all_turns = []
+        owners = []  # (segment_index, position_index) per flattened turn
+        for segment_index, segment in enumerate(segments):
+            positions, turns = resolve_dialogue_turns(segment.get("transcript", []), voice_profiles)
+            segment_positions.append(positions)
+            owners.extend((segment_index, k) for k in range(len(turns)))
+            all_turns.extend(turns)
+
+        shards = shard_turns(all_turns, num_containers)
+        print(f"🎙️ Lesson audio: {len(all_turns)} turns across {len(segments)} segments → {len(shards)} shards")
+        started_at = time.perf_counter()
+
+        # This container synthesizes the first shard while the rest fan out with .map
+        remote_shards = shards[1:]
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            remote = executor.submit(
+                lambda: list(TTSGenerator().synthesize_shard.map(remote_shards)) if remote_shards else []
+            )
+            results = [self._synthesize_shard(shards[0])] if shards else []
+            results.extend(remote.result())
 
-        return url
+        # Scatter waveforms back to (segment, turn) order
+        segment_waveforms = [[None] * len(positions) for positions in segment_positions]
+        for shard_result in results:
+            for turn_index, waveform in shard_result:
+                segment_index, position_index = owners[turn_index]
+                segment_waveforms[segment_index][position_index] = waveform
 
+        print(f"✅ Lesson audio synthesized in {time.perf_counter() - started_at:.1f}s")
 
-# ============================================================================
-# HTTP Endpoints - These load the model directly for better reliability
-# ============================================================================
+        return [
+            assemble_dialogue_audio(len(segment.get("transcript", [])), positions, waveforms)
+            for segment, positions, waveforms in zip(segments, segment_positions, segment_waveforms)
+        ]
 
-@app.function(
-    image=image,
-    gpu="A10G",
-    timeout=600,
-    secrets=[modal.Secret.from_name("supabase-secret")],
-)
-@modal.fastapi_endpoint(method="POST")
-def generate_tts(request: dict) -> dict:
-    """
-    HTTP endpoint for TTS generation.
-    
-    Supports two modes:
-    1. Simple text-to-speech: {"text": "...", "speaker": "Sam"}
-    2. Multi-speaker dialogue: {"transcript": [...]}
-    
-    For storage upload, also include: {"user_id": "...", "episode_id": "..."}
-    """
-    import base64
-    import io
-    import soundfile as sf
-    from chatterbox.tts import ChatterboxTTS
-    from pydub import AudioSegment
-    
-    text = request.get("text", "")
-    transcript = request.get("transcript")  # For multi-speaker mode
-    user_id = request.get("user_id")
-    episode_id = request.get("episode_id")
-    exaggeration = request.get("exaggeration", 0.5)
-    cfg_weight = request.get("cfg_weight", 0.5)
-    voice_profiles = request.get("voice_profiles") or VOICE_PROFILES
-    speaker = request.get("speaker")  # Optional speaker name for simple mode
+    @modal.method()
+    def benchmark_dialogue_throughput(self, transcript: list = None) -> dict:
+        """
+        Dialogue synthesis throughput in turns/sec and audio-seconds/sec, turn
+        cache off, for whole-turn and sentence-chunked synthesis in transcript order.
+        """
+        import time
 
-    try:
-        # Load model
-        print("🔄 Loading Chatterbox TTS model...")
-        model = ChatterboxTTS.from_pretrained(device="cuda")
-        print("✅ Model loaded")
-        
-        def generate_single_audio(text_to_speak: str, exag: float, cfg: float) -> bytes:
-            """Generate audio for a single piece of text"""
-            wav = model.generate(text=text_to_speak, exaggeration=exag, cfg_weight=cfg)
-            audio_np = wav.squeeze().cpu().numpy()
-            buffer = io.BytesIO()
-            sf.write(buffer, audio_np, 24000, format="WAV")
-            buffer.seek(0)
-            return buffer.read()
-        
-        def upload_to_supabase(audio_bytes: bytes, uid: str, eid: str) -> str:
-            """Upload audio to Supabase storage and update episode record"""
-            import os
-            from supabase import create_client
-            
-            supabase = create_client(
-                os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_ROLE_KEY"]
-            )
-            file_path = f"{uid}/{eid}.wav"
-            supabase.storage.from_("lesson-audio").upload(
-                path=file_path,
-                file=audio_bytes,
-                file_options={"content-type": "audio/wav"},
-            )
-            audio_url = supabase.storage.from_("lesson-audio").get_public_url(file_path)
-            
-            # Update the episode record with the audio path
-            print(f"📝 Updating episode {eid} with audio_path...")
-            update_result = supabase.table("episodes").update({
-                "audio_path": audio_url
-            }).eq("id", eid).execute()
-            
-            if update_result.data:
-                print(f"✅ Episode {eid} updated with audio_path")
-                
-                # Get the lesson_id from this episode to check if all episodes are done
-                episode_data = supabase.table("episodes").select("lesson_id").eq("id", eid).single().execute()
-                if episode_data.data and episode_data.data.get("lesson_id"):
-                    lesson_id = episode_data.data["lesson_id"]
-                    check_and_complete_lesson(supabase, lesson_id)
-            else:
-                print(f"⚠️ Failed to update episode {eid}")
-            
-            return audio_url
-        
-        def check_and_complete_lesson(supabase, lesson_id: str):
-            """Check if all episodes for a lesson have audio and mark lesson as completed"""
-            print(f"🔍 Checking if all episodes for lesson {lesson_id} have audio...")
-            
-            # Get all episodes for this lesson
-            episodes_result = supabase.table("episodes").select("id, audio_path").eq("lesson_id", lesson_id).execute()
-            
-            if not episodes_result.data:
-                print(f"⚠️ No episodes found for lesson {lesson_id}")
-                return
-            
-            episodes = episodes_result.data
-            total_episodes = len(episodes)
-            episodes_with_audio = sum(1 for ep in episodes if ep.get("audio_path"))
-            
-            print(f"📊 Lesson {lesson_id}: {episodes_with_audio}/{total_episodes} episodes have audio")
-            
-            # If all episodes have audio, mark lesson as completed
-            if episodes_with_audio == total_episodes:
-                print(f"🎉 All episodes ready! Marking lesson {lesson_id} as completed...")
-                supabase.table("plan_lessons").update({
-                    "status": "completed"
-                }).eq("id", lesson_id).execute()
-                print(f"✅ Lesson {lesson_id} marked as completed")
-
-        # Mode 1: Multi-speaker dialogue
-        if transcript and isinstance(transcript, list):
-            print(f"🎙️ Generating multi-speaker dialogue ({len(transcript)} turns)...")
-            
-            audio_segments = []
-            silence = AudioSegment.silent(duration=300)  # 300ms pause
-
-            for i, turn in enumerate(transcript):
-                turn_speaker = turn.get("speaker", "default")
-                dialogue = turn.get("dialogue", "")
-
-                if not dialogue.strip():
-                    continue
+        transcript = transcript or BENCHMARK_TRANSCRIPT
+        _, turns = resolve_dialogue_turns(transcript, VOICE_PROFILES)
 
-                # Get voice profile for speaker
-                profile = voice_profiles.get(turn_speaker, voice_profiles.get("default", VOICE_PROFILES["default"]))
+        def measure(chunked: bool) -> dict:
+            started_at = time.perf_counter()
+            waveforms = [self._synthesize_sequential([text], e, c, chunked)[0] for text, e, c in turns]
+            elapsed = time.perf_counter() - started_at
+            audio_seconds = sum(len(w) for w in waveforms) / SAMPLE_RATE
+            return {
+                "seconds": round(elapsed, 2),
+                "audio_seconds": round(audio_seconds, 2),
+                "turns_per_sec": round(len(waveforms) / elapsed, 3),
+                "audio_seconds_per_sec": round(audio_seconds / elapsed, 3),
+            }
 
-                print(f"  [{i+1}/{len(transcript)}] {turn_speaker}: {dialogue[:40]}...")
+        report = {"turns": len(turns), "whole_turn": measure(False), "chunked": measure(True)}
+        print(f"⏱️ {report['turns']} turns: whole-turn {report['whole_turn']['turns_per_sec']} turns/s "
+              f"({report['whole_turn']['audio_seconds_per_sec']} audio s/s), "
+              f"chunked {report['chunked']['turns_per_sec']} turns/s ({report['chunked']['audio_seconds_per_sec']} audio s/s)")
+        return report
 
-                # Generate audio for this turn
-                audio_bytes = generate_single_audio(
-                    dialogue,
-                    profile.get("exaggeration", 0.5),
-                    profile.get("cfg_weight", 0.5),
-                )
+    @modal.method()
+    def benchmark_chunked_latency(self, paragraph_sentences: list = None, profile: str = "Sam") -> dict:
+        """
+        Per-character synthesis latency against paragraph length, whole-paragraph
+        vs sentence-chunked. Paragraphs are built from the first N benchmark sentences.
+        """
+        import re
+        import time
+
+        paragraph_sentences = paragraph_sentences or [1, 3, 5, 8]
+        voice = VOICE_PROFILES.get(profile, VOICE_PROFILES["default"])
+        sentences = [
+            sentence
+            for turn in BENCHMARK_TRANSCRIPT
+            for sentence in re.split(r"(?<=[.!?])\s+", turn["dialogue"].strip())
+            if sentence
+        ]
+
+        rows = []
+        for count in paragraph_sentences:
+            paragraph = " ".join((sentences * (count // len(sentences) + 1))[:count])
+            row = {"sentences": count, "chars": len(paragraph)}
+            for name, chunked in (("paragraph", False), ("chunked", True)):
+                started_at = time.perf_counter()
+                waveform = self._synthesize_sequential([paragraph], voice["exaggeration"], voice["cfg_weight"], chunked)[0]
+                elapsed = time.perf_counter() - started_at
+                row[name] = {
+                    "seconds": round(elapsed, 2),
+                    "ms_per_char": round(elapsed * 1000 / len(paragraph), 2),
+                    "audio_seconds": round(len(waveform) / SAMPLE_RATE, 2),
+                }
+            print(f"⏱️ {count} sentences ({row['chars']} chars): "
+                  f"{row['paragraph']['ms_per_char']} vs {row['chunked']['ms_per_char']} ms/char")
+            rows.append(row)
+
+        return {"max_chars": CHUNKING_CONFIG["max_chars"], "results": rows}
 
-                # Convert to AudioSegment
-                audio = AudioSegment.from_wav(io.BytesIO(audio_bytes))
-                audio_segments.append(audio)
+    # ========================================================================
+    # HTTP Endpoints - served from the warm container, model loaded once
+    # ========================================================================
 
-                # Add silence between speakers
-                if i < len(transcript) - 1:
-                    audio_segments.append(silence)
+    def _handle_tts_request(self, request: dict) -> dict:
+        """
+        Shared handler for the generate_tts and generate_segment_audio endpoints.
+        
+        Supports two modes:
+        1. Simple text-to-speech: {"text": "...", "speaker": "Sam"}
+        2. Multi-speaker dialogue: {"transcript": [...]}
+        
+        For storage upload, also include: {"user_id": "...", "episode_id": "..."}
+        """
+        import base64
+        import os
+        import tempfile
+
+        text = request.get("text", "")
+        transcript = request.get("transcript")  # For multi-speaker mode
+        user_id = request.get("user_id")
+        episode_id = request.get("episode_id")
+        exaggeration = request.get("exaggeration", 0.5)
+        cfg_weight = request.get("cfg_weight", 0.5)
+        voice_profiles = request.get("voice_profiles") or VOICE_PROFILES
+        speaker = request.get("speaker")  # Optional speaker name for simple mode
+        output_format = request.get("output_format", "wav")  # wav, opus, aac or mp3
+        bitrate = request.get("bitrate")  # Optional encoder bitrate, e.g. "48k"
+
+        if output_format == "hls":
+            if not (transcript and isinstance(transcript, list) and user_id and episode_id):
+                return {"success": False, "error": "hls output requires transcript, user_id and episode_id"}
+            print(f"🎙️ Generating progressive HLS dialogue ({len(transcript)} turns)...")
+            report = self._render_dialogue_hls(
+                transcript, user_id, episode_id, voice_profiles, request.get("chunk_seconds")
+            )
+            return {"success": True, "audio_url": report["playlist_url"], "mode": "dialogue", "hls": report}
+
+        if output_format not in AUDIO_FORMATS:
+            return {"success": False, "error": f"Unsupported output_format: {output_format}"}
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            wav_path = os.path.join(tmp_dir, "audio.wav")
+
+            # Mode 1: Multi-speaker dialogue
+            if transcript and isinstance(transcript, list):
+                print(f"🎙️ Generating multi-speaker dialogue ({len(transcript)} turns)...")
+                self._render_dialogue_file(transcript, voice_profiles, wav_path)
+                mode = "dialogue"
+                print(f"✅ Combined audio: {os.path.getsize(wav_path)} bytes")
+
+            # Mode 2: Simple text-to-speech
+            elif text:
+                # Apply speaker voice profile if specified
+                if speaker and speaker in VOICE_PROFILES:
+                    profile = VOICE_PROFILES[speaker]
+                    exaggeration = profile.get("exaggeration", exaggeration)
+                    cfg_weight = profile.get("cfg_weight", cfg_weight)
+
+                print(f"🎙️ Generating simple TTS for: {text[:50]}...")
+                self._render_text_file(text, exaggeration, cfg_weight, wav_path)
+                mode = "simple"
+                print(f"✅ Audio generated: {os.path.getsize(wav_path)} bytes")
 
-            # Combine all segments
-            if not audio_segments:
-                combined_bytes = AudioSegment.silent(duration=1000).export(format="wav").read()
             else:
-                combined = audio_segments[0]
-                for segment in audio_segments[1:]:
-                    combined += segment
-                buffer = io.BytesIO()
-                combined.export(buffer, format="wav")
-                buffer.seek(0)
-                combined_bytes = buffer.read()
-            
-            print(f"✅ Combined audio: {len(combined_bytes)} bytes")
-            
+                return {"success": False, "error": "No text or transcript provided"}
+
             if user_id and episode_id:
-                url = upload_to_supabase(combined_bytes, user_id, episode_id)
-                return {"success": True, "audio_url": url, "mode": "dialogue"}
-            else:
-                return {
-                    "success": True,
-                    "audio_base64": base64.b64encode(combined_bytes).decode(),
-                    "mode": "dialogue",
-                }
+                url, encoding = upload_to_supabase(wav_path, user_id, episode_id, output_format, bitrate)
+                return {"success": True, "audio_url": url, "mode": mode, "encoding": encoding}
+
+            audio_path, encoding = encode_audio_file(wav_path, output_format, bitrate)
+            with open(audio_path, "rb") as f:
+                audio_bytes = f.read()
+
+        return {
+            "success": True,
+            "audio_base64": base64.b64encode(audio_bytes).decode(),
+            "mode": mode,
+            "content_type": AUDIO_FORMATS[output_format]["content_type"],
+            "encoding": encoding,
+        }
+
+    @modal.fastapi_endpoint(method="POST")
+    def generate_tts(self, request: dict) -> dict:
+        """
+        HTTP endpoint for TTS generation.
+        
+        Supports two modes:
+        1. Simple text-to-speech: {"text": "...", "speaker": "Sam"}
+        2. Multi-speaker dialogue: {"transcript": [...]}
+        
+        For storage upload, also include: {"user_id": "...", "episode_id": "..."}
+        Optional encoding: {"output_format": "wav|opus|aac|mp3", "bitrate": "48k"}
+        Progressive playback: {"output_format": "hls", "chunk_seconds": 10} (dialogue + upload only)
+        """
+        self.requests_served += 1
+        try:
+            result = self._handle_tts_request(request)
+        except Exception as e:
+            import traceback
+            print(f"TTS Error: {traceback.format_exc()}")
+            result = {"success": False, "error": str(e)}
+
+        result["container"] = self._container_metrics()
+        return result
+
+    @modal.fastapi_endpoint(method="POST")
+    def generate_segment_audio(self, request: dict) -> dict:
+        """
+        Generate audio for a full lesson segment with dialogue.
+        
+        Expected request:
+        {
+            "segment": {
+                "title": "Segment Name",
+                "transcript": [
+                    {"speaker": "Alex", "dialogue": "..."},
+                    {"speaker": "Sam", "dialogue": "..."}
+                ]
+            },
+            "user_id": "...",
+            "lesson_id": "...",
+            "segment_index": 0,
+            "output_format": "wav"  // optional: wav, opus, aac or mp3
+        }
+        """
+        segment = request.get("segment", {})
+        transcript = segment.get("transcript", [])
+        user_id = request.get("user_id")
+        lesson_id = request.get("lesson_id")
+        segment_index = request.get("segment_index", 0)
+        voice_profiles = request.get("voice_profiles") or VOICE_PROFILES
+
+        if not transcript:
+            return {"success": False, "error": "No transcript in segment"}
+
+        if not user_id or not lesson_id:
+            return {"success": False, "error": "user_id and lesson_id required"}
+
+        episode_id = f"{lesson_id}_segment_{segment_index}"
+
+        # Delegate to the shared TTS handler with the transcript
+        self.requests_served += 1
+        try:
+            result = self._handle_tts_request({
+                "transcript": transcript,
+                "user_id": user_id,
+                "episode_id": episode_id,
+                "voice_profiles": voice_profiles,
+                "output_format": request.get("output_format", "wav"),
+                "bitrate": request.get("bitrate"),
+            })
+        except Exception as e:
+            import traceback
+            print(f"TTS Error: {traceback.format_exc()}")
+            result = {"success": False, "error": str(e)}
+
+        if result.get("success"):
+            result["segment_title"] = segment.get("title", "")
+            result["segment_index"] = segment_index
+            result["turn_count"] = len(transcript)
+
+        result["container"] = self._container_metrics()
+        return result
+
+
+@app.function(image=image, timeout=600)
+def benchmark_audio_assembly(num_turns: int = 100, mean_turn_seconds: float = 12.0, seed: int = 0) -> dict:
+    """
+    Compare the numpy assembler with the previous pydub chain on synthetic turns.
+    CPU only: waveforms are random noise with realistic per-turn lengths.
+    """
+    import time
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    lengths = (rng.uniform(0.3, 1.7, num_turns) * mean_turn_seconds * SAMPLE_RATE).astype(int)
+    waveforms = [(rng.standard_normal(n) * 0.1).astype(np.float32) for n in lengths]
+    positions = list(range(num_turns))
+
+    report = {"turns": num_turns, "audio_seconds": round(int(lengths.sum()) / SAMPLE_RATE, 1)}
+    for name, assemble in (("pydub", assemble_dialogue_audio_pydub), ("numpy", assemble_dialogue_audio)):
+        started_at = time.perf_counter()
+        wav_bytes = assemble(num_turns, positions, waveforms)
+        report[name] = {
+            "seconds": round(time.perf_counter() - started_at, 3),
+            "bytes": len(wav_bytes),
+        }
 
-        # Mode 2: Simple text-to-speech
-        if not text:
-            return {"success": False, "error": "No text or transcript provided"}
+    report["speedup"] = round(report["pydub"]["seconds"] / max(0.001, report["numpy"]["seconds"]), 1)
+    print(f"⏱️ pydub {report['pydub']['seconds']}s vs numpy {report['numpy']['seconds']}s ({report['speedup']}x)")
+    return report
 
-        # Apply speaker voice profile if specified
-        if speaker and speaker in VOICE_PROFILES:
-            profile = VOICE_PROFILES[speaker]
-            exaggeration = profile.get("exaggeration", exaggeration)
-            cfg_weight = profile.get("cfg_weight", cfg_weight)
 
-        print(f"🎙️ Generating simple TTS for: {text[:50]}...")
-        audio_bytes = generate_single_audio(text, exaggeration, cfg_weight)
-        print(f"✅ Audio generated: {len(audio_bytes)} bytes")
+# ============================================================================
+# Lesson Pipeline - overlaps content generation (LLM) with TTS (GPU)
+# ============================================================================
 
-        if user_id and episode_id:
-            url = upload_to_supabase(audio_bytes, user_id, episode_id)
-            return {"success": True, "audio_url": url, "mode": "simple"}
-        else:
-            return {
-                "success": True,
-                "audio_base64": base64.b64encode(audio_bytes).decode(),
-                "mode": "simple",
-            }
-    except Exception as e:
-        import traceback
-        print(f"TTS Error: {traceback.format_exc()}")
-        return {"success": False, "error": str(e)}
+# Content service app/function that streams outline + segments as they complete.
+# Only open_notebook_service.py defines it; the legacy content_service.py deploys
+# under the same app name without it
+CONTENT_APP_NAME = "daydif-content"
+CONTENT_STREAM_FUNCTION = "stream_lesson_content"
 
 
 @app.function(
     image=image,
-    gpu="A10G",
-    timeout=900,  # Longer timeout for full segment
+    timeout=1800,  # Content + audio for a full lesson
     secrets=[modal.Secret.from_name("supabase-secret")],
 )
+def generate_lesson_pipeline(
+    topic: str,
+    user_id: str,
+    lesson_id: str,
+    lesson_number: int = 1,
+    total_lessons: int = 1,
+    user_level: str = "intermediate",
+    duration_minutes: int = 10,
+    parallel: bool = True,
+    voice_profiles: dict = None,
+    max_queued_segments: int = 2,
+    max_inflight_tts: int = 4,
+    output_format: str = "wav",
+) -> dict:
+    """
+    Generate a lesson end to end, dispatching each segment to TTSGenerator as soon
+    as its transcript is written instead of waiting for the whole lesson.
+
+    A producer thread drains the content stream into a bounded queue so text is
+    always ready ahead of the GPU; the main loop creates the episode row and spawns
+    TTS for each segment, keeping at most max_inflight_tts GPU calls in flight.
+
+    Audio is recorded through record_episode_audio like every other TTS path.
+    Episode rows are inserted as segments arrive, so recording waits until the
+    content stream has ended: before that, an early segment could be the
+    lesson's only episode and complete it.
+
+    Returns per-stage timings, including time-to-first-audio against the serial
+    flow (whole lesson first, then TTS segment by segment).
+    """
+    import queue
+    import threading
+    import time
+    from datetime import datetime, timezone
+
+    started_at = time.perf_counter()
+    supabase = get_supabase_client()
+    stream_content = modal.Function.from_name(CONTENT_APP_NAME, CONTENT_STREAM_FUNCTION)
+    try:
+        stream_content.hydrate()
+    except modal.exception.NotFoundError as e:
+        raise RuntimeError(
+            f"{CONTENT_APP_NAME}/{CONTENT_STREAM_FUNCTION} is not deployed. The lesson pipeline needs "
+            f"open_notebook_service.py deployed as {CONTENT_APP_NAME}, not the legacy content_service.py"
+        ) from e
+    tts = TTSGenerator()
+
+    # Bounded hand-off between the LLM stream and GPU dispatch
+    text_queue = queue.Queue(maxsize=max_queued_segments)
+
+    def produce():
+        try:
+            for event in stream_content.remote_gen(
+                topic=topic,
+                lesson_number=lesson_number,
+                total_lessons=total_lessons,
+                user_level=user_level,
+                duration_minutes=duration_minutes,
+                parallel=parallel,
+            ):
+                text_queue.put(event)
+        except Exception as e:
+            text_queue.put({"event": "error", "data": {"error": str(e)}})
+        finally:
+            text_queue.put(None)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+
+    pending = []  # (segment_index, episode_id, call, dispatched_at)
+    segment_reports = {}
+    content_done_at = None
+    first_audio_at = None
+    outline = None
+    error = None
+    unrecorded = []  # (episode_id, audio_url) finished before every episode row exists
+
+    def harvest(block: bool):
+        """Collect finished TTS calls; when block is set, wait for the oldest one."""
+        nonlocal first_audio_at
+        for item in list(pending):
+            segment_index, episode_id, call, dispatched_at = item
+            try:
+                audio_url = call.get(timeout=None if block else 0)
+            except (TimeoutError, modal.exception.TimeoutError):
+                continue
+            except Exception as e:
+                print(f"  ❌ TTS failed for segment {segment_index + 1}: {e}")
+                audio_url = None
+
+            finished_at = time.perf_counter()
+            pending.remove(item)
+            if audio_url:
+                if content_done_at is None:
+                    unrecorded.append((episode_id, audio_url))
+                else:
+                    record_episode_audio(episode_id, audio_url)
+                if first_audio_at is None:
+                    first_audio_at = finished_at
+                print(f"  ✅ Audio ready for segment {segment_index + 1} ({finished_at - started_at:.1f}s)")
+            segment_reports[segment_index].update({
+                "audio_url": audio_url,
+                "tts_seconds": round(finished_at - dispatched_at, 2),
+                "audio_ready_at_seconds": round(finished_at - started_at, 2),
+            })
+            if block:
+                return
+
+    while True:
+        harvest(block=False)
+        try:
+            event = text_queue.get(timeout=1)
+        except queue.Empty:
+            continue
+        if event is None:
+            content_done_at = time.perf_counter()
+            break
+
+        if event["event"] == "outline":
+            outline = event["data"]
+            supabase.table("plan_lessons").update({
+                "title": outline["title"],
+                "description": outline["summary"],
+                "ai_prompt_used": topic,
+                "status": "in_progress",
+            }).eq("id", lesson_id).execute()
+            print(f"📋 Outline ready: {outline['title']} ({len(outline['segments'])} segments)")
+
+        elif event["event"] == "segment":
+            segment = event["data"]
+            segment_index = segment["segment_index"]
+
+            # Keep GPU fan-out bounded
+            while len(pending) >= max_inflight_tts:
+                harvest(block=True)
+
+            try:
+                episode = supabase.table("episodes").insert({
+                    "lesson_id": lesson_id,
+                    "user_id": user_id,
+                    "type": segment["type"],
+                    "title": segment["title"] or f"Part {segment_index + 1}",
+                    "body": segment["text"],
+                    "order_index": segment_index,
+                    "duration_seconds": segment["duration_estimate"],
+                    "meta": {
+                        "generated_at": datetime.now(timezone.utc).isoformat(),
+                        "transcript": segment["transcript"],
+                        "has_dialogue": bool(segment["transcript"]),
+                        "speaker_count": len({turn["speaker"] for turn in segment["transcript"]}),
+                    },
+                }).execute().data[0]
+            except Exception as e:
+                # One bad row shouldn't orphan the TTS already in flight for the others
+                print(f"  ❌ Episode insert failed for segment {segment_index + 1}: {e}")
+                segment_reports[segment_index] = {
+                    "episode_id": None,
+                    "audio_url": None,
+                    "error": str(e),
+                    "text_ready_at_seconds": segment["elapsed_seconds"],
+                }
+                continue
+
+            call = tts.generate_dialogue_and_upload.spawn(
+                segment["transcript"], user_id, episode["id"], voice_profiles, output_format
+            )
+            pending.append((segment_index, episode["id"], call, time.perf_counter()))
+            segment_reports[segment_index] = {
+                "episode_id": episode["id"],
+                "text_ready_at_seconds": segment["elapsed_seconds"],
+            }
+            print(f"  🎙️ Dispatched segment {segment_index + 1} to TTS")
+
+        elif event["event"] == "error":
+            error = event["data"]["error"]
+            print(f"❌ Content stream error: {error}")
+
+    # Every episode row exists now, so completion counts the whole lesson
+    for episode_id, audio_url in unrecorded:
+        record_episode_audio(episode_id, audio_url)
+
+    while pending:
+        harvest(block=True)
+
+    finished_at = time.perf_counter()
+    all_audio = bool(segment_reports) and all(r.get("audio_url") for r in segment_reports.values())
+    if all_audio and not error:
+        # complete_episode_audio already flipped the status
+        supabase.table("plan_lessons").update({
+            "tags": (outline or {}).get("key_takeaways", []),
+        }).eq("id", lesson_id).execute()
+    else:
+        # Missing segments or audio: mark failed ('skipped') so the app offers a retry
+        supabase.table("plan_lessons").update({"status": "skipped"}).eq("id", lesson_id).execute()
+
+    # Serial flow: first audio only after the whole lesson's text plus segment 0's TTS
+    content_seconds = (content_done_at or finished_at) - started_at
+    first_tts_seconds = segment_reports.get(0, {}).get("tts_seconds")
+    time_to_first_audio = round(first_audio_at - started_at, 2) if first_audio_at else None
+    serial_first_audio = round(content_seconds + first_tts_seconds, 2) if first_tts_seconds is not None else None
+
+    report = {
+        "success": all_audio and not error,
+        "lesson_id": lesson_id,
+        "title": (outline or {}).get("title"),
+        "error": error,
+        "segments": [segment_reports[i] for i in sorted(segment_reports)],
+        "timings": {
+            "content_seconds": round(content_seconds, 2),
+            "total_seconds": round(finished_at - started_at, 2),
+            "time_to_first_audio_seconds": time_to_first_audio,
+            "serial_time_to_first_audio_seconds": serial_first_audio,
+            "first_audio_saved_seconds": (
+                round(serial_first_audio - time_to_first_audio, 2)
+                if time_to_first_audio is not None and serial_first_audio is not None
+                else None
+            ),
+        },
+    }
+    print(f"⏱️ First audio at {time_to_first_audio}s (serial flow: {serial_first_audio}s), total {report['timings']['total_seconds']}s")
+    return report
+
+
+@app.function(image=image)
 @modal.fastapi_endpoint(method="POST")
-def generate_segment_audio(request: dict) -> dict:
+def run_lesson_pipeline(request: dict) -> dict:
     """
-    Generate audio for a full lesson segment with dialogue.
-    
+    Start the pipelined content → TTS generation for a lesson.
+
     Expected request:
     {
-        "segment": {
-            "title": "Segment Name",
-            "transcript": [
-                {"speaker": "Alex", "dialogue": "..."},
-                {"speaker": "Sam", "dialogue": "..."}
-            ]
-        },
+        "topic": "...",
         "user_id": "...",
         "lesson_id": "...",
-        "segment_index": 0
+        "lesson_number": 1,
+        "total_lessons": 5,
+        "user_level": "beginner",
+        "duration_minutes": 10
     }
+
+    Runs in the background; episodes and plan_lessons are updated as audio lands.
     """
-    segment = request.get("segment", {})
-    transcript = segment.get("transcript", [])
+    topic = request.get("topic")
     user_id = request.get("user_id")
     lesson_id = request.get("lesson_id")
-    segment_index = request.get("segment_index", 0)
-    voice_profiles = request.get("voice_profiles") or VOICE_PROFILES
-
-    if not transcript:
-        return {"success": False, "error": "No transcript in segment"}
-
-    if not user_id or not lesson_id:
-        return {"success": False, "error": "user_id and lesson_id required"}
-
-    episode_id = f"{lesson_id}_segment_{segment_index}"
-
-    # Delegate to generate_tts with the transcript
-    result = generate_tts.local({
-        "transcript": transcript,
-        "user_id": user_id,
-        "episode_id": episode_id,
-        "voice_profiles": voice_profiles,
-    })
-    
-    if result.get("success"):
-        result["segment_title"] = segment.get("title", "")
-        result["segment_index"] = segment_index
-        result["turn_count"] = len(transcript)
-    
-    return result
+
+    if not topic or not user_id or not lesson_id:
+        return {"success": False, "error": "topic, user_id and lesson_id required"}
+
+    call = generate_lesson_pipeline.spawn(
+        topic=topic,
+        user_id=user_id,
+        lesson_id=lesson_id,
+        lesson_number=request.get("lesson_number", 1),
+        total_lessons=request.get("total_lessons", 1),
+        user_level=request.get("user_level", "intermediate"),
+        duration_minutes=request.get("duration_minutes", 10),
+        parallel=request.get("parallel", True),
+        voice_profiles=request.get("voice_profiles"),
+        output_format=request.get("output_format", "wav"),
+    )
+    return {"success": True, "call_id": call.object_id}
 
 
 @app.function(image=image)
@@ -508,6 +1703,15 @@ def health() -> dict:
             "multi-speaker-dialogue",
             "voice-profiles",
             "segment-generation",
+            "lesson-pipeline",
+            "warm-model-endpoints",
+            "multi-container-lesson-audio",
+            "compressed-output-formats",
+            "turn-audio-cache",
+            "resumable-uploads",
+            "hls-output",
+            "sentence-chunking",
+            "speech-rate-calibration",
         ],
         "voice_profiles": list(VOICE_PROFILES.keys()),
     }
@@ -516,13 +1720,17 @@ def health() -> dict:
 @app.function(image=image)
 @modal.fastapi_endpoint(method="GET")
 def list_voices() -> dict:
-    """List available voice profiles"""
+    """List available voice profiles with their measured speaking rate (if calibrated)"""
+    calibration = speech_rate_store.get("profiles") or {}
     return {
         "voices": {
             name: {
                 "description": profile["description"],
                 "exaggeration": profile["exaggeration"],
                 "cfg_weight": profile["cfg_weight"],
+                "words_per_minute": calibration.get(
+                    speech_rate_key(profile["exaggeration"], profile["cfg_weight"]), {}
+                ).get("words_per_minute"),
             }
             for name, profile in VOICE_PROFILES.items()
         }
@@ -24,7 +24,7 @@ const CONFIG = {
   CONTENT_SERVICE_URL: 'https://getdaydif--daydif-content-generate-content.modal.run',
   
   // TTS Service (from `modal deploy tts_service.py`)
-  TTS_SERVICE_URL: 'https://getdaydif--daydif-tts-generate-tts.modal.run',
+  TTS_SERVICE_URL: 'https://getdaydif--daydif-tts-ttsgenerator-generate-tts.modal.run',
   
   // Your Supabase Edge Function (from your project)
   EDGE_FUNCTION_URL: 'https://YOUR_PROJECT_REF.supabase.co/functions/v1/generate-lesson',
@@ -161,7 +161,7 @@ async function testFullContentGeneration() {
 async function testTTSHealth() {
   console.log('\n4️⃣  Testing TTS Health Endpoint...');
   
-  const healthUrl = CONFIG.TTS_SERVICE_URL.replace('generate-tts', 'health');
+  const healthUrl = CONFIG.TTS_SERVICE_URL.replace('ttsgenerator-generate-tts', 'health');
   console.log(`   URL: ${healthUrl}`);
   
   try {
@@ -273,7 +273,7 @@ async function testMultiSpeakerTTS() {
 async function testVoicesList() {
   console.log('\n7️⃣  Testing Voice Profiles List...');
   
-  const voicesUrl = CONFIG.TTS_SERVICE_URL.replace('generate-tts', 'list-voices');
+  const voicesUrl = CONFIG.TTS_SERVICE_URL.replace('ttsgenerator-generate-tts', 'list-voices');
   console.log(`   URL: ${voicesUrl}`);
   
   try {
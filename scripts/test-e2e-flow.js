@@ -11,7 +11,7 @@ const path = require('path');
 // Modal endpoints
 const CONFIG = {
   CONTENT_SERVICE_URL: 'https://getdaydif--daydif-content-generate-content.modal.run',
-  TTS_SERVICE_URL: 'https://getdaydif--daydif-tts-generate-tts.modal.run',
+  TTS_SERVICE_URL: 'https://getdaydif--daydif-tts-ttsgenerator-generate-tts.modal.run',
 };
 
 function formatDuration(ms) {
@@ -0,0 +1,59 @@
+-- Single round-trip episode audio completion
+-- Sets an episode's audio_path and, in the same transaction, marks its lesson
+-- completed once every episode of that lesson has audio. The lesson row is
+-- locked first so concurrent TTS uploads for the same lesson serialize here
+-- instead of racing to flip plan_lessons.status.
+
+CREATE INDEX IF NOT EXISTS idx_episodes_lesson_missing_audio
+  ON episodes(lesson_id) WHERE audio_path IS NULL;
+
+CREATE OR REPLACE FUNCTION complete_episode_audio(p_episode_id UUID, p_audio_path TEXT)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_lesson_id UUID;
+  v_total INTEGER;
+  v_missing INTEGER;
+  v_completed BOOLEAN := FALSE;
+BEGIN
+  SELECT lesson_id INTO v_lesson_id FROM episodes WHERE id = p_episode_id;
+  IF v_lesson_id IS NULL THEN
+    RETURN jsonb_build_object('episode_found', FALSE);
+  END IF;
+
+  -- Serialize completion per lesson
+  PERFORM 1 FROM plan_lessons WHERE id = v_lesson_id FOR UPDATE;
+
+  UPDATE episodes SET audio_path = p_audio_path WHERE id = p_episode_id;
+
+  SELECT COUNT(*), COUNT(*) FILTER (WHERE audio_path IS NULL)
+    INTO v_total, v_missing
+    FROM episodes
+    WHERE lesson_id = v_lesson_id;
+
+  IF v_missing = 0 THEN
+    UPDATE plan_lessons
+      SET status = 'completed'
+      WHERE id = v_lesson_id AND status <> 'completed';
+    v_completed := FOUND;
+  END IF;
+
+  RETURN jsonb_build_object(
+    'episode_found', TRUE,
+    'lesson_id', v_lesson_id,
+    'episodes_total', v_total,
+    'episodes_with_audio', v_total - v_missing,
+    'lesson_completed', v_completed
+  );
+END;
+$$;
+
+-- Only the backend (service role) records generated audio. Supabase's default
+-- privileges grant EXECUTE on new functions to anon and authenticated directly,
+-- so revoking from PUBLIC alone would leave this SECURITY DEFINER function open
+REVOKE EXECUTE ON FUNCTION complete_episode_audio(UUID, TEXT) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION complete_episode_audio(UUID, TEXT) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION complete_episode_audio(UUID, TEXT) TO service_role;
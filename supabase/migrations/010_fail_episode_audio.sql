@@ -0,0 +1,38 @@
+-- Roll back audio recorded for an episode whose generation later failed
+-- Progressive HLS records the playlist URL through complete_episode_audio as
+-- soon as the first chunk is playable, which can already complete the lesson.
+-- If synthesis then fails, the playlist never gets its ENDLIST. This clears the
+-- episode's audio_path and marks the lesson 'skipped' (the app's failed state,
+-- which it offers to retry), under the same per-lesson lock.
+
+CREATE OR REPLACE FUNCTION fail_episode_audio(p_episode_id UUID)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  v_lesson_id UUID;
+BEGIN
+  SELECT lesson_id INTO v_lesson_id FROM episodes WHERE id = p_episode_id;
+  IF v_lesson_id IS NULL THEN
+    RETURN jsonb_build_object('episode_found', FALSE);
+  END IF;
+
+  -- Serialize with complete_episode_audio
+  PERFORM 1 FROM plan_lessons WHERE id = v_lesson_id FOR UPDATE;
+
+  UPDATE episodes SET audio_path = NULL WHERE id = p_episode_id;
+  UPDATE plan_lessons SET status = 'skipped' WHERE id = v_lesson_id;
+
+  RETURN jsonb_build_object(
+    'episode_found', TRUE,
+    'lesson_id', v_lesson_id
+  );
+END;
+$$;
+
+-- Only the backend (service role) records generated audio
+REVOKE EXECUTE ON FUNCTION fail_episode_audio(UUID) FROM PUBLIC;
+REVOKE EXECUTE ON FUNCTION fail_episode_audio(UUID) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION fail_episode_audio(UUID) TO service_role;